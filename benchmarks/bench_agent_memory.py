@@ -0,0 +1,143 @@
+# 車両1台あたりのメモリ使用量のベンチマーク
+# Agent / VehicleInfo（AgentPopulation を使う場合は AgentView）を台数分作成し、
+# tracemalloc で計測した確保量を台数で割って表示する
+# RespawnedVehicleInfo は知識を持つ車両から再生成した VehicleInfo（generate_new_veh と同じく知識を引き継ぐ）
+# 1台あたりの確保量が MAX_BYTES_PER_VEHICLE を超えた場合、__dict__ を持つインスタンスがある場合、
+# AgentView の確保量が同じ台数の Agent 以上の場合は終了コード 1
+#
+# 使い方: python3 benchmarks/bench_agent_memory.py [台数 ...]
+
+# =========================
+# Standard library
+# =========================
+import gc
+import os
+import sys
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# =========================
+# Local / intra-package
+# =========================
+from its102.agents.Agent import Agent  # noqa: E402
+from its102.agents.AgentPopulation import AgentPopulation  # noqa: E402
+from its102.agents.VehicleInfo import VehicleInfo  # noqa: E402
+
+DEFAULT_POPULATIONS = [1000, 10000, 100000]
+# init_agent_list / init_vehicleInfo_list と同じく、避難地ごとの初期情報を持たせる
+EDGEID_BY_SHELTERID = {"ShelterA_1": "E17", "ShelterB_1": "E36"}
+# 1台あたりの確保量の上限（バイト）
+MAX_BYTES_PER_VEHICLE = {
+    "Agent": 350,
+    "AgentView": 350,
+    "VehicleInfo": 1200,
+    "RespawnedVehicleInfo": 400,
+}
+
+def create_agent(vehID:str, agent_population:AgentPopulation=None):
+    agent_kwargs:dict = dict(
+                    vehID=vehID,
+                    target_shelter="ShelterA_1",
+                    tunning_threshold=30,
+                    route_change_threshold=60.0,
+                    lane_change_init_threshold=900.0,
+                    normalcy_motivation_increase=1000.0,
+                    motivation_decrease_due_to_inactive_neighbors=100.0,
+                    motivation_increase_due_to_following_neighbors=100.0,
+                    lane_minimum_motivation_value=600.0
+                    )
+    if agent_population is None:
+        agent = Agent(**agent_kwargs)
+    else:
+        agent = agent_population.create_agent(**agent_kwargs)
+    agent.set_near_edgeID_by_target_shelter(EDGEID_BY_SHELTERID["ShelterA_1"])
+    agent.init_set_candidate_near_shelter(shelter_edge_by_IDs=EDGEID_BY_SHELTERID)
+    agent.set_candidate_edge_by_shelterID(EDGEID_BY_SHELTERID)
+    return agent
+
+# shared_records は init_vehicleInfo_list と同じく、同時に作成する車両の間で共有する辞書
+def create_vehicleInfo(vehID:str, shared_records:dict=None):
+    vehicleInfo = VehicleInfo(
+                        vehID=vehID,
+                        target_shelter="ShelterA_1",
+                        edgeID_connect_target_shelter=EDGEID_BY_SHELTERID["ShelterA_1"],
+                        create_time=0.0
+                        )
+    for shelterID in EDGEID_BY_SHELTERID:
+        vehicleInfo.init_set_congestion_level_by_shelter(shelterID, 0, 0.0, shared_records=shared_records)
+    vehicleInfo.init_set_avg_evac_time_by_route_by_recive_time()
+    vehicleInfo.init_set_tsunami_precursor_info()
+    return vehicleInfo
+
+# 再生成する元の車両　混雑情報・津波前兆情報・ルートごとの避難時間を車両ごとに持たせる
+def create_parent_vehicleInfo(vehID:str, index:int, shared_records:dict):
+    vehicleInfo = create_vehicleInfo(vehID, shared_records)
+    vehicleInfo.update_shelter_congestion_info(shelterID="ShelterA_1", congestion=index % 10 / 10, time_stamp=float(index))
+    vehicleInfo.update_tsunami_precursor_info(vehID=vehID, tsunami_precursor_flag=True, current_time=float(index))
+    vehicleInfo.v2shelter_update_avg_evac_time_by_route({("E1", "E2", "E17"): {"avg_time": float(index), "vehicles": 1}})
+    vehicleInfo.v2v_avg_evac_time_by_route_by_recive_time(current_time=float(index))
+    return vehicleInfo
+
+def create_respawned_vehicleInfo(vehID:str, parent_vehicleInfo:VehicleInfo):
+    vehicleInfo = VehicleInfo(
+                        vehID=vehID,
+                        target_shelter="ShelterB_1",
+                        edgeID_connect_target_shelter=EDGEID_BY_SHELTERID["ShelterB_1"],
+                        create_time=0.0
+                        )
+    vehicleInfo.inherit_knowledge(parent_vehicleInfo)
+    return vehicleInfo
+
+# population 台分のインスタンスを作成し、(1台あたりの確保量, __dict__ を持つか) を返す
+# vehID の文字列はどの方式でも同じく確保されるため、計測の前に作成しておく
+def measure(class_name:str, population:int):
+    vehIDs = [f"init_ShelterA_1_{index}" for index in range(population)]
+    if class_name == "RespawnedVehicleInfo":
+        parent_shared_records:dict = {}
+        parent_vehicleInfos = [create_parent_vehicleInfo(vehID, index, parent_shared_records) for index, vehID in enumerate(vehIDs)]
+        vehIDs = [f"newveh_ShelterB_1_{index}" for index in range(population)]
+    gc.collect()
+    tracemalloc.start()
+    start_size, _ = tracemalloc.get_traced_memory()
+    if class_name == "Agent":
+        instances = [create_agent(vehID) for vehID in vehIDs]
+    elif class_name == "AgentView":
+        # init_agent_list と同じく台数分の配列を先に確保する
+        agent_population = AgentPopulation()
+        agent_population.reserve(population)
+        instances = [create_agent(vehID, agent_population) for vehID in vehIDs]
+    elif class_name == "RespawnedVehicleInfo":
+        instances = [create_respawned_vehicleInfo(vehID, parent_vehicleInfo) for vehID, parent_vehicleInfo in zip(vehIDs, parent_vehicleInfos)]
+    else:
+        shared_records:dict = {}
+        instances = [create_vehicleInfo(vehID, shared_records) for vehID in vehIDs]
+    end_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    has_dict = hasattr(instances[0], "__dict__")
+    return (end_size - start_size) / population, has_dict
+
+def main(populations:list):
+    failed_results = []
+    bytes_by_class_name_and_population:dict = {} # key: (クラス名, 台数), value: 1台あたりの確保量
+    for class_name in MAX_BYTES_PER_VEHICLE:
+        for population in populations:
+            bytes_per_vehicle, has_dict = measure(class_name, population)
+            bytes_by_class_name_and_population[(class_name, population)] = bytes_per_vehicle
+            print(f"{class_name:20s} {population:>8d} 台  {bytes_per_vehicle:8.1f} bytes/台  __dict__: {'あり' if has_dict else 'なし'}")
+            if bytes_per_vehicle > MAX_BYTES_PER_VEHICLE[class_name] or has_dict:
+                failed_results.append((class_name, population))
+    # AgentPopulation は Agent より小さくなければ使う意味がない
+    for population in populations:
+        if bytes_by_class_name_and_population[("AgentView", population)] >= bytes_by_class_name_and_population[("Agent", population)]:
+            failed_results.append(("AgentView >= Agent", population))
+    if failed_results:
+        print(f"NG 1台あたりの確保量が上限を超えているか、__dict__ を持っているか、AgentView が Agent より大きくなっています: {failed_results}")
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    populations = [int(arg) for arg in sys.argv[1:]] or DEFAULT_POPULATIONS
+    sys.exit(main(populations))
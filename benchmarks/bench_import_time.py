@@ -0,0 +1,65 @@
+# 起動時間のベンチマーク
+# バッチ実行ではサブプロセスを何千回も起動するため、シミュレーション本体の import で
+# matplotlib が読み込まれていないことを確認する（読み込まれていれば終了コード 1）
+#
+# 使い方: python3 benchmarks/bench_import_time.py [繰り返し回数]
+
+# =========================
+# Standard library
+# =========================
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# matplotlib を読み込んではいけないモジュール
+TARGET_MODULES = [
+    "its102.utilities",
+    "its102.map_one.simulation.runner",
+    "its102.map_one.simulation.runner_nosystem",
+]
+# 参考として計測するモジュール
+REFERENCE_MODULES = [
+    "matplotlib.pyplot",
+]
+DEFAULT_REPEAT = 5
+
+# 新しいインタプリタで import し、(import にかかった秒数, matplotlib が読み込まれたか) を返す
+def measure_import(module_name:str):
+    code = (
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            f"import {module_name}\n"
+            "elapsed = time.perf_counter() - start\n"
+            "print(elapsed, 'matplotlib' in sys.modules)\n"
+            )
+    completed = subprocess.run(
+                                [sys.executable, "-c", code],
+                                cwd=REPO_ROOT,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                text=True,
+                                check=True
+                                )
+    elapsed, matplotlib_loaded = completed.stdout.split()[-2:]
+    return float(elapsed), matplotlib_loaded == "True"
+
+def main(repeat:int):
+    failed_modules = []
+    for module_name in TARGET_MODULES + REFERENCE_MODULES:
+        results = [measure_import(module_name) for _ in range(repeat)]
+        median_time = statistics.median(elapsed for elapsed, _ in results)
+        matplotlib_loaded = any(loaded for _, loaded in results)
+        print(f"{module_name:45s} median {median_time * 1000:8.1f} ms  matplotlib: {'loaded' if matplotlib_loaded else 'not loaded'}")
+        if module_name in TARGET_MODULES and matplotlib_loaded:
+            failed_modules.append(module_name)
+    if failed_modules:
+        print(f"NG matplotlib が import 時に読み込まれています: {failed_modules}")
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPEAT
+    sys.exit(main(repeat))
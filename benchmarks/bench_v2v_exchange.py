@@ -0,0 +1,104 @@
+# V2V通信による情報交換のベンチマーク
+# 台数分の Agent / VehicleInfo に異なる時刻の混雑情報・ルート情報・津波前兆情報を持たせ、
+# 無作為に選んだ車両の組ごとに v2v_communication / v2v_communication_about_tsunami_info を呼び出して、
+# 1組あたりの交換時間を表示する（1回目: 情報が異なる組が多い、2回目: 交換済みで同じ版の組が多い）
+# 交換した後に片方の車両が情報を更新し、もう一方の車両の情報が変わった場合（参照の共有）は終了コード 1
+#
+# 使い方: python3 benchmarks/bench_v2v_exchange.py [台数 ...]
+
+# =========================
+# Standard library
+# =========================
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# =========================
+# Local / intra-package
+# =========================
+from its102.agents.Agent import Agent  # noqa: E402
+from its102.agents.Registry import AgentRegistry, VehicleInfoRegistry  # noqa: E402
+from its102.agents.VehicleInfo import VehicleInfo  # noqa: E402
+from its102.utilities import v2v_communication, v2v_communication_about_tsunami_info  # noqa: E402
+
+DEFAULT_POPULATIONS = [1000, 10000]
+EDGEID_BY_SHELTERID = {"ShelterA_1": "E17", "ShelterB_1": "E36"}
+ROUTES = [("E1", "E2", "E17"), ("E1", "E5", "E36"), ("E1", "E8", "E17")]
+SEED = 0
+
+def create_vehicles(population:int, rng:random.Random):
+    agent_list = AgentRegistry()
+    vehInfo_list = VehicleInfoRegistry()
+    for index in range(population):
+        vehID = f"init_ShelterA_1_{index}"
+        agent = Agent(
+                    vehID=vehID,
+                    target_shelter="ShelterA_1",
+                    tunning_threshold=30,
+                    route_change_threshold=60.0,
+                    lane_change_init_threshold=900.0,
+                    normalcy_motivation_increase=1000.0,
+                    motivation_decrease_due_to_inactive_neighbors=100.0,
+                    motivation_increase_due_to_following_neighbors=100.0,
+                    lane_minimum_motivation_value=600.0
+                    )
+        agent.set_candidate_edge_by_shelterID(EDGEID_BY_SHELTERID)
+        agent_list.append(agent)
+        vehicleInfo = VehicleInfo(vehID=vehID, target_shelter="ShelterA_1", edgeID_connect_target_shelter="E17", create_time=0.0)
+        for shelterID in EDGEID_BY_SHELTERID:
+            vehicleInfo.init_set_congestion_level_by_shelter(shelterID, rng.random(), float(rng.randint(0, 600)))
+        vehicleInfo.init_set_tsunami_precursor_info()
+        if rng.random() < 0.5:
+            vehicleInfo.update_tsunami_precursor_info(vehID=vehID, tsunami_precursor_flag=True, current_time=float(rng.randint(0, 600)))
+        vehicleInfo.v2shelter_update_avg_evac_time_by_route(
+            {route: {"avg_time": rng.uniform(100, 300), "vehicles": rng.randint(1, 50)} for route in ROUTES}
+            )
+        vehicleInfo.v2v_avg_evac_time_by_route_by_recive_time(current_time=float(rng.randint(0, 600)))
+        vehInfo_list.append(vehicleInfo)
+    return agent_list, vehInfo_list
+
+# 組ごとに交換し、1組あたりの秒数を返す
+def exchange(pairs:list, agent_list:AgentRegistry, vehInfo_list:VehicleInfoRegistry):
+    start = time.perf_counter()
+    for target_vehInfo, around_vehID in pairs:
+        target_vehID = target_vehInfo.get_vehID()
+        v2v_communication(target_vehID, target_vehInfo, [around_vehID], agent_list, vehInfo_list)
+        v2v_communication_about_tsunami_info(target_vehID, target_vehInfo, [around_vehID], vehInfo_list)
+    return (time.perf_counter() - start) / len(pairs)
+
+# 交換した組の片方が情報を更新しても、もう一方の情報が変わらないか
+def is_isolated(pairs:list, vehInfo_list:VehicleInfoRegistry):
+    for target_vehInfo, around_vehID in pairs:
+        around_vehInfo = vehInfo_list.find(around_vehID)
+        congestion_info = dict(around_vehInfo.get_shelter_congestion_info())
+        tsunami_info = dict(around_vehInfo.get_tsunami_precursor_info())
+        target_vehInfo.update_shelter_congestion_info(shelterID="ShelterA_1", congestion=1.0, time_stamp=10000.0)
+        target_vehInfo.update_tsunami_precursor_info(vehID=target_vehInfo.get_vehID(), tsunami_precursor_flag=True, current_time=10000.0)
+        if dict(around_vehInfo.get_shelter_congestion_info()) != congestion_info or dict(around_vehInfo.get_tsunami_precursor_info()) != tsunami_info:
+            return False
+    return True
+
+def main(populations:list):
+    isolated = True
+    for population in populations:
+        rng = random.Random(SEED)
+        agent_list, vehInfo_list = create_vehicles(population, rng)
+        vehInfos = list(vehInfo_list)
+        pairs = [(vehInfos[rng.randrange(population)], f"init_ShelterA_1_{rng.randrange(population)}") for _ in range(population)]
+        first_time = exchange(pairs, agent_list, vehInfo_list)
+        second_time = exchange(pairs, agent_list, vehInfo_list)
+        print(f"{population:>8d} 台  1回目 {first_time * 1e6:8.2f} us/組  2回目 {second_time * 1e6:8.2f} us/組")
+        isolated = isolated and is_isolated(pairs[:100], vehInfo_list)
+    if not isolated:
+        print("NG 交換した車両どうしで情報が共有されています")
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    populations = [int(arg) for arg in sys.argv[1:]] or DEFAULT_POPULATIONS
+    sys.exit(main(populations))
@@ -0,0 +1,120 @@
+# =========================
+# Standard library
+# =========================
+import heapq
+import itertools
+import math
+
+# =========================
+# Local / intra-package
+# =========================
+from .step_snapshot import snapshot
+
+class AgentScheduler():
+    '''
+    エージェントごとの処理予定
+    時刻順のイベントキュー（V2V通信・判断の評価など一定間隔の処理）と、edge の移動・駐車状態の変化の検知を持つ
+    update() の後、is_scheduled() が True の車両だけを control_vehicles で処理すればよい
+        - このステップで予定のイベントがある車両
+        - edge を移動した車両・駐車状態が変わった車両・新しく現れた車両
+        - watched_edgeIDs のいずれかの edge 上にいる車両（その edge 上では毎ステップ処理する）
+    edge に進入したときだけ行う処理は is_transitioned() で判定し、やり直しが必要な処理は schedule_next_step() でイベントとして登録する
+    edge と駐車状態は snapshot（VAR_ROAD_ID, VAR_STOPSTATE の subscription）から取得するため、traci の呼び出しは増えない
+    '''
+    def __init__(self, watched_edgeIDs:tuple=(), interval_by_event_name:dict=None):
+        self._watched_edgeIDs:frozenset = frozenset(watched_edgeIDs)
+        self._interval_by_event_name:dict = dict(interval_by_event_name or {}) # key: イベント名, value: 間隔（秒）
+        self._event_heap:list = [] # (時刻, 通し番号, vehID, 登録番号, イベント名)
+        self._sequence = itertools.count()
+        self._registration_by_vehID:dict = {} # key: vehID, value: 登録番号（退出した車両の古いイベントを除くため）
+        self._road_ID_by_vehID:dict = {} # key: vehID, value: 前のステップの edgeID
+        self._stopped_parking_by_vehID:dict = {} # key: vehID, value: 前のステップの駐車状態
+        self._scheduled_vehIDs:set = set()
+        self._transitioned_vehIDs:set = set()
+        self._due_event_names_by_vehID:dict = {} # key: vehID, value: このステップで予定のイベント名の集合
+
+    # snapshot.update() の後に呼び出し、このステップで処理する車両を求める
+    def update(self, current_time:float, vehIDs:tuple):
+        vehID_set = set(vehIDs)
+        for vehID in [vehID for vehID in self._road_ID_by_vehID if vehID not in vehID_set]:
+            self._remove(vehID)
+        self._scheduled_vehIDs = set()
+        self._transitioned_vehIDs = set()
+        for vehID in vehIDs:
+            road_ID = snapshot.get_road_ID(vehID)
+            stopped_parking = snapshot.is_stopped_parking(vehID)
+            if vehID not in self._road_ID_by_vehID:
+                self._register(vehID, current_time)
+                self._transitioned_vehIDs.add(vehID)
+            elif road_ID != self._road_ID_by_vehID[vehID] or stopped_parking != self._stopped_parking_by_vehID[vehID]:
+                self._transitioned_vehIDs.add(vehID)
+            self._road_ID_by_vehID[vehID] = road_ID
+            self._stopped_parking_by_vehID[vehID] = stopped_parking
+            if road_ID in self._watched_edgeIDs:
+                self._scheduled_vehIDs.add(vehID)
+        self._scheduled_vehIDs |= self._transitioned_vehIDs
+        self._due_event_names_by_vehID = self._pop_due_events(current_time)
+        self._scheduled_vehIDs.update(self._due_event_names_by_vehID)
+
+    # 新しく現れた車両のイベントを、各間隔の倍数の時刻のうち current_time 以降の最初の時刻に登録する
+    def _register(self, vehID:str, current_time:float):
+        registration = next(self._sequence)
+        self._registration_by_vehID[vehID] = registration
+        for event_name, interval in self._interval_by_event_name.items():
+            event_time = math.ceil(current_time / interval) * interval
+            heapq.heappush(self._event_heap, (event_time, next(self._sequence), vehID, registration, event_name))
+
+    def _remove(self, vehID:str):
+        self._registration_by_vehID.pop(vehID, None)
+        self._road_ID_by_vehID.pop(vehID, None)
+        self._stopped_parking_by_vehID.pop(vehID, None)
+
+    # current_time までのイベントを取り出し、次の時刻に登録し直す
+    def _pop_due_events(self, current_time:float):
+        due_event_names_by_vehID:dict = {}
+        while self._event_heap and self._event_heap[0][0] <= current_time:
+            event_time, _, vehID, registration, event_name = heapq.heappop(self._event_heap)
+            if self._registration_by_vehID.get(vehID) != registration:
+                continue
+            due_event_names_by_vehID.setdefault(vehID, set()).add(event_name)
+            # 間隔のないイベント（schedule_next_step で登録したもの）は1回だけ
+            if event_name not in self._interval_by_event_name:
+                continue
+            next_event_time = event_time + self._interval_by_event_name[event_name]
+            heapq.heappush(self._event_heap, (next_event_time, next(self._sequence), vehID, registration, event_name))
+        return due_event_names_by_vehID
+
+    # 次のステップに1回だけ event_name のイベントを登録する（車両が退出した場合は取り消される）
+    def schedule_next_step(self, vehID:str, event_name:str, current_time:float):
+        registration = self._registration_by_vehID.get(vehID)
+        if registration is None:
+            return
+        heapq.heappush(self._event_heap, (math.nextafter(current_time, math.inf), next(self._sequence), vehID, registration, event_name))
+
+    # このステップで処理が必要な車両か
+    def is_scheduled(self, vehID:str):
+        return vehID in self._scheduled_vehIDs
+
+    # このステップで event_name のイベントが予定されているか
+    def is_event_due(self, vehID:str, event_name:str):
+        return event_name in self._due_event_names_by_vehID.get(vehID, ())
+
+    # このステップで edge を移動した（新しく現れた・駐車状態が変わった）車両か
+    def is_transitioned(self, vehID:str):
+        return vehID in self._transitioned_vehIDs
+
+    def get_scheduled_vehIDs(self):
+        return set(self._scheduled_vehIDs)
+
+    def get_transitioned_vehIDs(self):
+        return set(self._transitioned_vehIDs)
+
+    # シミュレーション終了時（次のシナリオの開始前）に予定を破棄する
+    def clear(self):
+        self._event_heap = []
+        self._registration_by_vehID = {}
+        self._road_ID_by_vehID = {}
+        self._stopped_parking_by_vehID = {}
+        self._scheduled_vehIDs = set()
+        self._transitioned_vehIDs = set()
+        self._due_event_names_by_vehID = {}
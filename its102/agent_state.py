@@ -0,0 +1,164 @@
+# =========================
+# Third-party libraries
+# =========================
+import numpy as np
+
+# =========================
+# Local / intra-package
+# =========================
+from .agents.Agent import Agent
+from .agents.VehicleInfo import VehicleInfo
+
+# 行動モデルの状態（runner の心理モデル・到着処理が参照するフラグの組み合わせ）
+STATE_EN_ROUTE = 0 # 走行中（経路変更前・津波情報による動機づけ前）
+STATE_INFORMED = 1 # 津波情報を受けて動機づけを上乗せ済み（normalcy_lane_change_motivation_flg）
+STATE_INFORMED_AT_MINIMUM = 2 # 負の同調性バイアスで動機づけが下限に到達（lane_minimum_motivation_value_flg）
+STATE_ROUTE_CHANGED = 3 # 車線（避難経路）変更済み（evacuation_route_changed_flg）
+STATE_DECLINED = 4 # 避難地手前の減速edgeに到達（arrival_flag, decline_edge_arrival_flag）
+STATE_PARKED = 5 # 減速edgeを通らずに避難地に到着（parked_flag）
+STATE_DECLINED_PARKED = 6 # 減速edgeを通って避難地に到着
+STATE_NAMES = ("EN_ROUTE", "INFORMED", "INFORMED_AT_MINIMUM", "ROUTE_CHANGED", "DECLINED", "PARKED", "DECLINED_PARKED")
+
+# 状態のまとまり
+DECISION_STATES = frozenset((STATE_EN_ROUTE, STATE_INFORMED, STATE_INFORMED_AT_MINIMUM)) # 経路変更の判断を行う状態
+DECLINED_STATES = frozenset((STATE_DECLINED, STATE_DECLINED_PARKED)) # 減速制御・通信・心理モデルの対象外
+PARKED_STATES = frozenset((STATE_PARKED, STATE_DECLINED_PARKED)) # 到着処理済み
+
+# 遷移のきっかけ
+EVENT_REACT_TO_INFO = "react_to_info" # 津波情報を受けて動機づけを上乗せ
+EVENT_REACH_MINIMUM = "reach_minimum" # 負の同調性バイアスで下限に到達
+EVENT_FOLLOW_NEIGHBOURS = "follow_neighbours" # 正の同調性バイアス（下限到達を解除）
+EVENT_CHANGE_ROUTE = "change_route" # 車線変更に成功
+EVENT_ENTER_DECLINE_EDGE = "enter_decline_edge" # 減速edgeに進入
+EVENT_PARK = "park" # 避難地に到着
+
+# 遷移表　key: (現在の状態, きっかけ), value: 次の状態
+TRANSITION_TABLE = {
+    (STATE_EN_ROUTE, EVENT_REACT_TO_INFO): STATE_INFORMED,
+    (STATE_INFORMED, EVENT_REACH_MINIMUM): STATE_INFORMED_AT_MINIMUM,
+    (STATE_INFORMED, EVENT_FOLLOW_NEIGHBOURS): STATE_INFORMED,
+    (STATE_INFORMED_AT_MINIMUM, EVENT_FOLLOW_NEIGHBOURS): STATE_INFORMED,
+    (STATE_EN_ROUTE, EVENT_CHANGE_ROUTE): STATE_ROUTE_CHANGED,
+    (STATE_INFORMED, EVENT_CHANGE_ROUTE): STATE_ROUTE_CHANGED,
+    (STATE_INFORMED_AT_MINIMUM, EVENT_CHANGE_ROUTE): STATE_ROUTE_CHANGED,
+    # 同じステップで経路変更（変更1）した後に津波情報を受けた場合（動機づけのフラグのみ立て、状態は経路変更済みのまま）
+    (STATE_ROUTE_CHANGED, EVENT_REACT_TO_INFO): STATE_ROUTE_CHANGED,
+    (STATE_ROUTE_CHANGED, EVENT_CHANGE_ROUTE): STATE_ROUTE_CHANGED,
+    (STATE_EN_ROUTE, EVENT_ENTER_DECLINE_EDGE): STATE_DECLINED,
+    (STATE_INFORMED, EVENT_ENTER_DECLINE_EDGE): STATE_DECLINED,
+    (STATE_INFORMED_AT_MINIMUM, EVENT_ENTER_DECLINE_EDGE): STATE_DECLINED,
+    (STATE_ROUTE_CHANGED, EVENT_ENTER_DECLINE_EDGE): STATE_DECLINED,
+    (STATE_DECLINED, EVENT_ENTER_DECLINE_EDGE): STATE_DECLINED,
+    (STATE_PARKED, EVENT_ENTER_DECLINE_EDGE): STATE_DECLINED_PARKED,
+    (STATE_DECLINED_PARKED, EVENT_ENTER_DECLINE_EDGE): STATE_DECLINED_PARKED,
+    (STATE_EN_ROUTE, EVENT_PARK): STATE_PARKED,
+    (STATE_INFORMED, EVENT_PARK): STATE_PARKED,
+    (STATE_INFORMED_AT_MINIMUM, EVENT_PARK): STATE_PARKED,
+    (STATE_ROUTE_CHANGED, EVENT_PARK): STATE_PARKED,
+    (STATE_DECLINED, EVENT_PARK): STATE_DECLINED_PARKED,
+}
+
+INITIAL_CAPACITY = 256
+
+class AgentStateTable():
+    '''
+    エージェントの行動モデルの状態機械
+    状態はエージェントの番号（登録順）を添字とする int8 の配列に持ち、遷移は TRANSITION_TABLE に従う
+    遷移時に Agent / VehicleInfo の対応するフラグも更新するため、フラグを参照する既存の処理はそのまま動く
+    get_vehIDs_in_states() で、状態の集合に含まれるエージェントを NumPy のマスクでまとめて取り出せる
+    '''
+    def __init__(self, capacity:int=INITIAL_CAPACITY):
+        self._states = np.zeros(capacity, dtype=np.int8)
+        self._active = np.zeros(capacity, dtype=bool) # シミュレーション上に存在するエージェント
+        self._vehIDs:list = [] # 添字: エージェントの番号
+        self._slot_by_vehID:dict = {}
+
+    # エージェントの登録　初期状態は Agent / VehicleInfo のフラグから求める
+    def register(self, vehID:str, agent:Agent, vehInfo:VehicleInfo):
+        slot = self._slot_by_vehID.get(vehID)
+        if slot is None:
+            slot = len(self._vehIDs)
+            if slot >= len(self._states):
+                self._grow()
+            self._vehIDs.append(vehID)
+            self._slot_by_vehID[vehID] = slot
+        self._states[slot] = get_state_from_flags(agent, vehInfo)
+        self._active[slot] = True
+        return slot
+
+    def _grow(self):
+        capacity = len(self._states) * 2
+        states = np.zeros(capacity, dtype=np.int8)
+        states[:len(self._states)] = self._states
+        active = np.zeros(capacity, dtype=bool)
+        active[:len(self._active)] = self._active
+        self._states = states
+        self._active = active
+
+    def is_registered(self, vehID:str):
+        return vehID in self._slot_by_vehID
+
+    # 到着・削除された車両を対象外にする（状態は残す）
+    def retire(self, vehID:str):
+        slot = self._slot_by_vehID.get(vehID)
+        if slot is not None:
+            self._active[slot] = False
+
+    def get_state(self, vehID:str):
+        return int(self._states[self._slot_by_vehID[vehID]])
+
+    def is_in(self, vehID:str, states:frozenset):
+        return int(self._states[self._slot_by_vehID[vehID]]) in states
+
+    # 遷移表に従って状態を更新し、対応するフラグを設定する　遷移表にない組み合わせは ValueError
+    def transition(self, vehID:str, event:str, agent:Agent=None, vehInfo:VehicleInfo=None):
+        slot = self._slot_by_vehID[vehID]
+        current_state = int(self._states[slot])
+        next_state = TRANSITION_TABLE.get((current_state, event))
+        if next_state is None:
+            raise ValueError(f"{vehID}: {STATE_NAMES[current_state]} から {event} による遷移はありません")
+        self._states[slot] = next_state
+        _apply_flags(event, agent, vehInfo)
+        return next_state
+
+    # 状態が states のいずれかに含まれる、存在中のエージェントのマスク（添字: エージェントの番号）
+    def get_mask(self, states:frozenset):
+        slot_num = len(self._vehIDs)
+        return np.isin(self._states[:slot_num], list(states)) & self._active[:slot_num]
+
+    def get_vehIDs_in_states(self, states:frozenset):
+        return [self._vehIDs[slot] for slot in np.flatnonzero(self.get_mask(states))]
+
+    # 状態ごとのエージェント数
+    def count_by_state(self):
+        slot_num = len(self._vehIDs)
+        counts = np.bincount(self._states[:slot_num][self._active[:slot_num]], minlength=len(STATE_NAMES))
+        return {state_name: int(count) for state_name, count in zip(STATE_NAMES, counts)}
+
+# Agent / VehicleInfo のフラグに対応する状態
+def get_state_from_flags(agent:Agent, vehInfo:VehicleInfo):
+    if vehInfo.get_decline_edge_arrival_flag():
+        return STATE_DECLINED_PARKED if vehInfo.get_parked_flag() else STATE_DECLINED
+    if vehInfo.get_parked_flag():
+        return STATE_PARKED
+    if agent.get_evacuation_route_changed_flg():
+        return STATE_ROUTE_CHANGED
+    if agent.get_normalcy_lane_change_motivation_flg():
+        return STATE_INFORMED_AT_MINIMUM if agent.get_lane_minimum_motivation_value_flg() else STATE_INFORMED
+    return STATE_EN_ROUTE
+
+# 遷移のきっかけに対応するフラグの設定
+def _apply_flags(event:str, agent:Agent, vehInfo:VehicleInfo):
+    if event == EVENT_REACT_TO_INFO:
+        agent.set_normalcy_lane_change_motivation_flg(True)
+    elif event == EVENT_REACH_MINIMUM:
+        agent.set_lane_minimum_motivation_value_flg(True)
+    elif event == EVENT_FOLLOW_NEIGHBOURS:
+        agent.set_lane_minimum_motivation_value_flg(False)
+    elif event == EVENT_CHANGE_ROUTE:
+        agent.set_evacuation_route_changed_flg(True)
+    elif event == EVENT_ENTER_DECLINE_EDGE:
+        vehInfo.set_arrival_flag(True)
+        vehInfo.set_decline_edge_arrival_flag(True)
+    elif event == EVENT_PARK:
+        vehInfo.set_parked_flag(True)
@@ -1,6 +1,19 @@
+from .MotivationCurve import MotivationCurve
 from .VehicleInfo import VehicleInfo
 
 class Agent():
+    # 属性は __slots__ で固定し、インスタンスごとの __dict__ を持たない
+    __slots__ = (
+        "vehID", "target_shelter", "near_edgeID_by_target_shelter", "candidate_edge_by_shelterID", "candidate_shelter",
+        "congestion_duration", "tunning_threshold", "route_change_threshold", "route_change_threhold_list",
+        "lane_change_decision_threshold", "minimum_motivation_value", "obtain_info_time",
+        "motivation_increase_from_info_receive", "motivation_decrease_due_to_inactive_neighbors",
+        "motivation_increase_due_to_following_neighbors", "calculated_motivation_value", "motivation_curve",
+        "created_time", "arrival_time", "lane_change_time", "reach_lane_minimum_motivation_time",
+        "created_time_flg", "shelter_flg", "shelter_changed_flg", "evacuation_route_changed_flg",
+        "normalcy_lane_change_motivation_flg", "acceleration_flag", "lane_minimum_motivation_value_flg",
+    )
+
     def __init__(self, vehID:str, target_shelter:str, tunning_threshold:int, 
                  route_change_threshold:float, lane_change_init_threshold:float, 
                  normalcy_motivation_increase:float, motivation_decrease_due_to_inactive_neighbors:float,
@@ -8,11 +21,11 @@ class Agent():
         self.vehID = vehID #　車両ID
         self.target_shelter = target_shelter #　車両が向かう避難所
         self.near_edgeID_by_target_shelter = "" #　車両が向かう避難所に接続するedgeID
-        self.candidate_edge_by_shelterID = {} #　車両が向かう避難所の候補地
+        self.candidate_edge_by_shelterID = None #　車両が向かう避難所の候補地（取得時に確保）
         self.congestion_duration = 0 #　渋滞継続時間
         self.tunning_threshold = tunning_threshold # Agentの行動を変更するstress->tunningへの耐久時間
         self.route_change_threshold = route_change_threshold # Agentの行動を変更するtunnig->change渋滞継続時間の耐久時間
-        self.route_change_threhold_list = [] #　耐久時間リスト
+        self.route_change_threhold_list = None #　耐久時間リスト（取得時に確保）
         self.lane_change_decision_threshold = lane_change_init_threshold # 車線変更動機付け閾値
         self.minimum_motivation_value = lane_minimum_motivation_value
         self.obtain_info_time = 0.0 # 情報取得時間
@@ -20,9 +33,7 @@ class Agent():
         self.motivation_decrease_due_to_inactive_neighbors = motivation_decrease_due_to_inactive_neighbors # 非活動的な近隣車両による動機付け減少量
         self.motivation_increase_due_to_following_neighbors = motivation_increase_due_to_following_neighbors  # 追従する近隣車両による動機付け増加量
         self.calculated_motivation_value = 0.0
-        self.x_elapsed_time_for_lane_change_list = []
-        self.y_motivation_value_for_lane_change_list = []
-        self.lane_change_xy_dict = {}
+        self.motivation_curve:MotivationCurve = None # 経過時間ごとの車線変更動機付けカーブ
         self.created_time = 0.0 # エージェント作成時間
         self.arrival_time = 0.0 # 避難地到着時間
         self.lane_change_time = 0.0 # 車線変更時間
@@ -38,7 +49,7 @@ class Agent():
     # ドライバーの現在の車線変更動機付け値の更新
     def update_calculated_motivation_value(self, current_time:float):
         # TODO ここが間違ってる
-        current_motivation_value = self.get_lane_change_xy_dict().get(current_time)
+        current_motivation_value = self.get_motivation_curve().get_value(current_time)
         # print(f"current_time: {current_time}, current_motivation_value: {current_motivation_value}") 
         self.set_calculated_motivation_value(current_motivation_value)
 
@@ -87,6 +98,8 @@ class Agent():
 
     # 車両が向かう避難所の候補地の取得・設定
     def get_candidate_edge_by_shelterID(self):
+        if self.candidate_edge_by_shelterID is None:
+            self.candidate_edge_by_shelterID = {}
         return self.candidate_edge_by_shelterID
     def set_candidate_edge_by_shelterID(self, candidate_edge_by_shelterID:dict):
         self.candidate_edge_by_shelterID = candidate_edge_by_shelterID
@@ -97,6 +110,14 @@ class Agent():
     def set_candidate_shelter(self, candidate_shelter:list):
         self.candidate_shelter = candidate_shelter
 
+    #　耐久時間リストの取得・設定
+    def get_route_change_threhold_list(self):
+        if self.route_change_threhold_list is None:
+            self.route_change_threhold_list = []
+        return self.route_change_threhold_list
+    def set_route_change_threhold_list(self, route_change_threhold_list:list):
+        self.route_change_threhold_list = route_change_threhold_list
+
     #　渋滞継続時間の取得・設定
     def get_congestion_duration(self):
         return self.congestion_duration
@@ -157,31 +178,11 @@ class Agent():
     def set_calculated_motivation_value(self, calculated_motivation_value:float):
         self.calculated_motivation_value = calculated_motivation_value
 
-    # 車線変更x座標の取得・設定
-    def get_x_elapsed_time_for_lane_change_list(self):
-        return self.x_elapsed_time_for_lane_change_list
-    def set_x_elapsed_time_for_lane_change_list(self, x_elapsed_time_for_lane_change_list:list):
-        self.x_elapsed_time_for_lane_change_list = x_elapsed_time_for_lane_change_list
-    def append_x_elapsed_time_for_lane_change_list(self, value:float):
-        self.x_elapsed_time_for_lane_change_list.append(value)
-    def pop_x_elapsed_time_for_lane_change_list(self):
-        return self.x_elapsed_time_for_lane_change_list.pop()
-
-    # 車線変更y座標の取得・設定
-    def get_y_motivation_value_for_lane_change_list(self):
-        return self.y_motivation_value_for_lane_change_list
-    def set_y_motivation_value_for_lane_change_list(self, y_motivation_value_for_lane_change_list:list):
-        self.y_motivation_value_for_lane_change_list = y_motivation_value_for_lane_change_list
-    def append_y_motivation_value_for_lane_change_list(self, value:float):
-        self.y_motivation_value_for_lane_change_list.append(value)
-    def pop_y_motivation_value_for_lane_change_list(self):
-        return self.y_motivation_value_for_lane_change_list.pop()
-
-    # 車線変更xy座標辞書の取得・設定
-    def get_lane_change_xy_dict(self):
-        return self.lane_change_xy_dict
-    def set_lane_change_xy_dict(self, lane_change_xy_dict:dict):
-        self.lane_change_xy_dict = lane_change_xy_dict
+    # 車線変更動機付けカーブの取得・設定
+    def get_motivation_curve(self):
+        return self.motivation_curve
+    def set_motivation_curve(self, motivation_curve:MotivationCurve):
+        self.motivation_curve = motivation_curve
 
     # エージェント作成時間の取得・設定
     def get_created_time(self):
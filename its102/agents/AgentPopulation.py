@@ -0,0 +1,161 @@
+import math
+
+import numpy as np
+
+from .Agent import Agent
+
+INITIAL_CAPACITY = 256
+# 容量が足りなくなったときの拡張率（2倍にすると未使用の領域が最大で半分になり、Agent より大きくなるため）
+GROWTH_RATE = 1.25
+
+# 配列で保持する Agent の属性（型ごと）
+INT_FIELD_NAMES = (
+    "congestion_duration",
+    "tunning_threshold",
+)
+FLOAT_FIELD_NAMES = (
+    "route_change_threshold",
+    "lane_change_decision_threshold",
+    "minimum_motivation_value",
+    "obtain_info_time",
+    "motivation_increase_from_info_receive",
+    "motivation_decrease_due_to_inactive_neighbors",
+    "motivation_increase_due_to_following_neighbors",
+    "created_time",
+    "arrival_time",
+    "lane_change_time",
+    "reach_lane_minimum_motivation_time",
+)
+NULLABLE_FLOAT_FIELD_NAMES = (
+    "calculated_motivation_value", # MotivationCurve.get_value はカーブ上にない時刻で None を返すため、None は NaN で保持する
+)
+BOOL_FIELD_NAMES = (
+    "created_time_flg",
+    "shelter_flg",
+    "shelter_changed_flg",
+    "evacuation_route_changed_flg",
+    "normalcy_lane_change_motivation_flg",
+    "acceleration_flag",
+    "lane_minimum_motivation_value_flg",
+)
+# 配列にできない属性（文字列・dict・list・MotivationCurve）は AgentView の __slots__ に保持する
+OBJECT_FIELD_NAMES = (
+    "vehID",
+    "target_shelter",
+    "near_edgeID_by_target_shelter",
+    "candidate_edge_by_shelterID",
+    "candidate_shelter",
+    "route_change_threhold_list",
+    "motivation_curve",
+)
+
+class AgentPopulation():
+    '''
+    Agent のスカラー属性（閾値・動機付け値・時刻・フラグ）をエージェントの番号を添字とする NumPy 配列で保持する
+    create_agent() は Agent と同じ getter/setter を持つ AgentView を返すため、既存の処理はそのまま動く
+    文字列・dict・MotivationCurve などの属性は AgentView 自身の __slots__ に保持する
+    get_values() / set_values() で、複数エージェントの属性をまとめて読み書きできる
+    '''
+    def __init__(self, capacity:int=INITIAL_CAPACITY):
+        self._size = 0
+        self._arrays:dict = {} # key: 属性名, value: 配列
+        for field_name in INT_FIELD_NAMES:
+            self._arrays[field_name] = np.zeros(capacity, dtype=np.int32)
+        for field_name in FLOAT_FIELD_NAMES:
+            self._arrays[field_name] = np.zeros(capacity, dtype=np.float64)
+        for field_name in NULLABLE_FLOAT_FIELD_NAMES:
+            self._arrays[field_name] = np.zeros(capacity, dtype=np.float64)
+        for field_name in BOOL_FIELD_NAMES:
+            self._arrays[field_name] = np.zeros(capacity, dtype=bool)
+
+    # Agent と同じ引数で AgentView を作成する
+    def create_agent(self, **agent_kwargs):
+        slot = self._allocate()
+        return AgentView(self, slot, **agent_kwargs)
+
+    def _allocate(self):
+        if self._size >= self.get_capacity():
+            self._grow()
+        slot = self._size
+        self._size += 1
+        return slot
+
+    def _grow(self):
+        self.reserve(max(self.get_capacity() + 1, int(self.get_capacity() * GROWTH_RATE)))
+
+    # 配列の容量を capacity 以上にする　作成する台数が分かっている場合は、先に確保しておくと未使用の領域が残らない
+    def reserve(self, capacity:int):
+        if capacity <= self.get_capacity():
+            return
+        for field_name, array in self._arrays.items():
+            new_array = np.zeros(capacity, dtype=array.dtype)
+            new_array[:len(array)] = array
+            self._arrays[field_name] = new_array
+
+    def get_capacity(self):
+        return len(self._arrays[INT_FIELD_NAMES[0]])
+
+    def __len__(self):
+        return self._size
+
+    # 属性の配列（添字: エージェントの番号）　slots を省略すると全エージェント分
+    def get_values(self, field_name:str, slots=None):
+        values = self._arrays[field_name][:self._size]
+        if slots is None:
+            return values.copy()
+        return values[np.asarray(slots, dtype=np.int64)]
+
+    def set_values(self, field_name:str, values, slots=None):
+        if slots is None:
+            self._arrays[field_name][:self._size] = values
+        else:
+            self._arrays[field_name][np.asarray(slots, dtype=np.int64)] = values
+
+    # 属性の合計バイト数
+    def get_nbytes(self):
+        return sum(array.nbytes for array in self._arrays.values())
+
+def _array_property(field_name:str, cast):
+    def getter(self):
+        return cast(self._population._arrays[field_name][self._slot])
+    def setter(self, value):
+        self._population._arrays[field_name][self._slot] = value
+    return property(getter, setter)
+
+def _nullable_float_property(field_name:str):
+    def getter(self):
+        value = float(self._population._arrays[field_name][self._slot])
+        return None if math.isnan(value) else value
+    def setter(self, value):
+        self._population._arrays[field_name][self._slot] = math.nan if value is None else value
+    return property(getter, setter)
+
+class AgentView():
+    '''
+    AgentPopulation の1エージェント分の参照
+    Agent を継承せず（Agent の __slots__ の領域を持たない）、AgentPopulation とエージェントの番号、配列にできない属性のみを持つ
+    Agent のメソッドをそのまま使い、スカラー属性はプロパティとして AgentPopulation の配列を読み書きする
+    '''
+    __slots__ = ("_population", "_slot") + OBJECT_FIELD_NAMES
+
+    def __init__(self, population:AgentPopulation, slot:int, **agent_kwargs):
+        self._population = population
+        self._slot = slot
+        Agent.__init__(self, **agent_kwargs)
+
+    def get_slot(self):
+        return self._slot
+
+# Agent の getter/setter などのメソッド（属性の読み書きは下のプロパティを通る）
+for _method_name, _method in vars(Agent).items():
+    if callable(_method) and not _method_name.startswith("__"):
+        setattr(AgentView, _method_name, _method)
+
+for _field_name in INT_FIELD_NAMES:
+    setattr(AgentView, _field_name, _array_property(_field_name, int))
+for _field_name in FLOAT_FIELD_NAMES:
+    setattr(AgentView, _field_name, _array_property(_field_name, float))
+for _field_name in NULLABLE_FLOAT_FIELD_NAMES:
+    setattr(AgentView, _field_name, _nullable_float_property(_field_name))
+for _field_name in BOOL_FIELD_NAMES:
+    setattr(AgentView, _field_name, _array_property(_field_name, bool))
@@ -1,6 +1,14 @@
-import traci
+from ..sumo_backend import traci
 
 class CustomeEdge():
+    # 属性は __slots__ で固定し、インスタンスごとの __dict__ を持たない
+    __slots__ = (
+        "current_edgeID", "opposite_edgeID", "start_junction", "end_junction", "start_edge_flag", "end_edge_flag",
+        "neighbour_incom_edgeIDs_by_start_junc", "neighbour_outgo_edgeIDs_by_start_junc",
+        "neighbour_incom_edgeIDs_by_end_junc", "neighbour_outgo_edgeIDs_by_end_junc",
+        "lane_shape", "lane_length", "center",
+    )
+
     def __init__(self, current_edgeID:str):
         self.current_edgeID = current_edgeID
         self.opposite_edgeID  = ""
@@ -8,41 +16,71 @@ class CustomeEdge():
         self.end_junction = "" # 終了の交差点
         self.start_edge_flag = False # このedgeが開始エッジ（incomエッジが存在しない）
         self.end_edge_flag = False #　このedgeが終了エッジ（outgoエッジが存在しない）
-
-    # 初期の反対edgeの設定
-    def setting_init_opposite_edgeID(self, edgeIDs:list):
+        # 道路網はシミュレーション中に変化しないため、init_custom_edge で一度だけ求めて保持する
+        self.neighbour_incom_edgeIDs_by_start_junc:tuple = ()
+        self.neighbour_outgo_edgeIDs_by_start_junc:tuple = ()
+        self.neighbour_incom_edgeIDs_by_end_junc:tuple = ()
+        self.neighbour_outgo_edgeIDs_by_end_junc:tuple = ()
+        self.lane_shape:tuple = () # 第0車線の形状
+        self.lane_length = 0.0 # 第0車線の長さ
+        self.center = None # 第0車線の始点と次の点の中点
+
+    # 初期の反対edgeの設定　edgeIDs は set を渡すと O(1) で判定する
+    def setting_init_opposite_edgeID(self, edgeIDs):
         if self.get_current_edgeID().startswith("-"):
             opposite_edgeID:str = self.get_current_edgeID().lstrip('-')
         else:
             opposite_edgeID:str = "-" + self.get_current_edgeID()
-        for edgeID in edgeIDs:
-            if edgeID == opposite_edgeID:
-                self.set_opposite_edgeID(opposite_edgeID)
+        if opposite_edgeID in edgeIDs:
+            self.set_opposite_edgeID(opposite_edgeID)
 
     # 初期の開始交差点の設定
-    def setting_init_start_end_junctions(self):
+    def setting_init_start_end_junctions(self, start_junction:str=None, end_junction:str=None):
         # currentEdgeが-から始まる場合、開始交差点はFromJunction、終了交差点はToJunction
         # TODO　確認 左側通行なので　ToJunctionが開始交差点、FromJunctionが終了交差点
         # print("current_edgeID: ", self.get_current_edgeID())
-        self.set_start_junction(traci.edge.getToJunction(self.get_current_edgeID()))
-        self.set_end_junction(traci.edge.getFromJunction(self.get_current_edgeID()))
+        if start_junction is None:
+            start_junction = traci.edge.getToJunction(self.get_current_edgeID())
+        if end_junction is None:
+            end_junction = traci.edge.getFromJunction(self.get_current_edgeID())
+        self.set_start_junction(start_junction)
+        self.set_end_junction(end_junction)
+
+    # 隣接edgeIDsの初期設定
+    # outgoing_edgeIDs_by_junction / incoming_edgeIDs_by_junction（key: junctionID, value: traci.junction.getOutgoingEdges / getIncomingEdges の結果）から求める
+    def setting_init_neighbour_edgeIDs(self, outgoing_edgeIDs_by_junction:dict, incoming_edgeIDs_by_junction:dict):
+        start_junction_outgoing_edgeIDs = outgoing_edgeIDs_by_junction.get(self.get_start_junction(), ())
+        start_junction_incoming_edgeIDs = incoming_edgeIDs_by_junction.get(self.get_start_junction(), ())
+        end_junction_outgoing_edgeIDs = outgoing_edgeIDs_by_junction.get(self.get_end_junction(), ())
+        end_junction_incoming_edgeIDs = incoming_edgeIDs_by_junction.get(self.get_end_junction(), ())
+        self.neighbour_incom_edgeIDs_by_start_junc = tuple(item for item in start_junction_outgoing_edgeIDs if item != self.get_opposite_edgeID())
+        self.neighbour_outgo_edgeIDs_by_start_junc = tuple(item for item in start_junction_incoming_edgeIDs if item != self.get_current_edgeID())
+        self.neighbour_incom_edgeIDs_by_end_junc = tuple(item for item in end_junction_outgoing_edgeIDs if item != self.get_opposite_edgeID())
+        self.neighbour_outgo_edgeIDs_by_end_junc = tuple(item for item in end_junction_incoming_edgeIDs if item != self.get_current_edgeID())
+
+    # 第0車線の形状・長さ・中心の初期設定
+    def setting_init_lane_geometry(self, lane_shape:tuple, lane_length:float):
+        self.lane_shape = tuple(lane_shape)
+        self.lane_length = lane_length
+        if len(self.lane_shape) >= 2:
+            self.center = ((self.lane_shape[0][0] + self.lane_shape[1][0])/2, (self.lane_shape[0][1] + self.lane_shape[1][1])/2)
 
     # start_junctionによってincoming方向に接続する隣接するedgeIDsの取得
     # current_edgeIDが-から始まる場合、左側車線　start_junctionが開始交差点　end_junctionが終了交差点
     def obtain_neighbour_incom_edgeIDs_with_junc_by_start_junc(self):
-        return tuple(item for item in traci.junction.getOutgoingEdges(self.get_start_junction()) if item != self.get_opposite_edgeID())
+        return self.neighbour_incom_edgeIDs_by_start_junc
 
     # end_junctionによってoutgoing方向に接続する隣接edgeIDsの取得
     def obtain_neighbour_outgo_edgeIDs_with_junc_by_start_junc(self):
-        return tuple(item for item in traci.junction.getIncomingEdges(self.get_start_junction()) if item != self.get_current_edgeID())
+        return self.neighbour_outgo_edgeIDs_by_start_junc
 
     # start_junctionによってoutgoing方向に接続する隣接edgeIDsの取得
     def obtain_neighbour_incom_edgeIDs_with_junc_by_end_junc(self):
-        return tuple(item for item in traci.junction.getOutgoingEdges(self.get_end_junction()) if item != self.get_opposite_edgeID())
+        return self.neighbour_incom_edgeIDs_by_end_junc
 
     # end_junctionによってincoming方向に接続する隣接edgeIDsの取得
     def obtain_neighbour_outgo_edgeIDs_with_junc_by_end_junc(self):
-        return tuple(item for item in traci.junction.getIncomingEdges(self.get_end_junction()) if item != self.get_current_edgeID())
+        return self.neighbour_outgo_edgeIDs_by_end_junc
 
     def custom_edge_info_print(self):
         print(f'[{self.get_start_junction()}]====={self.get_current_edgeID()}=====[{self.get_end_junction()}]')
@@ -99,6 +137,14 @@ class CustomeEdge():
     def set_end_junction(self, end_junction:str):
         self.end_junction = end_junction
 
+    # 第0車線の形状・長さ・中心の取得
+    def get_lane_shape(self):
+        return self.lane_shape
+    def get_lane_length(self):
+        return self.lane_length
+    def get_center(self):
+        return self.center
+
     # 開始エッジフラグの取得と設定
     def get_start_edge_flag(self):
         return self.start_edge_flag
@@ -112,6 +158,9 @@ class CustomeEdge():
         self.end_edge_flag = end_edge_flag
 
 class ConnectedEdges():
+    # all_edgeIDs.json から大量に作成するため、__slots__ で __dict__ を持たない
+    __slots__ = ("start_edgeID", "end_edgeID", "via_edgeIDs")
+
     def __init__(self, start_edgeID:str, end_edgeID:str, via_edgeIDs:list):
         self.start_edgeID = start_edgeID
         self.end_edgeID = end_edgeID
@@ -0,0 +1,50 @@
+from types import MappingProxyType
+
+class KnowledgeRecord():
+    '''
+    車両が持つ知識（混雑情報・津波前兆情報・ルートごとの避難時間）の情報の種類ごとの不変なスナップショット
+    内容は読み出し専用の辞書（get_data）で、更新は新しい版の KnowledgeRecord を作成する（updated / merged）
+    V2V通信・再生成した車両への引き継ぎでは KnowledgeRecord をそのまま渡す（参照の置き換えのみで複製しない）
+    値（[混雑度, 時刻] などのリスト、ルートごとの情報の辞書）は置き換えのみで、中身は書き換えない前提
+    同じ版かどうかは同一のオブジェクトか（is）で判定する　どちらの版が新しいかは内容の時刻で判定する（作成順とは一致しない）
+    '''
+    __slots__ = ("_data",)
+
+    def __init__(self, data:dict=None):
+        self._data = MappingProxyType({} if data is None else dict(data))
+
+    # key の値を value にした新しい版
+    def updated(self, key, value):
+        data = dict(self._data)
+        data[key] = value
+        return KnowledgeRecord(data)
+
+    # updated と同じ内容の版を、同じ版から同じ内容で更新した車両の間で共有する（初期値の設定用）
+    # shared_records は呼び出し側が作成する辞書　key: (元の版, key, value), value: 作成した版
+    # value はリストなどの中身を比較できる値に限る
+    def shared_updated(self, key, value, shared_records:dict):
+        shared_key = (self, key, tuple(value) if isinstance(value, list) else value)
+        record = shared_records.get(shared_key)
+        if record is None:
+            record = self.updated(key, value)
+            shared_records[shared_key] = record
+        return record
+
+    # items の内容で上書きした新しい版
+    def merged(self, items:dict):
+        data = dict(self._data)
+        data.update(items)
+        return KnowledgeRecord(data)
+
+    # 読み出し専用の辞書
+    def get_data(self):
+        return self._data
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def __repr__(self):
+        return f"KnowledgeRecord(data={dict(self._data)})"
+
+# 知識を持たない車両で共有する空の版
+EMPTY_RECORD = KnowledgeRecord()
@@ -0,0 +1,127 @@
+from bisect import bisect_right
+
+import numpy as np
+
+# 区間の係数 (base_weight, offset, lower, upper, shift)
+# 区間内の値は max(min(base_weight * base_y + offset, upper), lower) + shift
+IDENTITY_SEGMENT = (1.0, 0.0, -np.inf, np.inf, 0.0)
+
+# 車線変更動機付けカーブ
+# 全エージェントで共有する基底カーブ（不変のNumPy配列）と、エージェントごとの区分的な上書き（オーバーレイ）で表す
+# オーバーレイは「開始index以降に適用する係数」の短いリストで、通常は数区間しか持たない
+class MotivationCurve():
+    def __init__(self, base_x:np.ndarray, base_y:np.ndarray):
+        self._base_x = base_x # 経過時間（昇順）　全エージェントで共有
+        self._base_y = base_y # 経過時間ごとの基底の動機付け値　全エージェントで共有
+        self._segment_start_indexes:list = [] # 区間の開始index（昇順）
+        self._segments:list = [] # 区間の係数（IDENTITY_SEGMENT と同じ並び）
+        self._owns_overlay = True # False の場合はオーバーレイを他のカーブと共有している
+
+    # 再生成した車両へ引き継ぐ　基底カーブもオーバーレイも共有し、オーバーレイは最初に書き換える側だけが複製する
+    def copy(self):
+        motivation_curve = MotivationCurve(self._base_x, self._base_y)
+        motivation_curve._segment_start_indexes = self._segment_start_indexes
+        motivation_curve._segments = self._segments
+        motivation_curve._owns_overlay = False
+        self._owns_overlay = False
+        return motivation_curve
+
+    # オーバーレイを書き換える前に呼び出し、共有している場合は複製する
+    def _ensure_own_overlay(self):
+        if not self._owns_overlay:
+            self._segment_start_indexes = list(self._segment_start_indexes)
+            self._segments = list(self._segments)
+            self._owns_overlay = True
+
+    # 経過時間に対応する動機付け値の取得　カーブ上にない経過時間の場合は None
+    def get_value(self, elapsed_time:float):
+        index = int(np.searchsorted(self._base_x, elapsed_time, side="left"))
+        if index == len(self._base_x) or self._base_x[index] != elapsed_time:
+            return None
+        return self._value_at_index(index)
+
+    # 基底カーブの値を線形補間で取得（範囲外は端の値）
+    def get_base_value(self, elapsed_time:float):
+        return float(np.interp(elapsed_time, self._base_x, self._base_y))
+
+    def _value_at_index(self, index:int):
+        base_value = float(self._base_y[index])
+        segment_index = bisect_right(self._segment_start_indexes, index) - 1
+        if segment_index < 0:
+            return base_value
+        base_weight, offset, lower, upper, shift = self._segments[segment_index]
+        return max(min(base_weight * base_value + offset, upper), lower) + shift
+
+    # elapsed_time 以降（inclusive=False の場合は elapsed_time より後）の先頭index　該当なしは None
+    def _tail_start_index(self, elapsed_time:float, inclusive:bool):
+        side = "left" if inclusive else "right"
+        index = int(np.searchsorted(self._base_x, elapsed_time, side=side))
+        if index == len(self._base_x):
+            return None
+        return index
+
+    # start_index から始まる区間を用意し、その区間の位置を返す
+    def _split_at(self, start_index:int):
+        self._ensure_own_overlay()
+        segment_index = bisect_right(self._segment_start_indexes, start_index) - 1
+        if segment_index >= 0 and self._segment_start_indexes[segment_index] == start_index:
+            return segment_index
+        segment = self._segments[segment_index] if segment_index >= 0 else IDENTITY_SEGMENT
+        self._segment_start_indexes.insert(segment_index + 1, start_index)
+        self._segments.insert(segment_index + 1, segment)
+        return segment_index + 1
+
+    # start_index 以降の区間を1つの区間で置き換える
+    def _replace_tail(self, start_index:int, segment:tuple):
+        segment_index = self._split_at(start_index)
+        del self._segment_start_indexes[segment_index + 1:]
+        del self._segments[segment_index + 1:]
+        self._segments[segment_index] = segment
+
+    # elapsed_time 以降の値に offset を加算する
+    def add_offset_from(self, elapsed_time:float, offset:float, inclusive:bool=True):
+        start_index = self._tail_start_index(elapsed_time, inclusive)
+        if start_index is None:
+            return
+        segment_index = self._split_at(start_index)
+        for i in range(segment_index, len(self._segments)):
+            base_weight, segment_offset, lower, upper, shift = self._segments[i]
+            self._segments[i] = (base_weight, segment_offset, lower, upper, shift + offset)
+
+    # elapsed_time 以降の値を「基底カーブ + offset を [lower, upper] に収めた値」で置き換える（lower を優先）
+    def shift_and_clamp_from(self, elapsed_time:float, offset:float, lower:float, upper:float, inclusive:bool=True):
+        start_index = self._tail_start_index(elapsed_time, inclusive)
+        if start_index is None:
+            return
+        self._replace_tail(start_index, (1.0, offset, lower, upper, 0.0))
+
+    # elapsed_time 以降の値を value で一定にする
+    def flatten_from(self, elapsed_time:float, value:float, inclusive:bool=False):
+        start_index = self._tail_start_index(elapsed_time, inclusive)
+        if start_index is None:
+            return
+        self._replace_tail(start_index, (0.0, value, -np.inf, np.inf, 0.0))
+
+    # 経過時間（x座標）の取得
+    def get_x_values(self):
+        return self._base_x
+
+    # 動機付け値（y座標）を全経過時間について取得　区間ごとにスライス代入でまとめて計算する
+    def get_y_values(self):
+        y_values = np.array(self._base_y, dtype=float)
+        segment_end_indexes = self._segment_start_indexes[1:] + [len(self._base_x)]
+        for start_index, end_index, segment in zip(self._segment_start_indexes, segment_end_indexes, self._segments):
+            base_weight, offset, lower, upper, shift = segment
+            y_values[start_index:end_index] = np.maximum(
+                                                        np.minimum(base_weight * self._base_y[start_index:end_index] + offset, upper), 
+                                                        lower
+                                                        ) + shift
+        return y_values
+
+    # 複数の経過時間に対する動機付け値をまとめて取得　カーブ上にない経過時間は NaN
+    def get_values(self, elapsed_times):
+        elapsed_times = np.asarray(elapsed_times, dtype=float)
+        indexes = np.searchsorted(self._base_x, elapsed_times, side="left")
+        clipped_indexes = np.minimum(indexes, len(self._base_x) - 1)
+        on_curve_mask = (indexes < len(self._base_x)) & (self._base_x[clipped_indexes] == elapsed_times)
+        return np.where(on_curve_mask, self.get_y_values()[clipped_indexes], np.nan)
@@ -0,0 +1,94 @@
+from .Shelter import Shelter
+
+# IDをキーにAgent/VehicleInfo/Shelter/CustomeEdgeを保持するレジストリの基底クラス
+# listと同じくappend/extend/iterで扱えるが、IDによる検索はO(1)で行う
+# key_of には登録オブジェクトからキー（ID）を取得する関数を渡す
+class Registry():
+    def __init__(self, key_of, items:list=None):
+        self._key_of = key_of
+        self._item_by_key:dict = {} # key: ID, value: 登録オブジェクト（登録順）
+        self._retired_keys:set = set() # 到着・削除済みのID
+        if items is not None:
+            self.extend(items)
+
+    # 登録オブジェクトからキーを取得
+    def key_of(self, item):
+        return self._key_of(item)
+
+    # 登録　同じIDが既に存在する場合は同じ位置で置き換える（newveh_* の再生成に対応）
+    def register(self, item):
+        key = self.key_of(item)
+        self._retired_keys.discard(key)
+        self._item_by_key[key] = item
+        return item
+
+    # list互換の追加
+    def append(self, item):
+        self.register(item)
+    def extend(self, items):
+        for item in items:
+            self.register(item)
+
+    # IDから検索　退役済みのオブジェクトも検索対象とする
+    def find(self, key:str):
+        return self._item_by_key.get(key)
+
+    # 到着・削除された車両を走行中の索引から外す
+    def retire(self, key:str):
+        if key not in self._item_by_key or key in self._retired_keys:
+            return None
+        self._retired_keys.add(key)
+        return self._item_by_key[key]
+
+    def is_active(self, key:str):
+        return key in self._item_by_key and key not in self._retired_keys
+
+    # 走行中のオブジェクトのみを取得（登録順）
+    def active_values(self):
+        return [item for key, item in self._item_by_key.items() if key not in self._retired_keys]
+
+    # 退役済みのオブジェクトのみを取得（登録順）
+    def retired_values(self):
+        return [item for key, item in self._item_by_key.items() if key in self._retired_keys]
+
+    # 走行中・退役済みを区別せず登録順に返す（list と同じ順序）
+    def __iter__(self):
+        return iter(self._item_by_key.values())
+
+    def __len__(self):
+        return len(self._item_by_key)
+
+# vehIDをキーにAgentを保持する
+class AgentRegistry(Registry):
+    def __init__(self, items:list=None):
+        super().__init__(key_of=lambda agent: agent.get_vehID(), items=items)
+
+# vehIDをキーにVehicleInfoを保持する
+class VehicleInfoRegistry(Registry):
+    def __init__(self, items:list=None):
+        super().__init__(key_of=lambda vehInfo: vehInfo.get_vehID(), items=items)
+
+# edgeIDをキーにCustomeEdgeを保持する
+class EdgeRegistry(Registry):
+    def __init__(self, items:list=None):
+        super().__init__(key_of=lambda custome_edge: custome_edge.get_current_edgeID(), items=items)
+
+    def edgeIDs(self):
+        return list(self._item_by_key)
+
+# shelterIDをキーにShelterを保持する
+# 避難所に接続するedgeIDからの検索にも対応する（同一edgeに複数の避難所がある場合は先に登録した避難所を返す）
+class ShelterRegistry(Registry):
+    def __init__(self, items:list=None):
+        self._shelter_by_near_edgeID:dict = {} # key: near_edgeID, value: Shelter
+        super().__init__(key_of=lambda shelter: shelter.get_shelterID(), items=items)
+
+    def register(self, item:Shelter):
+        replaced:Shelter = self.find(self.key_of(item))
+        if replaced is not None and self._shelter_by_near_edgeID.get(replaced.get_near_edgeID()) is replaced:
+            self._shelter_by_near_edgeID[replaced.get_near_edgeID()] = item
+        self._shelter_by_near_edgeID.setdefault(item.get_near_edgeID(), item)
+        return super().register(item)
+
+    def find_by_near_edgeID(self, near_edgeID:str):
+        return self._shelter_by_near_edgeID.get(near_edgeID)
@@ -1,9 +1,15 @@
-import traci
+from ..sumo_backend import traci
 from numpy import double
 from collections import defaultdict
 
 # 避難地の情報をセットするクラス
 class Shelter:
+    # 属性は __slots__ で固定し、インスタンスごとの __dict__ を持たない
+    __slots__ = (
+        "_shelterID", "_capacity", "near_edgeID", "arrival_vehID_list", "congestion_rate", "positoin", "position_flag",
+        "evacuation_time_from_junction_multidict", "avg_evac_time_by_route", "total_arrival_vehIDs",
+    )
+
     def __init__(self, shelterID:str, capacity:int, near_edgeID:str):
         self._shelterID = shelterID
         self._capacity = capacity
@@ -1,20 +1,38 @@
-import traci
+from ..sumo_backend import traci
 from numpy import double
 from collections import defaultdict
 
+from .KnowledgeRecord import EMPTY_RECORD, KnowledgeRecord
+
+# 初期値の知識は全車両で内容が同じため、1つの版を共有する
+INITIAL_AVG_EVAC_TIME_BY_RECIVE_TIME_RECORD = KnowledgeRecord({0.0: EMPTY_RECORD.get_data()})
+# 津波前兆情報の未取得の版（参照するのは値のみのため、車両IDの代わりに None をキーにする）
+UNINFORMED_TSUNAMI_PRECURSOR_RECORD = KnowledgeRecord({None: [False, 0.0]})
+
 # 車両が持つ情報を保存
 class VehicleInfo():
     '''
     list_around_vehID -> key: vehID, value[1]: speed, value[2]: time_stamp
     '''
     multi_map = defaultdict(list)
+    # 属性は __slots__ で固定し、インスタンスごとの __dict__ を持たない
+    __slots__ = (
+        "_vehID", "_target_shelter", "_edgeID_connect_target_shelter",
+        "_multiDict_around_vehInfos", "_shelter_congestion_info", "_tsunami_precursor_info",
+        "_create_time", "_stopping_time", "_evac_start_time", "_evac_end_time",
+        "_arrival_flag", "_arrival_time", "_decline_edge_arrival_flag", "_parked_flag",
+        "_avg_evac_time_by_route_from_shelter", "_avg_evac_time_by_route_by_recive_time",
+        "_stop_flag", "_start_time_measured_flag", "_agent_changed_flag",
+    )
+
     def __init__(self, vehID:str, target_shelter:str, edgeID_connect_target_shelter:str, create_time: double):
         self._vehID = vehID # 車両ID
         self._target_shelter = target_shelter # 車両が向かう避難所ID
         self._edgeID_connect_target_shelter = edgeID_connect_target_shelter # 車両が向かう避難所edgeID
-        self._multiDict_around_vehInfos:defaultdict = defaultdict(list) # key: vehID, value: [speed, time_stamp]
-        self._shelter_congestion_info:defaultdict = defaultdict(list) # key: vehID, value: [shelter, congestion]
-        self._tsunami_precursor_info:defaultdict = defaultdict(list) # key: vehID, value: [tsunami_precursor_flag, time_stamp]
+        self._multiDict_around_vehInfos:defaultdict = None # key: vehID, value: [speed, time_stamp]　最初に参照したときに確保する
+        # 知識は不変な KnowledgeRecord で保持し、更新のたびに新しい版に置き換える（初期値は全車両で共有する空の版）
+        self._shelter_congestion_info:KnowledgeRecord = EMPTY_RECORD # key: vehID, value: [shelter, congestion]
+        self._tsunami_precursor_info:KnowledgeRecord = EMPTY_RECORD # key: vehID, value: [tsunami_precursor_flag, time_stamp]
         self._create_time = create_time
         self._stopping_time = 0
         self._evac_start_time = 0.0 # 交差点1に進入してからの開始時間
@@ -23,8 +41,8 @@ class VehicleInfo():
         self._arrival_time = 0
         self._decline_edge_arrival_flag = False # 車両が避難所の手前のedgeに到着したかどうかのフラグ
         self._parked_flag = False # 車両が駐車しているかどうかのフラグ
-        self._avg_evac_time_by_route_from_shelter={} # key:time ルートごとの避難時間を保存する辞書
-        self._avg_evac_time_by_route_by_recive_time ={}
+        self._avg_evac_time_by_route_from_shelter:KnowledgeRecord = EMPTY_RECORD # key:time ルートごとの避難時間を保存する辞書
+        self._avg_evac_time_by_route_by_recive_time:KnowledgeRecord = EMPTY_RECORD
         self._stop_flag = False # 車両が停止しているかどうかのフラグ
         self._start_time_measured_flag = False # 車両の避難開始時間を測定するフラグ
         self._agent_changed_flag = False # 車両の避難所が変更されたかどうかのフラグ
@@ -32,34 +50,34 @@ class VehicleInfo():
 
     # 車両周辺の車両情報を更新
     def update_around_vehInfos(self, around_vehID:str, speed:double, time_stamp:double):
-        self._multiDict_around_vehInfos[around_vehID] = [speed, time_stamp]
+        self.get_multiDict_around_vehIDs()[around_vehID] = [speed, time_stamp]
 
     # 特定の周辺車両の最新車速を取得
     def get_latest_speed(self, around_vehID:str):
-        return self._multiDict_around_vehInfos[around_vehID][0]
+        return self.get_multiDict_around_vehIDs()[around_vehID][0]
 
     # 特定の周辺車両の最新タイムスタンプを取得
     def get_latest_time_stamp(self, around_vehID:str):
-        return self._multiDict_around_vehInfos[around_vehID][1]
+        return self.get_multiDict_around_vehIDs()[around_vehID][1]
 
     # 避難地の混雑情報を更新
     def update_shelter_congestion_info(self, shelterID:str, congestion:int, time_stamp:double):
-        self._shelter_congestion_info[shelterID] = [congestion, time_stamp]
+        self._shelter_congestion_info = self._shelter_congestion_info.updated(shelterID, [congestion, time_stamp])
 
     # ルートごとの避難所要時間を更新する
     def v2shelter_update_avg_evac_time_by_route(self, avg_evac_time_by_route:dict):
-        for route, info in avg_evac_time_by_route.items():
-            self._avg_evac_time_by_route_from_shelter[route] = info
+        self._avg_evac_time_by_route_from_shelter = self._avg_evac_time_by_route_from_shelter.merged(avg_evac_time_by_route)
     
     # ルートごとの避難時間を更新する
     def v2v_avg_evac_time_by_route_by_recive_time(self, current_time:double):
-        # 初期化
-        self._avg_evac_time_by_route_by_recive_time = {}
-        self._avg_evac_time_by_route_by_recive_time[current_time] = self.get_avg_evac_time_by_route_from_shelter()
+        # 受信時刻と、その時点のルートごとの避難時間の版だけを持つ
+        self._avg_evac_time_by_route_by_recive_time = KnowledgeRecord({current_time: self.get_avg_evac_time_by_route_from_shelter()})
     
     # 津波接近予兆情報を更新する
     def update_tsunami_precursor_info(self, vehID:str,  tsunami_precursor_flag:int, current_time:double):
-        self._tsunami_precursor_info[vehID] = [tsunami_precursor_flag, current_time]
+        # 未取得の版（共有）は自車の情報で置き換える
+        tsunami_precursor_info = EMPTY_RECORD if self._tsunami_precursor_info is UNINFORMED_TSUNAMI_PRECURSOR_RECORD else self._tsunami_precursor_info
+        self._tsunami_precursor_info = tsunami_precursor_info.updated(vehID, [tsunami_precursor_flag, current_time])
     
     def has_tsunami_precursor_info(self) -> bool:
         """
@@ -76,25 +94,35 @@ class VehicleInfo():
     # 特定の避難所の混雑情報の最新タイムスタンプを取得
     def get_latest_time_stamp_of_shelter(self, shelter:str):
         try:
-            return self._shelter_congestion_info[shelter][1]
+            return self._shelter_congestion_info.get_data()[shelter][1]
         except Exception as e:
             return 0
 
     # 特定の周辺車両の最新避難地情報を取得
     def get_congestion_level_by_shelter(self, shelter:str):
         try:
-            return self._shelter_congestion_info[shelter][0]
+            return self._shelter_congestion_info.get_data()[shelter][0]
         except Exception as e:
             return 0
 
-    def init_set_congestion_level_by_shelter(self, shelter:str, congestion:double, time_stamp:double):
-        self._shelter_congestion_info[shelter] = [congestion, time_stamp]
+    # shared_records を渡した場合は、同じ辞書を渡した車両のうち初期値が同じ内容の車両の間で版を共有する
+    def init_set_congestion_level_by_shelter(self, shelter:str, congestion:double, time_stamp:double, shared_records:dict=None):
+        if shared_records is None:
+            self._shelter_congestion_info = self._shelter_congestion_info.updated(shelter, [congestion, time_stamp])
+        else:
+            self._shelter_congestion_info = self._shelter_congestion_info.shared_updated(shelter, [congestion, time_stamp], shared_records)
     
     def init_set_avg_evac_time_by_route_by_recive_time(self):
-        self._avg_evac_time_by_route_by_recive_time[0.0] = {}
+        if self._avg_evac_time_by_route_by_recive_time is EMPTY_RECORD:
+            self._avg_evac_time_by_route_by_recive_time = INITIAL_AVG_EVAC_TIME_BY_RECIVE_TIME_RECORD
+        else:
+            self._avg_evac_time_by_route_by_recive_time = self._avg_evac_time_by_route_by_recive_time.updated(0.0, EMPTY_RECORD.get_data())
     
     def init_set_tsunami_precursor_info(self):
-        self._tsunami_precursor_info[self.get_vehID()] = [False, 0.0]
+        if self._tsunami_precursor_info is EMPTY_RECORD:
+            self._tsunami_precursor_info = UNINFORMED_TSUNAMI_PRECURSOR_RECORD
+        else:
+            self._tsunami_precursor_info = self._tsunami_precursor_info.updated(self.get_vehID(), [False, 0.0])
     
     def update_stopping_time(self):
         self._stopping_time += 1
@@ -121,21 +149,43 @@ class VehicleInfo():
 
     # 車両周辺の車両情報のgetter/setter
     def get_multiDict_around_vehIDs(self):
+        if self._multiDict_around_vehInfos is None:
+            self._multiDict_around_vehInfos = defaultdict(list)
         return self._multiDict_around_vehInfos
     def set_multiDict_around_vehIDs(self, around_vehInfo:defaultdict):
         self._multiDict_around_vehInfos = around_vehInfo
 
-    # 避難地周辺の車両情報のgetter/setter
+    # 避難地周辺の車両情報のgetter/setter（getter は読み出し専用の辞書）
     def get_shelter_congestion_info(self):
+        return self._shelter_congestion_info.get_data()
+    def set_shelter_congestion_info(self, shelter_congestion_info:dict):
+        self._shelter_congestion_info = KnowledgeRecord(shelter_congestion_info)
+    def get_shelter_congestion_record(self):
         return self._shelter_congestion_info
-    def set_shelter_congestion_info(self, shelter_congestion_info:defaultdict):
-        self._shelter_congestion_info = shelter_congestion_info
+    def set_shelter_congestion_record(self, shelter_congestion_record:KnowledgeRecord):
+        self._shelter_congestion_info = shelter_congestion_record
 
-    # 津波前兆情報のgetter/setter
+    # 津波前兆情報のgetter/setter（getter は読み出し専用の辞書）
     def get_tsunami_precursor_info(self):
+        return self._tsunami_precursor_info.get_data()
+    def set_tsunami_precursor_info(self, tsunami_precursor_info:dict):
+        self._tsunami_precursor_info = KnowledgeRecord(tsunami_precursor_info)
+    def get_tsunami_precursor_record(self):
+        return self._tsunami_precursor_info
+    def set_tsunami_precursor_record(self, tsunami_precursor_record:KnowledgeRecord):
+        self._tsunami_precursor_info = tsunami_precursor_record
+    # 再生成した車両へ知識を引き継ぐ（版をそのまま共有し、複製しない）
+    def inherit_knowledge(self, vehInfo:"VehicleInfo", tsunami_precursor:bool=True):
+        self._shelter_congestion_info = vehInfo.get_shelter_congestion_record()
+        self._avg_evac_time_by_route_by_recive_time = vehInfo.get_avg_evac_time_by_route_record()
+        if tsunami_precursor:
+            self._tsunami_precursor_info = vehInfo.get_inherited_tsunami_precursor_record()
+
+    # 再生成した車両へ引き継ぐ版（未取得の共有の版は、この車両のIDをキーにした版にする）
+    def get_inherited_tsunami_precursor_record(self):
+        if self._tsunami_precursor_info is UNINFORMED_TSUNAMI_PRECURSOR_RECORD:
+            return KnowledgeRecord({self._vehID: [False, 0.0]})
         return self._tsunami_precursor_info
-    def set_tsunami_precursor_info(self, tsunami_precursor_info:defaultdict):
-        self._tsunami_precursor_info = tsunami_precursor_info
 
     # 車両の生成時間のgetter/setter
     def get_create_time(self):
@@ -183,17 +233,21 @@ class VehicleInfo():
     def set_parked_flag(self, parked_flag: bool):
         self._parked_flag = parked_flag
 
-    # 避難地から受け取る車両のルートごとの避難時間のgetter/setter
+    # 避難地から受け取る車両のルートごとの避難時間のgetter/setter（getter は読み出し専用の辞書）
     def get_avg_evac_time_by_route_from_shelter(self):
-        return self._avg_evac_time_by_route_from_shelter
+        return self._avg_evac_time_by_route_from_shelter.get_data()
     def set_avg_evac_time_by_route_from_shelter(self, avg_evac_time_by_route_from_shelter:dict):
-        self._avg_evac_time_by_route_from_shelter = avg_evac_time_by_route_from_shelter
+        self._avg_evac_time_by_route_from_shelter = KnowledgeRecord(avg_evac_time_by_route_from_shelter)
     
-    # 現時点で、車両が持つ避難所のルートごとの避難時間のgetter/setter
+    # 現時点で、車両が持つ避難所のルートごとの避難時間のgetter/setter（getter は読み出し専用の辞書）
     def get_avg_evac_time_by_route_by_recive_time(self):
-        return self._avg_evac_time_by_route_by_recive_time
+        return self._avg_evac_time_by_route_by_recive_time.get_data()
     def set_avg_evac_time_by_route_by_recive_time(self, avg_evac_time_by_route_by_recive_time:dict):
-        self._avg_evac_time_by_route_by_recive_time = avg_evac_time_by_route_by_recive_time
+        self._avg_evac_time_by_route_by_recive_time = KnowledgeRecord(avg_evac_time_by_route_by_recive_time)
+    def get_avg_evac_time_by_route_record(self):
+        return self._avg_evac_time_by_route_by_recive_time
+    def set_avg_evac_time_by_route_record(self, avg_evac_time_by_route_record:KnowledgeRecord):
+        self._avg_evac_time_by_route_by_recive_time = avg_evac_time_by_route_record
     
     # 車両の停止フラグのgetter/setter
     def get_stop_flag(self):
@@ -214,7 +268,7 @@ class VehicleInfo():
         self._agent_changed_flag = agent_changed_flag
 
     def print_shelter_congestion_info(self):
-        print(f"vehID:{self._vehID} has shelter_congestion_info: {self._shelter_congestion_info}")
+        print(f"vehID:{self._vehID} has shelter_congestion_info: {dict(self.get_shelter_congestion_info())}")
 
     def print_has_congestion_info(self):
-        print(f"vehID:{self._vehID} has congestion_info: {self._shelter_congestion_info}")
\ No newline at end of file
+        print(f"vehID:{self._vehID} has congestion_info: {dict(self.get_shelter_congestion_info())}")
\ No newline at end of file
@@ -0,0 +1,123 @@
+# =========================
+# Standard library
+# =========================
+import math
+import os
+import sys
+from bisect import bisect_left, bisect_right
+
+# =========================
+# SUMO (SUMO_HOME must be on sys.path before importing traci)
+# =========================
+if "SUMO_HOME" in os.environ:
+    sys.path.append(os.path.join(os.environ["SUMO_HOME"], "tools"))
+
+from .sumo_backend import traci  # noqa: E402
+from .step_snapshot import snapshot  # noqa: E402
+
+# 2分探索で候補を絞るときの余裕（射影の丸め誤差で境界上の車両を落とさないため）
+OFFSET_TOLERANCE = 1e-6
+
+class DensityField():
+    '''
+    1ステップ分の edge ごとの車両の並び（edge に沿った位置の昇順）
+    ステップで最初に count_neighbours() を呼び出したときに snapshot から作り、以後は同じステップ内で使い回す
+    edge に沿った位置は、車両の座標を edge の軸（第0車線の始点→終点）へ射影した値
+    直線距離 radius 以内の車両は軸上の位置の差も radius 以内のため、2分探索2回で候補を絞り、候補のみ直線距離を確かめる
+    駐車中の車両は traci.edge.getLastStepVehicleIDs と同じく数えない
+    '''
+    def __init__(self):
+        self._built_time:float = None
+        self._offsets_by_edgeID:dict = {} # key: edgeID, value: edge に沿った位置（昇順）のリスト
+        self._positions_by_edgeID:dict = {} # key: edgeID, value: 座標のリスト（_offsets_by_edgeID と同じ順）
+        self._edgeID_by_vehID:dict = {} # key: vehID, value: edgeID
+        self._axis_by_edgeID:dict = {} # key: edgeID, value: (始点x, 始点y, 単位ベクトルx, 単位ベクトルy)（シミュレーション中は変化しない）
+
+    # このステップの車両の並びを作る
+    def build(self):
+        entries_by_edgeID:dict = {}
+        edgeID_by_vehID:dict = {}
+        for vehID in snapshot.get_vehIDs():
+            # ステップ途中で削除された車両は除く
+            if not snapshot.has_result(vehID) or snapshot.is_stopped_parking(vehID):
+                continue
+            edgeID = snapshot.get_road_ID(vehID)
+            position = snapshot.get_position(vehID)
+            entries_by_edgeID.setdefault(edgeID, []).append((self.get_offset(edgeID, position), position))
+            edgeID_by_vehID[vehID] = edgeID
+        offsets_by_edgeID:dict = {}
+        positions_by_edgeID:dict = {}
+        for edgeID, entries in entries_by_edgeID.items():
+            entries.sort(key=lambda entry: entry[0])
+            offsets_by_edgeID[edgeID] = [offset for offset, _ in entries]
+            positions_by_edgeID[edgeID] = [position for _, position in entries]
+        self._offsets_by_edgeID = offsets_by_edgeID
+        self._positions_by_edgeID = positions_by_edgeID
+        self._edgeID_by_vehID = edgeID_by_vehID
+        self._built_time = snapshot.get_time()
+
+    def _ensure_built(self):
+        if self._built_time != snapshot.get_time():
+            self.build()
+
+    # edgeID 上で position から直線距離 radius 以内の車両数
+    def count_in_radius(self, edgeID:str, position, radius:float):
+        offsets = self._offsets_by_edgeID.get(edgeID)
+        if not offsets:
+            return 0
+        center = self.get_offset(edgeID, position)
+        margin = radius + OFFSET_TOLERANCE
+        start = bisect_left(offsets, center - margin)
+        end = bisect_right(offsets, center + margin)
+        x, y = position
+        squared_radius = radius * radius
+        count = 0
+        for other_x, other_y in self._positions_by_edgeID[edgeID][start:end]:
+            dx = other_x - x
+            dy = other_y - y
+            if dx * dx + dy * dy <= squared_radius:
+                count += 1
+        return count
+
+    # vehID から直線距離 radius 以内にいる、現在の edge（と指定した前後の edge）上の他の車両数
+    def count_neighbours(self, vehID:str, radius:float, prev_edgeID:str=None, next_edgeID:str=None):
+        self._ensure_built()
+        position = snapshot.get_position(vehID)
+        edgeID = self._edgeID_by_vehID.get(vehID)
+        if edgeID is None:
+            edgeID = snapshot.get_road_ID(vehID)
+            count = 0
+        else:
+            count = -1 # 自車を除く
+        for counted_edgeID in {edgeID, prev_edgeID, next_edgeID}:
+            if counted_edgeID is not None:
+                count += self.count_in_radius(counted_edgeID, position, radius)
+        return count
+
+    # 座標を edge の軸へ射影した位置
+    def get_offset(self, edgeID:str, position):
+        origin_x, origin_y, unit_x, unit_y = self.get_axis(edgeID)
+        return (position[0] - origin_x) * unit_x + (position[1] - origin_y) * unit_y
+
+    # edge の軸（第0車線の始点と、始点→終点の単位ベクトル）　未取得の edge のみ SUMO に問い合わせる
+    def get_axis(self, edgeID:str):
+        axis = self._axis_by_edgeID.get(edgeID)
+        if axis is None:
+            shape = traci.lane.getShape(f"{edgeID}_0")
+            (start_x, start_y), (end_x, end_y) = shape[0], shape[-1]
+            length = math.hypot(end_x - start_x, end_y - start_y)
+            # 長さ0の車線は任意の向きでよい（どの向きでも射影の差は直線距離以下）
+            axis = (start_x, start_y, (end_x - start_x) / length, (end_y - start_y) / length) if length > 0 else (start_x, start_y, 1.0, 0.0)
+            self._axis_by_edgeID[edgeID] = axis
+        return axis
+
+    # シミュレーション終了時（次のシナリオの開始前）に車両の並びを破棄する
+    def clear(self):
+        self._built_time = None
+        self._offsets_by_edgeID = {}
+        self._positions_by_edgeID = {}
+        self._edgeID_by_vehID = {}
+        self._axis_by_edgeID = {}
+
+# runner と utilities が共有するステップごとの車両の並び
+density_field = DensityField()
@@ -4,7 +4,7 @@ import optparse
 if 'SUMO_HOME' in os.environ:
     sys.path.append(os.path.join(os.environ['SUMO_HOME'], 'tools'))
 from sumolib import checkBinary  # noqa
-import traci
+from ...sumo_backend import traci
 
 from ...agents.Agent import Agent
 from ...agents.CustomeEdge import CustomeEdge, ConnectedEdges
@@ -16,6 +16,7 @@ from math import sqrt
 import random
 random.seed(314) # 乱数シードを314に設定
 from its102 import utilities
+from its102 import route_table
 import numpy as np
 import matplotlib.pyplot as plt
 import copy
@@ -76,7 +77,7 @@ if __name__ == "__main__":
     for shelterID, near_edgeID in shelter_edge_by_IDs.items():
         shelter_list:list = utilities.init_shelter(shelterID=shelterID, shelter_capacity_by_ID=shelter_capacity_by_ID, near_edgeID=near_edgeID, shelter_list=shelter_list)
     # 現在のedge情報をもとに、CustomEdge一覧を生成
-    traci.start([sumoBinary, "-c", "/opt/homebrew/Cellar/sumo/1.20.0/vehicle-evacuation-system/its102/map_one/data/one_shelter_one_departure.sumocfg",
+    traci.start([sumoBinary, "-c", "its102/map_one/data/one_shelter_one_departure.sumocfg",
                              "--tripinfo-output", "tripinfo.xml"], traceFile="traci_log.txt", traceGetters=False)
     # 開始エッジ, 終了エッジ一覧を作成
     custome_edge_list:list = utilities.init_custom_edge()
@@ -86,12 +87,15 @@ if __name__ == "__main__":
     vehicle_end_list_by_start_edge_dict:dict = utilities.get_vehicle_end_list_by_start_edge_dict(vehicle_start_edges=vehicle_start_edges, vehicle_end_edges=vehicle_end_edges)
     # ここが空
     print(f'length of vehicle_end_list_by_start_edge_dict: {len(vehicle_end_list_by_start_edge_dict)}')
-    # 全経路で総当たりをし、通行可能経路を取得しておく。
-    connected_edges_list:list = utilities.init_connected_edges_list(custome_edge_list=custome_edge_list)
+    # 全経路で総当たりをし、通行可能経路を取得しておく。（経路は findRoute ではなく、runner と同じ経路表から取得する）
+    connected_edges_list:list = utilities.init_connected_edges_list(
+                                                                    custome_edge_list=custome_edge_list,
+                                                                    route_table=route_table.load_route_table(net_file="its102/map_one/data/one_shelter_one_departure.net.xml")
+                                                                    )
     print(f"connected_edges_list: {connected_edges_list}")
     # 取得した総当たり情報をjson形式で保存する
     utilities.export_connected_edges_to_json(connected_edges_list=connected_edges_list,
-                                                file_path="/opt/homebrew/Cellar/sumo/1.20.0/vehicle-evacuation-system/its102/map_one/data/all_edgeIDs.json")
+                                                file_path="its102/map_one/data/all_edgeIDs.json")
     
     print(f'length of connected_edges_list: {len(connected_edges_list)}')
     # ここまで空
@@ -100,7 +104,7 @@ if __name__ == "__main__":
     print(f'nearest_end_edgeID_by_start_edgeID_dict: {nearest_end_edgeID_by_start_edgeID_dict}')
     # 取得した開始地点と終了地点の情報をjson形式で保存する
     utilities.export_start_end_edgeIDs_to_json(start_end_edgeIDs=nearest_end_edgeID_by_start_edgeID_dict,
-                                                file_path="/opt/homebrew/Cellar/sumo/1.20.0/vehicle-evacuation-system/its102/map_one/data/start_end_edgeIDs.json")
+                                                file_path="its102/map_one/data/start_end_edgeIDs.json")
     print(f'find route complete')
 
 
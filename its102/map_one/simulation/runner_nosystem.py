@@ -3,7 +3,6 @@
 # =========================
 import copy
 import os
-import random
 import sys
 from collections import Counter, defaultdict
 from math import sqrt
@@ -19,31 +18,36 @@ if "SUMO_HOME" in os.environ:
     sys.path.append(os.path.join(os.environ["SUMO_HOME"], "tools"))
 
 from sumolib import checkBinary  # noqa: E402
-import traci  # noqa: E402
-import matplotlib.pyplot as plt
+from ...sumo_backend import traci, select_backend, start_or_load  # noqa: E402
 import numpy as np
-from numpy import double
 
 # =========================
 # Local / intra-package
 # =========================
 from ... import utilities
+from ...agent_scheduler import AgentScheduler
+from ... import agent_state
 from ...agents.Agent import Agent
 from ...agents.CustomeEdge import CustomeEdge, ConnectedEdges
 from ...agents.Shelter import Shelter
 from ...agents.VehicleInfo import VehicleInfo
+from ... import route_table
+from ... import simulation_result
+from ...simulation_result import SimulationResult
+from ...density_field import density_field
+from ...speed_command_buffer import speed_command_buffer
+from ...route_registry import route_registry
+from ...step_snapshot import snapshot
+from .simulation_context import ScenarioConfig, SimulationContext, seed_random_generators
 
 # =========================
 # Runtime config / seeds
 # =========================
 # random.seed(318)  # 乱数シードを固定（再現性）
-random.seed()
+# 乱数は run_scenario の開始時に ScenarioConfig.seed で初期化する
 
 COMMUNICATION_RANGE = 100
 END_SIMULATION_TIME = 2000
-VEHICLE_NUM = 0
-DEPART_TIME: double = 0.0
-ROUTE_NUM = 0
 SPEED_ARRANGE = 1
 CONGESTION_RATE = 0.3
 SHOW_DEBUG_COUNT = 0
@@ -53,139 +57,171 @@ EARLY_AGENT_THRESHOLD_LIST = [60, 90, 100, 130] # 早期決断者の閾値
 LATE_AGENT_THRESHOLD_LIST = [180, 220, 300, 350] # 遅延決断者の閾値
 VEH_START_TIME_BY_SHELTERID = {"ShelterA_1": 0, "ShelterA_2": 0} # 避難所ごとの車両の開始時間
 TOTAL_VEHNUM = 150
-NEW_VEHICLE_COUNT = 0
-LANE_CHANGED_VEHICLE_COUNT = 0
-OBTAIN_INFO_LANE_CHANGE_COUNT = 0
-ELAPSED_TIME_LANE_CHANGE_COUNT = 0
-NORMALCY_BIAS_COUNT = 0
-POSITIVE_MAJORITY_BIAS_COUNT = 0
-NEGATIVE_MAJORITY_BIAS_COUNT = 0
 TSUNAMI_PRECURSOR_INFO_OBTAIN_TIME = 0
 DECISION_EVALUATION_INTERVAL_FOR_INITIAL = 10.0
 DECISION_EVALUATION_INTERVAL = 10.0
 MOTIVATION_DECREASE_FROM_INACTIVE_NEIGHBORS = 100.0
 MOTIVATION_INCREASE_FOLLOWING_NEIGHBORS = 150.0
-
-# リストの初期化
-custome_edge_list: list = []
-shelter_list = []
-vehInfo_list = []
-vehID_list = []
-veh_written_list = []
-connected_edges_list = []
-shelterA_arrival_time_list = []
-shelterB_arrival_time_list = []
-arrival_time_by_vehID_dict = {}
-arrival_time_list = []
-elapsed_time_list = []
-
-# dictの初期化
-current_route_dict = {}
-
-def run(INSIGHT_RANGE: float):
-    while traci.simulation.getTime() < END_SIMULATION_TIME:
-        traci.simulationStep()
-        control_vehicles(INSIGHT_RANGE=INSIGHT_RANGE)
-    traci.close()
+DECISION_EDGEIDS = ("E2", "E3", "E4", "E5", "E6", "E7") # 心理モデルで経路変更を判断する edge
+# 車両がいる間は毎ステップ処理する edge（津波前兆情報への反応は判断のイベントを待たない）
+# それ以外の車両は edge の移動・イベントの予定があるステップのみ処理する
+WATCHED_EDGEIDS = DECISION_EDGEIDS
+# 進入したステップのみ処理する edge（edge の移動で処理の予定に入る）
+ENTRY_EDGEIDS = ("-E13", "E0", "E17")
+# エージェントごとのイベントの間隔（秒）
+EVENT_INTERVAL_BY_NAME = {"decision": DECISION_EVALUATION_INTERVAL}
+
+def run(context: SimulationContext):
+    profiler = context.profiler
+    # traci の呼び出し回数・レイテンシの計測（--profile / --traci-stats 指定時のみ）
+    if context.is_traci_call_counting_enabled():
+        context.traci_call_counter = traci.enable_call_counting(stream_file=context.config.traci_stats_stream_file)
+    profiler.start(call_counter=context.traci_call_counter)
+    while snapshot.get_time() < END_SIMULATION_TIME:
+        profiler.begin_step()
+        with profiler.phase("simulation_step"):
+            traci.simulationStep()
+        # このステップの車両状態をまとめて取得する
+        with profiler.phase("snapshot_update"):
+            snapshot.update()
+        control_vehicles(context=context)
+        # このステップの速度の指示をまとめて出す（--speed-command-tolerance 指定時のみ）
+        with profiler.phase("speed_dispatch"):
+            speed_command_buffer.flush()
+        profiler.end_step(simulation_time=snapshot.get_time())
+    profiler.stop()
+    if context.traci_call_counter is not None:
+        traci.disable_call_counting()
+        if context.config.traci_stats:
+            print(context.traci_call_counter.format_report())
+            if speed_command_buffer.is_enabled():
+                print(f"speed commands: dispatched {speed_command_buffer.get_dispatched_count()}, dropped {speed_command_buffer.get_dropped_count()}")
+    # ワーカーで続けて実行する場合はSUMOを閉じずに次のシナリオで再利用する
+    if not context.config.keep_sumo_running:
+        traci.close()
+    snapshot.clear()
+    route_registry.clear()
+    density_field.clear()
+    speed_command_buffer.clear()
+    # 処理区分ごとの計測結果を出力する（--profile 指定時のみ）
+    if context.config.profile_file_prefix is not None:
+        profiler.dump(context.config.profile_file_prefix)
     sys.stdout.flush()
 
 
-def control_vehicles(INSIGHT_RANGE: float):
-    vehIDs = traci.vehicle.getIDList()
-    global NEW_VEHICLE_COUNT
-    global LANE_CHANGED_VEHICLE_COUNT
-    global POSITIVE_MAJORITY_BIAS_COUNT
-    global NEGATIVE_MAJORITY_BIAS_COUNT
-    global NORMALCY_BIAS_COUNT
-    global OBTAIN_INFO_LANE_CHANGE_COUNT
-    global ELAPSED_TIME_LANE_CHANGE_COUNT
-    # 現在の存在するrouteを確認する
-    for routeID in traci.route.getIDList():
-        # 現在のrouteを取得
-        current_route_dict[routeID] = traci.route.getEdges(routeID)
+def control_vehicles(context: SimulationContext):
+    vehIDs = snapshot.get_vehIDs()
+    INSIGHT_RANGE = context.config.INSIGHT_RANGE
+    agent_list = context.agent_list
+    vehInfo_list = context.vehInfo_list
+    shelter_list = context.shelter_list
+    custome_edge_list = context.custome_edge_list
+    connected_edges_list = context.connected_edges_list
+    profiler = context.profiler
+    agent_states = context.agent_states
+    # シミュレーションから到着・退出した車両をレジストリから外す
+    with profiler.phase("arrival"):
+        for arrived_vehID in snapshot.get_arrived_vehIDs():
+            utilities.retire_vehID(arrived_vehID, agent_list=agent_list, vehInfo_list=vehInfo_list)
+            agent_states.retire(arrived_vehID)
+            utilities.forget_speed_command(arrived_vehID)
+    # このステップで処理する車両（イベントの予定・edge の移動・監視する edge 上）を求める
+    agent_scheduler = context.agent_scheduler
+    with profiler.phase("agent_schedule"):
+        agent_scheduler.update(current_time=snapshot.get_time(), vehIDs=vehIDs)
+    # 経路変更の判断を行う状態のエージェント（判断を行う edge 上にいるかは車両ごとに確認する）
+    decision_vehIDs = set(agent_states.get_vehIDs_in_states(agent_state.DECISION_STATES))
+
+    # 通信可能範囲内の車両をグリッド索引でまとめて求める（V2V通信は10秒ごと）
+    # neighbour_vehIDs_by_vehID: dict = {}
+    # if snapshot.get_time() % 10 == 0:
+    #     neighbour_vehIDs_by_vehID = utilities.get_neighbour_vehIDs_by_vehID(vehIDs=vehIDs, COMMUNICATION_RANGE=COMMUNICATION_RANGE, custome_edge_list=custome_edge_list)
 
     for current_vehID in vehIDs:
+        # 予定のない車両は減速制御のみ（速度の指示は毎ステップ出し直す必要がある）
+        if not agent_scheduler.is_scheduled(current_vehID):
+            if agent_states.is_in(current_vehID, agent_state.DECLINED_STATES):
+                continue
+            vehInfo_by_current_vehID: VehicleInfo = utilities.find_vehInfo_by_vehID(current_vehID, vehInfo_list)
+            with profiler.phase("speed_control"):
+                control_speed(
+                                current_vehID=current_vehID,
+                                current_edgeID=snapshot.get_road_ID(current_vehID),
+                                vehInfo_by_current_vehID=vehInfo_by_current_vehID,
+                                custome_edge_list=custome_edge_list
+                                )
+            continue
         vehInfo_by_current_vehID: VehicleInfo = utilities.find_vehInfo_by_vehID(current_vehID, vehInfo_list)
         shelter_for_current_vehID: Shelter = utilities.find_shelter_by_edgeID_connect_target_shelter(vehInfo_by_current_vehID.get_edgeID_connect_target_shelter(), shelter_list)
         agent_by_current_vehID: Agent = utilities.find_agent_by_vehID(current_vehID, agent_list)
-        current_edgeID: str = traci.vehicle.getRoadID(current_vehID)
+        current_edgeID: str = snapshot.get_road_ID(current_vehID)
         if not agent_by_current_vehID.get_created_time_flg():
-            agent_by_current_vehID.set_created_time(traci.simulation.getTime())
+            agent_by_current_vehID.set_created_time(snapshot.get_time())
             agent_by_current_vehID.set_created_time_flg(True)
-
-        if current_edgeID == "-E13":
-            utilities.init_driver_behavior(vehIDs = [current_vehID], lane_change_mode=1)
-        if current_edgeID == "E0":
-            traci.vehicle.changeLane(vehID=current_vehID, laneIndex=0, duration=1000)
-        if current_edgeID == "E17":
-            vehInfo_by_current_vehID.set_arrival_flag(True)
-            vehInfo_by_current_vehID.set_decline_edge_arrival_flag(True)
+        if not agent_states.is_registered(current_vehID):
+            agent_states.register(current_vehID, agent=agent_by_current_vehID, vehInfo=vehInfo_by_current_vehID)
+
+        # ENTRY_EDGEIDS の処理は進入したステップのみ（車線変更モード・車線の指示は SUMO 側で保持される）
+        if agent_scheduler.is_transitioned(current_vehID) and current_edgeID in ENTRY_EDGEIDS:
+            if current_edgeID == "-E13":
+                utilities.init_driver_behavior(vehIDs = [current_vehID], lane_change_mode=1)
+            if current_edgeID == "E0":
+                traci.vehicle.changeLane(vehID=current_vehID, laneIndex=0, duration=1000)
+            if current_edgeID == "E17":
+                agent_states.transition(current_vehID, agent_state.EVENT_ENTER_DECLINE_EDGE, vehInfo=vehInfo_by_current_vehID)
         # 津波接近情報を取得後に、ピックアップ行動を取らないものとする
         if vehInfo_by_current_vehID.has_tsunami_precursor_info() and  vehInfo_by_current_vehID.get_edgeID_connect_target_shelter() == "E9":
             # 左折してしまっていたら、車両を生成させる
             if current_edgeID in ["E13", "E14", "E15", "E16"]:
-                if current_edgeID in traci.vehicle.getIDList():
-                    NEW_VEHICLE_COUNT = utilities.generate_new_veh(
-                                                                            target_vehID=current_vehID, 
-                                                                            NEW_VEHICLE_COUNT= NEW_VEHICLE_COUNT, 
-                                                                            agent_list=agent_list, 
-                                                                            vehInfo_list=vehInfo_list,
-                                                                            vehInfo_by_target_vehID=vehInfo_by_current_vehID, 
-                                                                            agent_by_target_vehID=agent_by_current_vehID, 
-                                                                            shelter_list=shelter_list,
-                                                                            connected_edges_list=connected_edges_list,
-                                                                            LATE_AGENT_THRESHOLD_LIST=LATE_AGENT_THRESHOLD_LIST,
-                                                                            lane_change_mode=1
-                                                                            )
+                if current_edgeID in snapshot.get_vehIDs():
+                    with profiler.phase("generate_new_veh"):
+                        context.NEW_VEHICLE_COUNT = utilities.generate_new_veh(
+                                                                                target_vehID=current_vehID, 
+                                                                                NEW_VEHICLE_COUNT= context.NEW_VEHICLE_COUNT, 
+                                                                                agent_list=agent_list, 
+                                                                                vehInfo_list=vehInfo_list,
+                                                                                vehInfo_by_target_vehID=vehInfo_by_current_vehID, 
+                                                                                agent_by_target_vehID=agent_by_current_vehID, 
+                                                                                shelter_list=shelter_list,
+                                                                                connected_edges_list=connected_edges_list,
+                                                                                LATE_AGENT_THRESHOLD_LIST=LATE_AGENT_THRESHOLD_LIST,
+                                                                                lane_change_mode=1,
+                                                                                agent_population=context.agent_population
+                                                                                )
 
         # 到着処理 # 到着によってparked_flagがTrue
-        if traci.vehicle.isStoppedParking(current_vehID) and not vehInfo_by_current_vehID.get_parked_flag():
-            handle_arrival(
+        if snapshot.is_stopped_parking(current_vehID) and not agent_states.is_in(current_vehID, agent_state.PARKED_STATES):
+            with profiler.phase("arrival"):
+                handle_arrival(
+                                agent_states=agent_states,
+                                current_vehID=current_vehID,
+                                vehInfo_by_current_vehID=vehInfo_by_current_vehID,
+                                agent_by_current_vehID=agent_by_current_vehID,
+                                shelter_for_current_vehID=shelter_for_current_vehID,
+                                shelter_list=shelter_list,
+                                arrival_time_list=context.arrival_time_list,
+                                arrival_time_by_vehID_dict=context.arrival_time_by_vehID_dict,
+                                elapsed_time_list=context.elapsed_time_list
+                                )
+        
+        with profiler.phase("speed_control"):
+            control_speed(
                             current_vehID=current_vehID,
+                            current_edgeID=current_edgeID,
                             vehInfo_by_current_vehID=vehInfo_by_current_vehID,
-                            agent_by_current_vehID=agent_by_current_vehID,
-                            shelter_for_current_vehID=shelter_for_current_vehID,
-                            shelter_list=shelter_list,
-                            arrival_time_list=arrival_time_list,
-                            arrival_time_by_vehID_dict=arrival_time_by_vehID_dict
+                            custome_edge_list=custome_edge_list
                             )
-        
-        if not vehInfo_by_current_vehID.get_decline_edge_arrival_flag():  # 減速処理を行う
-            #避難地に接続する(直前の)道路にいる場合、減速する
-            pre_edgeID_near_shelter_flag = \
-                    utilities.is_pre_edgeID_near_shelter(
-                                                            current_edgeID=current_edgeID, 
-                                                            edgeID_near_shelter=vehInfo_by_current_vehID.get_edgeID_connect_target_shelter(),
-                                                            custome_edge_list=custome_edge_list
-                                                            )
-            if pre_edgeID_near_shelter_flag and not vehInfo_by_current_vehID.get_decline_edge_arrival_flag():
-                # 避難地直前のエッジに入った車両だけ減速制御
-                local_density = utilities.get_local_density(vehID=current_vehID, radius=50.0)
-                utilities.apply_gap_density_speed_control(
-                                                            vehID=current_vehID,
-                                                            local_density=local_density,
-                                                            v_free=6.0,     # 自由流速度
-                                                            v_min=2.0,      # 最低速度
-                                                            gap_min=7.0,    # 強い減速を始めるギャップ
-                                                            tau=1.8,        # ギャップ→速度変換の傾き
-                                                            alpha=0.5,      # 平滑化
-                                                            slow_time=1.0   # 速度変更時間
-                                                            )
-            else:
-                # それ以外は自由流走行
-                traci.vehicle.slowDown(current_vehID, 7.0, 1.0)
-
-        if not vehInfo_by_current_vehID.get_arrival_flag(): # 未到着の車両に対して処理を実行
+
+        if not agent_states.is_in(current_vehID, agent_state.DECLINED_STATES): # 未到着の車両に対して処理を実行
             # 通信可能範囲内にいる車両と通信を行う　通信可能範囲は100m設定になる
-            # if traci.simulation.getTime() % 10 == 0:
-            #     around_vehIDs: list = utilities.get_around_vehIDs(target_vehID=current_vehID, custome_edge_list=custome_edge_list)
+            # if snapshot.get_time() % 10 == 0:
+            #     around_vehIDs: list = neighbour_vehIDs_by_vehID.get(current_vehID, [])
             #     utilities.v2v_communication(
             #                                 target_vehID=current_vehID, 
             #                                 target_vehInfo=vehInfo_by_current_vehID, 
             #                                 around_vehIDs=around_vehIDs,
             #                                 agent_list=agent_list,
-            #                                 vehInfo_list=vehInfo_list,
-            #                                 COMMUNICATION_RANGE=COMMUNICATION_RANGE
+            #                                 vehInfo_list=vehInfo_list
             #                                 )
 
             #     utilities.v2shelter_communication(
@@ -200,243 +236,205 @@ def control_vehicles(INSIGHT_RANGE: float):
             #                                                     target_vehID=current_vehID, 
             #                                                     target_vehInfo=vehInfo_by_current_vehID, 
             #                                                     around_vehIDs=around_vehIDs, 
-            #                                                     vehInfo_list=vehInfo_list, 
-            #                                                     COMMUNICATION_RANGE=COMMUNICATION_RANGE
+            #                                                     vehInfo_list=vehInfo_list
             #                                                     )
 
             # 心理モデルの実装
-            if current_edgeID in ["E2", "E3", "E4", "E5", "E6", "E7"] and not agent_by_current_vehID.get_evacuation_route_changed_flg():
-                # 浮動小数対策（必要ならepsを使う or ステップ数で判定）
-                if traci.simulation.getTime() % DECISION_EVALUATION_INTERVAL == 0:
-                    elapsed_time = traci.simulation.getTime() - agent_by_current_vehID.get_created_time()
-                    agent_by_current_vehID.update_calculated_motivation_value(current_time=elapsed_time)
-                    # ★ この2つだけを以後ずっと使う（getterを再呼び出ししない）
-                    mot = agent_by_current_vehID.get_calculated_motivation_value()
-                    thr = agent_by_current_vehID.get_lane_change_decision_threshold()
-                    # ★ Noneなら即スキップ。フラグは立てない（以後も再評価できるように）
-                    if mot is None or thr is None:
-                        continue
+            with profiler.phase("bias"):
+                if current_edgeID in DECISION_EDGEIDS and current_vehID in decision_vehIDs:
+                    # 浮動小数対策（必要ならepsを使う or ステップ数で判定）
+                    if agent_scheduler.is_event_due(current_vehID, "decision"):
+                        elapsed_time = snapshot.get_time() - agent_by_current_vehID.get_created_time()
+                        agent_by_current_vehID.update_calculated_motivation_value(current_time=elapsed_time)
+                        # ★ この2つだけを以後ずっと使う（getterを再呼び出ししない）
+                        mot = agent_by_current_vehID.get_calculated_motivation_value()
+                        thr = agent_by_current_vehID.get_lane_change_decision_threshold()
+                        # ★ Noneなら即スキップ。フラグは立てない（以後も再評価できるように）
+                        if mot is None or thr is None:
+                            continue
                     
-                    # ★ 以降で getter を呼ばず、ローカル mot/thr を使う
-                    if utilities.is_vehID_in_congested_edge(vehID=current_vehID, THRESHOLD_SPEED=THRESHOLD_SPEED):
-                        if mot >= thr:
+                        # ★ 以降で getter を呼ばず、ローカル mot/thr を使う
+                        if utilities.is_vehID_in_congested_edge(vehID=current_vehID, THRESHOLD_SPEED=THRESHOLD_SPEED):
+                            if mot >= thr:
+                                success_lane_change = utilities.lane_change_by_vehID(
+                                                                                        vehID=current_vehID,
+                                                                                        agent=agent_by_current_vehID,
+                                                                                        vehInfo=vehInfo_by_current_vehID
+                                                                                    )
+                                if success_lane_change:
+                                    # print("変更1！！！！")
+                                    context.ELAPSED_TIME_LANE_CHANGE_COUNT += 1
+                                    context.LANE_CHANGED_VEHICLE_COUNT += 1
+                                    agent_states.transition(current_vehID, agent_state.EVENT_CHANGE_ROUTE, agent=agent_by_current_vehID)
+                
+                    # 津波接近情報を取得した場合、避難行動を取るため、閾値を更新 閾値を超えるとレーンチェンジを実行
+                    # 同じステップで経路変更（変更1）した車両も対象にするため、状態ではなく動機づけの上乗せ済みフラグで判定する
+                    if vehInfo_by_current_vehID.has_tsunami_precursor_info() and not agent_by_current_vehID.get_normalcy_lane_change_motivation_flg():
+                        elapsed_time = snapshot.get_time() - agent_by_current_vehID.get_created_time()
+                        # 現在値を更新してから、情報受領分を上乗せ
+                        agent_by_current_vehID.update_calculated_motivation_value(current_time=elapsed_time)
+                        current_motivation = agent_by_current_vehID.get_calculated_motivation_value()
+                        inc = float(agent_by_current_vehID.get_motivation_increase_from_info_receive())
+
+                        agent_by_current_vehID.set_calculated_motivation_value(current_motivation + inc)
+                        agent_states.transition(current_vehID, agent_state.EVENT_REACT_TO_INFO, agent=agent_by_current_vehID)
+                        # ここからが修正ポイント：カーブの elapsed_time 以降に一括加算する
+                        agent_by_current_vehID.get_motivation_curve().add_offset_from(elapsed_time, inc, inclusive=True)
+                        context.NORMALCY_BIAS_COUNT += 1
+                        if agent_by_current_vehID.get_calculated_motivation_value() >= agent_by_current_vehID.get_lane_change_decision_threshold():
+                            # print("津波情報取得による避難行動発生")
                             success_lane_change = utilities.lane_change_by_vehID(
                                                                                     vehID=current_vehID,
                                                                                     agent=agent_by_current_vehID,
                                                                                     vehInfo=vehInfo_by_current_vehID
                                                                                 )
                             if success_lane_change:
-                                # print("変更1！！！！")
-                                ELAPSED_TIME_LANE_CHANGE_COUNT += 1
-                                LANE_CHANGED_VEHICLE_COUNT += 1
-                                agent_by_current_vehID.set_evacuation_route_changed_flg(True)
-                
-                # 津波接近情報を取得した場合、避難行動を取るため、閾値を更新 閾値を超えるとレーンチェンジを実行
-                if vehInfo_by_current_vehID.has_tsunami_precursor_info() and not agent_by_current_vehID.get_normalcy_lane_change_motivation_flg():
-                    elapsed_time = traci.simulation.getTime() - agent_by_current_vehID.get_created_time()
-                    # 現在値を更新してから、情報受領分を上乗せ
-                    agent_by_current_vehID.update_calculated_motivation_value(current_time=elapsed_time)
-                    current_motivation = agent_by_current_vehID.get_calculated_motivation_value()
-                    inc = float(agent_by_current_vehID.get_motivation_increase_from_info_receive())
-
-                    agent_by_current_vehID.set_calculated_motivation_value(current_motivation + inc)
-                    agent_by_current_vehID.set_normalcy_lane_change_motivation_flg(True)
-                    # ここからが修正ポイント：履歴の「該当 index 以降」に一括加算する
-                    x_list = list(agent_by_current_vehID.get_x_elapsed_time_for_lane_change_list())
-                    y_list = list(agent_by_current_vehID.get_y_motivation_value_for_lane_change_list())
-                    # 先に index を決める（elapsed_time より後の先頭インデックス）
-                    tail_start_idx = None
-                    for idx, t in enumerate(x_list):
-                        if elapsed_time <= t:
-                            tail_start_idx = idx
-                            break
-                        
-                    if tail_start_idx is not None:
-                        # 尾部に一括で加算（in-place）
-                        for j in range(tail_start_idx, len(y_list)):
-                            y_list[j] = float(y_list[j]) + inc
-                        # setter には「リスト全体」を渡す（スカラー禁止）
-                        agent_by_current_vehID.set_y_motivation_value_for_lane_change_list(y_list)
-                        # XY 対応表も再構築
-                        agent_by_current_vehID.set_lane_change_xy_dict(dict(zip(x_list, y_list)))
-                    NORMALCY_BIAS_COUNT += 1
-                    if agent_by_current_vehID.get_calculated_motivation_value() >= agent_by_current_vehID.get_lane_change_decision_threshold():
-                        # print("津波情報取得による避難行動発生")
-                        success_lane_change = utilities.lane_change_by_vehID(
-                                                                                vehID=current_vehID,
-                                                                                agent=agent_by_current_vehID,
-                                                                                vehInfo=vehInfo_by_current_vehID
-                                                                            )
-                        if success_lane_change:
-                            LANE_CHANGED_VEHICLE_COUNT += 1
-                            OBTAIN_INFO_LANE_CHANGE_COUNT += 1
-                            # print("変更2！！！！")
-                            agent_by_current_vehID.set_evacuation_route_changed_flg(True)
-                    continue
+                                context.LANE_CHANGED_VEHICLE_COUNT += 1
+                                context.OBTAIN_INFO_LANE_CHANGE_COUNT += 1
+                                # print("変更2！！！！")
+                                agent_states.transition(current_vehID, agent_state.EVENT_CHANGE_ROUTE, agent=agent_by_current_vehID)
+                        continue
                 
-                # 周囲の行動に同調する場合の処理
-                if (int(traci.simulation.getTime()) % int(DECISION_EVALUATION_INTERVAL) == 0 
-                        and not vehInfo_by_current_vehID.get_arrival_flag() 
-                        and not agent_by_current_vehID.get_evacuation_route_changed_flg() 
-                        and agent_by_current_vehID.get_normalcy_lane_change_motivation_flg()):
+                    # 周囲の行動に同調する場合の処理
+                    if (agent_scheduler.is_event_due(current_vehID, "decision") 
+                            and agent_states.get_state(current_vehID) in (agent_state.STATE_INFORMED, agent_state.STATE_INFORMED_AT_MINIMUM)):
                     
-                    # 周囲が避難行動を取らない場合、自身も合わせようとするため、閾値が減少
-                    if (not utilities.is_vehIDs_another_lane(target_vehID=current_vehID, vehInfo_list=vehInfo_list, INSIGHT_RANGE=INSIGHT_RANGE) 
-                        and not agent_by_current_vehID.get_lane_minimum_motivation_value_flg()):
-                        elapsed_time = traci.simulation.getTime() - agent_by_current_vehID.get_created_time()
-                        # 現在値を更新してから、情報受領分を上乗せ
-                        agent_by_current_vehID.update_calculated_motivation_value(current_time=elapsed_time)
-                        current_motivation = agent_by_current_vehID.get_calculated_motivation_value()
-                        inc = float(agent_by_current_vehID.get_motivation_decrease_due_to_inactive_neighbors())
-                        new_motivation = current_motivation - inc
-                        # print(f"vehID:{current_vehID}, 経過時間: {elapsed_time} 現在値: {current_motivation}, 減少量: {inc}, 新値: {new_motivation} 閾値: {agent_by_current_vehID.get_lane_change_decision_threshold()}")
-                        if new_motivation < agent_by_current_vehID.get_minimum_motivation_value():
-                            agent_by_current_vehID.set_lane_minimum_motivation_value_flg(True)
-                            agent_by_current_vehID.set_reach_lane_minimum_motivation_time(elapsed_time)
-
-                            # --- 基底カーブ（元のシグモイド） ---
-                            base_x = np.arange(0, 450, 1, dtype=float)
-                            base_y = np.array([float(utilities.two_stage_sigmoid(x)) for x in base_x], dtype=float)
-
-                            # --- 現在の履歴 ---
-                            x_list = list(agent_by_current_vehID.get_x_elapsed_time_for_lane_change_list())
-                            y_list = list(agent_by_current_vehID.get_y_motivation_value_for_lane_change_list())
-
-                            # 下限到達時刻 t0 以降の開始 index
-                            tail_start_idx = None
-                            for idx, t in enumerate(x_list):
-                                if elapsed_time <= t:    # ← <= で“現在バケット”も含める
-                                    tail_start_idx = idx
-                                    break
-
-                            if tail_start_idx is not None:
+                        # 周囲が避難行動を取らない場合、自身も合わせようとするため、閾値が減少
+                        if (not utilities.is_vehIDs_another_lane(target_vehID=current_vehID, vehInfo_list=vehInfo_list, INSIGHT_RANGE=INSIGHT_RANGE) 
+                            and agent_states.get_state(current_vehID) != agent_state.STATE_INFORMED_AT_MINIMUM):
+                            elapsed_time = snapshot.get_time() - agent_by_current_vehID.get_created_time()
+                            # 現在値を更新してから、情報受領分を上乗せ
+                            agent_by_current_vehID.update_calculated_motivation_value(current_time=elapsed_time)
+                            current_motivation = agent_by_current_vehID.get_calculated_motivation_value()
+                            inc = float(agent_by_current_vehID.get_motivation_decrease_due_to_inactive_neighbors())
+                            new_motivation = current_motivation - inc
+                            # print(f"vehID:{current_vehID}, 経過時間: {elapsed_time} 現在値: {current_motivation}, 減少量: {inc}, 新値: {new_motivation} 閾値: {agent_by_current_vehID.get_lane_change_decision_threshold()}")
+                            if new_motivation < agent_by_current_vehID.get_minimum_motivation_value():
+                                agent_states.transition(current_vehID, agent_state.EVENT_REACH_MINIMUM, agent=agent_by_current_vehID)
+                                agent_by_current_vehID.set_reach_lane_minimum_motivation_time(elapsed_time)
+
+                                motivation_curve = agent_by_current_vehID.get_motivation_curve()
                                 theta_min = float(agent_by_current_vehID.get_minimum_motivation_value())
                                 theta_dec = float(agent_by_current_vehID.get_lane_change_decision_threshold())
 
                                 t0 = float(elapsed_time)
                                 m0_raw = float(new_motivation)          # その時点の実値（下限より下になり得る）
-                                b0 = float(np.interp(t0, base_x, base_y))
+                                b0 = motivation_curve.get_base_value(t0) # 基底カーブ（元のシグモイド）の値
 
                                 m0 = max(m0_raw, theta_min)             # ★ここが重要：下限でクランプ
                                 delta = m0 - b0                         # 以後はこの Δ を足す
 
-                                for j in range(tail_start_idx, len(y_list)):
-                                    xj = float(x_list[j])
-                                    bj = float(np.interp(xj, base_x, base_y))
-                                    v  = bj + delta                     # シグモイドを Δ だけ上方シフト
-                                    v  = max(theta_min, min(theta_dec, v))
-                                    # 連続性の担保：t0直後で必ず非減少
-                                    if xj >= t0:
-                                        v = max(v, m0)
-                                    y_list[j] = v
-
-                                agent_by_current_vehID.set_y_motivation_value_for_lane_change_list(y_list)
-                                agent_by_current_vehID.set_lane_change_xy_dict(dict(zip(x_list, y_list)))
-
-                            # この tick の以降処理はスキップ（任意）
-                            continue
+                                # 下限到達時刻 t0 以降（<= で“現在バケット”も含める）を、シグモイドを Δ だけ上方シフトした値に置き換える
+                                # 上限は判断閾値、下限は m0（連続性の担保：t0直後で必ず非減少）
+                                motivation_curve.shift_and_clamp_from(t0, delta, lower=m0, upper=theta_dec, inclusive=True)
+
+                                # この tick の以降処理はスキップ（任意）
+                                continue
+
+                            agent_by_current_vehID.set_calculated_motivation_value(new_motivation)
+                            # elapsed_time より後のカーブを新しい値で一定にする
+                            agent_by_current_vehID.get_motivation_curve().flatten_from(elapsed_time, float(new_motivation), inclusive=False)
+
+                            if agent_by_current_vehID.get_calculated_motivation_value() >= agent_by_current_vehID.get_lane_change_decision_threshold():
+                                success_lane_change = utilities.lane_change_by_vehID(
+                                                                                        vehID=current_vehID,
+                                                                                        agent=agent_by_current_vehID,
+                                                                                        vehInfo=vehInfo_by_current_vehID
+                                                                                    )
+                                if success_lane_change:
+                                    context.LANE_CHANGED_VEHICLE_COUNT += 1
+                                    context.NEGATIVE_MAJORITY_BIAS_COUNT += 1 
+                                    # print("変更3！！！！")
+                                    agent_states.transition(current_vehID, agent_state.EVENT_CHANGE_ROUTE, agent=agent_by_current_vehID)
+                        # 周囲が避難行動を取る場合、周囲の行動に同調するため、自身の閾値を上昇させる
+                        else:
+                            elapsed_time = snapshot.get_time() - agent_by_current_vehID.get_created_time()
+                            # 現在値を更新してから、情報受領分を上乗せ
+                            agent_by_current_vehID.update_calculated_motivation_value(current_time=elapsed_time)
+                            current_motivation = agent_by_current_vehID.get_calculated_motivation_value()
+                            inc = float(agent_by_current_vehID.get_motivation_increase_due_to_following_neighbors())
+                            new_motivation = current_motivation + inc
+                            agent_by_current_vehID.set_calculated_motivation_value(new_motivation)
+
+                            # ここで負の同調性バイアスが再度働くように設定
+                            agent_states.transition(current_vehID, agent_state.EVENT_FOLLOW_NEIGHBOURS, agent=agent_by_current_vehID)
+
+                            # ここからが修正ポイント：elapsed_time より後のカーブを新しい値で一定にする
+                            agent_by_current_vehID.get_motivation_curve().flatten_from(elapsed_time, float(new_motivation), inclusive=False)
+                            if agent_by_current_vehID.get_calculated_motivation_value() >= agent_by_current_vehID.get_lane_change_decision_threshold():
+                                success_lane_change = utilities.lane_change_by_vehID(
+                                                                                        vehID=current_vehID,
+                                                                                        agent=agent_by_current_vehID,
+                                                                                        vehInfo=vehInfo_by_current_vehID
+                                                                                    )
+                                if success_lane_change:
+                                    context.LANE_CHANGED_VEHICLE_COUNT += 1
+                                    context.POSITIVE_MAJORITY_BIAS_COUNT += 1 
+                                    # print(f"vehID: {current_vehID} 変更4！！！！　")
+                                    agent_states.transition(current_vehID, agent_state.EVENT_CHANGE_ROUTE, agent=agent_by_current_vehID)
 
-                        agent_by_current_vehID.set_calculated_motivation_value(new_motivation)
-                        x_list = list(agent_by_current_vehID.get_x_elapsed_time_for_lane_change_list())
-                        y_list = list(agent_by_current_vehID.get_y_motivation_value_for_lane_change_list()) 
-                        tail_start_idx = None
-                        for idx, t in enumerate(x_list):
-                            if elapsed_time < t:
-                                tail_start_idx = idx
-                                break
-                            
-                        if tail_start_idx is not None:
-                            # 尾部に一括で加算（in-place）
-                            for j in range(tail_start_idx, len(y_list)):
-                                y_list[j] = float(new_motivation)
-                            # setter には「リスト全体」を渡す（スカラー禁止）
-                            agent_by_current_vehID.set_y_motivation_value_for_lane_change_list(y_list)
-                            # XY 対応表も再構築
-                            agent_by_current_vehID.set_lane_change_xy_dict(dict(zip(x_list, y_list)))
 
-                        if agent_by_current_vehID.get_calculated_motivation_value() >= agent_by_current_vehID.get_lane_change_decision_threshold():
-                            success_lane_change = utilities.lane_change_by_vehID(
-                                                                                    vehID=current_vehID,
-                                                                                    agent=agent_by_current_vehID,
-                                                                                    vehInfo=vehInfo_by_current_vehID
-                                                                                )
-                            if success_lane_change:
-                                LANE_CHANGED_VEHICLE_COUNT += 1
-                                NEGATIVE_MAJORITY_BIAS_COUNT += 1 
-                                # print("変更3！！！！")
-                                agent_by_current_vehID.set_evacuation_route_changed_flg(True)
-                    # 周囲が避難行動を取る場合、周囲の行動に同調するため、自身の閾値を上昇させる
-                    else:
-                        elapsed_time = traci.simulation.getTime() - agent_by_current_vehID.get_created_time()
-                        # 現在値を更新してから、情報受領分を上乗せ
-                        agent_by_current_vehID.update_calculated_motivation_value(current_time=elapsed_time)
-                        current_motivation = agent_by_current_vehID.get_calculated_motivation_value()
-                        inc = float(agent_by_current_vehID.get_motivation_increase_due_to_following_neighbors())
-                        new_motivation = current_motivation + inc
-                        agent_by_current_vehID.set_calculated_motivation_value(new_motivation)
-
-                        # ここで負の同調性バイアスが再度働くように設定
-                        agent_by_current_vehID.set_lane_minimum_motivation_value_flg(False)
-
-                        # ここからが修正ポイント：履歴の「該当 index 以降」に一括加算する
-                        x_list = list(agent_by_current_vehID.get_x_elapsed_time_for_lane_change_list())
-                        y_list = list(agent_by_current_vehID.get_y_motivation_value_for_lane_change_list()) 
-                        # 先に index を決める（elapsed_time より後の先頭インデックス）
-                        tail_start_idx = None
-                        for idx, t in enumerate(x_list):
-                            if elapsed_time < t:
-                                tail_start_idx = idx
-                                break
-                            
-                        if tail_start_idx is not None:
-                            # 尾部に一括で加算（in-place）
-                            for j in range(tail_start_idx, len(y_list)):
-                                y_list[j] = float(new_motivation)
-                            # setter には「リスト全体」を渡す（スカラー禁止）
-                            agent_by_current_vehID.set_y_motivation_value_for_lane_change_list(y_list)
-                            # XY 対応表も再構築
-                            agent_by_current_vehID.set_lane_change_xy_dict(dict(zip(x_list, y_list)))
-                        if agent_by_current_vehID.get_calculated_motivation_value() >= agent_by_current_vehID.get_lane_change_decision_threshold():
-                            success_lane_change = utilities.lane_change_by_vehID(
-                                                                                    vehID=current_vehID,
-                                                                                    agent=agent_by_current_vehID,
-                                                                                    vehInfo=vehInfo_by_current_vehID
-                                                                                )
-                            if success_lane_change:
-                                LANE_CHANGED_VEHICLE_COUNT += 1
-                                POSITIVE_MAJORITY_BIAS_COUNT += 1 
-                                # print(f"vehID: {current_vehID} 変更4！！！！　")
-                                agent_by_current_vehID.set_evacuation_route_changed_flg(True)
+            if current_edgeID == "E16":
+                if snapshot.get_time() > 180 and snapshot.get_time() < 250:
+                    vehInfo_by_current_vehID.update_tsunami_precursor_info(vehID=current_vehID, tsunami_precursor_flag=True, current_time=snapshot.get_time())
+                with profiler.phase("generate_new_veh"):
+                    context.NEW_VEHICLE_COUNT = utilities.generate_new_veh(
+                                                                            target_vehID=current_vehID, 
+                                                                            NEW_VEHICLE_COUNT= context.NEW_VEHICLE_COUNT, 
+                                                                            agent_list=agent_list, 
+                                                                            vehInfo_list=vehInfo_list,
+                                                                            vehInfo_by_target_vehID=vehInfo_by_current_vehID, 
+                                                                            agent_by_target_vehID=agent_by_current_vehID, 
+                                                                            shelter_list=shelter_list,
+                                                                            connected_edges_list=connected_edges_list,
+                                                                            LATE_AGENT_THRESHOLD_LIST=LATE_AGENT_THRESHOLD_LIST,
+                                                                            lane_change_mode=1,
+                                                                            agent_population=context.agent_population
+                                                                            )
+                # 再生成できなかった車両（候補地が満杯など）は次のステップでやり直す
+                if snapshot.has_result(current_vehID):
+                    agent_scheduler.schedule_next_step(current_vehID, "respawn", current_time=snapshot.get_time())
 
+def control_speed(current_vehID, current_edgeID, vehInfo_by_current_vehID:VehicleInfo, custome_edge_list):
+    """
+    避難地に接続する(直前の)道路にいる車両の減速制御　それ以外は自由流走行
+    """
+    if not vehInfo_by_current_vehID.get_decline_edge_arrival_flag():  # 減速処理を行う
+        #避難地に接続する(直前の)道路にいる場合、減速する
+        pre_edgeID_near_shelter_flag = \
+                utilities.is_pre_edgeID_near_shelter(
+                                                        current_edgeID=current_edgeID, 
+                                                        edgeID_near_shelter=vehInfo_by_current_vehID.get_edgeID_connect_target_shelter(),
+                                                        custome_edge_list=custome_edge_list
+                                                        )
+        if pre_edgeID_near_shelter_flag and not vehInfo_by_current_vehID.get_decline_edge_arrival_flag():
+            # 避難地直前のエッジに入った車両だけ減速制御
+            utilities.apply_gap_density_speed_control(
+                                                        vehID=current_vehID,
+                                                        density_radius=50.0,  # 局所密度を数える範囲（直線距離）
+                                                        v_free=6.0,     # 自由流速度
+                                                        v_min=2.0,      # 最低速度
+                                                        gap_min=7.0,    # 強い減速を始めるギャップ
+                                                        tau=1.8,        # ギャップ→速度変換の傾き
+                                                        alpha=0.5,      # 平滑化
+                                                        slow_time=1.0   # 速度変更時間
+                                                        )
+        else:
+            # それ以外は自由流走行
+            speed_command_buffer.slow_down(current_vehID, 7.0, 1.0)
 
-            if current_edgeID == "E16":
-                if traci.simulation.getTime() > 180 and traci.simulation.getTime() < 250:
-                    vehInfo_by_current_vehID.update_tsunami_precursor_info(vehID=current_vehID, tsunami_precursor_flag=True, current_time=traci.simulation.getTime())
-                NEW_VEHICLE_COUNT = utilities.generate_new_veh(
-                                                                        target_vehID=current_vehID, 
-                                                                        NEW_VEHICLE_COUNT= NEW_VEHICLE_COUNT, 
-                                                                        agent_list=agent_list, 
-                                                                        vehInfo_list=vehInfo_list,
-                                                                        vehInfo_by_target_vehID=vehInfo_by_current_vehID, 
-                                                                        agent_by_target_vehID=agent_by_current_vehID, 
-                                                                        shelter_list=shelter_list,
-                                                                        connected_edges_list=connected_edges_list,
-                                                                        LATE_AGENT_THRESHOLD_LIST=LATE_AGENT_THRESHOLD_LIST,
-                                                                        lane_change_mode=1
-                                                                        )
-
-def handle_arrival(current_vehID, vehInfo_by_current_vehID:VehicleInfo, agent_by_current_vehID:Agent,
+def handle_arrival(agent_states:agent_state.AgentStateTable, current_vehID, vehInfo_by_current_vehID:VehicleInfo, agent_by_current_vehID:Agent,
                     shelter_for_current_vehID:Shelter, shelter_list,
-                    arrival_time_list, arrival_time_by_vehID_dict):
+                    arrival_time_list, arrival_time_by_vehID_dict, elapsed_time_list):
     """
     避難地到着時の処理
     """
-    arrival_time_list.append(traci.simulation.getTime())
-    arrival_time_by_vehID_dict[f"{current_vehID}"] = traci.simulation.getTime()
-    traci.vehicle.setSpeed(current_vehID, 9.0)
+    arrival_time_list.append(snapshot.get_time())
+    arrival_time_by_vehID_dict[f"{current_vehID}"] = snapshot.get_time()
+    speed_command_buffer.set_speed(current_vehID, 9.0)
     # 避難地オブジェクトに登録
     shelter_for_current_vehID.add_arrival_vehID(current_vehID)
-    vehInfo_by_current_vehID.set_evac_end_time(traci.simulation.getTime())
+    vehInfo_by_current_vehID.set_evac_end_time(snapshot.get_time())
     # 近傍エッジから避難地オブジェクトを取得して避難時間を更新
     shelter: Shelter = utilities.find_shelter_by_edgeID_connect_target_shelter(
         agent_by_current_vehID.get_near_edgeID_by_target_shelter(), shelter_list
@@ -444,13 +442,13 @@ def handle_arrival(current_vehID, vehInfo_by_current_vehID:VehicleInfo, agent_by
     departure_time = traci.vehicle.getDeparture(current_vehID) + 100
     shelter.update_evac_time_default_dict(
         vehID=current_vehID,
-        route=traci.vehicle.getRoute(current_vehID),
+        route=snapshot.get_route(current_vehID),
         evac_time=vehInfo_by_current_vehID.get_evac_end_time() - departure_time
     )
     # 到着フラグと駐車フラグを更新
-    vehInfo_by_current_vehID.set_parked_flag(True)
-    agent_by_current_vehID.set_arrival_time(traci.simulation.getTime())
-    elapsed_time_list.append(traci.simulation.getTime() - agent_by_current_vehID.get_created_time())
+    agent_states.transition(current_vehID, agent_state.EVENT_PARK, vehInfo=vehInfo_by_current_vehID)
+    agent_by_current_vehID.set_arrival_time(snapshot.get_time())
+    elapsed_time_list.append(snapshot.get_time() - agent_by_current_vehID.get_created_time())
 
 def extract_category(vehID):
     if "ShelterA_1" in vehID:
@@ -471,16 +469,70 @@ def get_options():
                             default=False, 
                             help="run the commandline version of sumo"
                             )
+    optParser.add_option(
+                            "--libsumo", action="store_true",
+                            default=False,
+                            help="run sumo in-process via libsumo instead of a traci socket (env: ITS102_SUMO_BACKEND)"
+                            )
+    optParser.add_option(
+                            "--seed", dest="seed", type="int",
+                            default=None,
+                            help="seed for random / numpy.random (default: fresh seed per run)"
+                            )
+    optParser.add_option(
+                            "--profile", dest="profile_file_prefix",
+                            default=None,
+                            help="record per-step phase timings and write them to PROFILE.csv / PROFILE.json"
+                            )
+    optParser.add_option(
+                            "--traci-stats", action="store_true",
+                            default=False,
+                            help="count TraCI calls per API method and print call counts / latency percentiles at the end"
+                            )
+    optParser.add_option(
+                            "--traci-stats-stream", dest="traci_stats_stream_file",
+                            default=None,
+                            help="write every TraCI call (method, latency) to this CSV file while the simulation runs"
+                            )
+    optParser.add_option(
+                            "--agent-population", action="store_true",
+                            default=False,
+                            help="store agent attributes in struct-of-arrays NumPy columns (AgentPopulation) instead of per-object attributes"
+                            )
+    optParser.add_option(
+                            "--speed-command-tolerance", dest="speed_command_tolerance", type="float",
+                            default=None,
+                            help="buffer slowDown commands and dispatch them once per step, dropping commands whose speed changed by at most this value (m/s) while the previous one is still in effect"
+                            )
+    optParser.add_option(
+                            "--result-file", dest="result_file",
+                            default=None,
+                            help="append the simulation result as a JSON line to this file"
+                            )
     options, args = optParser.parse_args()
-    return options
+    return options, args
 
-if __name__ == "__main__":
-    early_rate :float= float(sys.argv[2])
-    vehicle_interval: float= float(sys.argv[3]) # 車両の生成間隔 7.0がベース
-    INSIGHT_RANGE: float = float(sys.argv[4])  # 同調性バイアスの割合
+def run_scenario(config: ScenarioConfig):
+    """
+    シナリオを1回実行し、結果を返す
+    状態はすべて SimulationContext に保持するため、ProcessPoolExecutor のワーカーから続けて呼び出せる
+    """
+    context = SimulationContext(config)
+    context.agent_scheduler = AgentScheduler(watched_edgeIDs=WATCHED_EDGEIDS, interval_by_event_name=EVENT_INTERVAL_BY_NAME)
+    seed_random_generators(config.seed)
+    utilities.clear_speed_commands()
+    # 前回のシナリオが途中で失敗した場合に備えて、ステップのビューと route の登録を破棄しておく
+    snapshot.clear()
+    route_registry.clear()
+    density_field.clear()
+    speed_command_buffer.configure(tolerance=config.speed_command_tolerance)
+    early_rate: float = config.early_rate
+    vehicle_interval: float = config.vehicle_interval # 車両の生成間隔 7.0がベース
+    INSIGHT_RANGE: float = config.INSIGHT_RANGE  # 同調性バイアスの割合
     print(f"early_rate: {early_rate}, vehicle_interval: {vehicle_interval}, INSIGHT_RANGE: {INSIGHT_RANGE}")
-    options = get_options()
-    if options.nogui:
+    select_backend(use_libsumo=config.use_libsumo)
+    # libsumo はプロセス内で動作するため GUI は使用できない
+    if config.nogui or traci.is_libsumo():
         sumoBinary = checkBinary('sumo')
     else:
         sumoBinary = checkBinary('sumo-gui')
@@ -491,24 +543,21 @@ if __name__ == "__main__":
     edgeID_by_shelterID:dict = {"ShelterA_1": 'E17', "ShelterA_2": 'E17', "ShelterB_1": 'E9'}
     tmp_prob_list = [0.1, 0.9]
     for shelterID, near_edgeID in edgeID_by_shelterID.items():
-        shelter_list:list = utilities.init_shelter(
-                                                    shelterID=shelterID, 
-                                                    shelter_capacity_by_ID=shelter_capacity_by_ID, 
-                                                    near_edgeID=near_edgeID, 
-                                                    shelter_list=shelter_list
-                                                    )
-    traci.start(
-                [sumoBinary, "-c", "its102/map_one/data/one_shelter_one_departure.sumocfg", "--tripinfo-output", "tripinfo.xml"], 
-                traceFile="traci_log.txt", 
-                traceGetters=False
-                )
-    custome_edge_list:list = utilities.init_custom_edge()
-    vehicle_start_edges:list = utilities.get_vehicle_start_edges(custome_edge_list=custome_edge_list)
-    vehicle_end_edges:list = utilities.get_vehicle_end_edges(custome_edge_list=custome_edge_list)
-    # 車両の開始エッジと終了エッジの組み合わせを辞書にする
-    vehicle_end_list_by_start_edge_dict:dict = utilities.get_vehicle_end_list_by_start_edge_dict(vehicle_start_edges=vehicle_start_edges, vehicle_end_edges=vehicle_end_edges)
+        context.shelter_list = utilities.init_shelter(
+                                                        shelterID=shelterID, 
+                                                        shelter_capacity_by_ID=shelter_capacity_by_ID, 
+                                                        near_edgeID=near_edgeID, 
+                                                        shelter_list=context.shelter_list
+                                                        )
+    start_or_load(
+                    [sumoBinary, "-c", "its102/map_one/data/one_shelter_one_departure.sumocfg", "--tripinfo-output", config.tripinfo_file], 
+                    traceFile=config.trace_file, 
+                    traceGetters=False
+                    )
+    context.custome_edge_list = utilities.init_custom_edge()
     # 全経路で総当たりをし、通行可能経路を取得しておく。
-    connected_edges_list:list = utilities.import_connected_edges_from_json(file_path="its102/map_one/data/all_edgeIDs.json")
+    # 道路網の内容ごとにキャッシュした経路表を使う（初回のみ sumolib で作成する）
+    context.connected_edges_list = route_table.load_route_table(net_file="its102/map_one/data/one_shelter_one_departure.net.xml")
     nearest_end_edgeID_by_start_edgeID_dict:dict = utilities.import_start_end_edgeIDs_from_json(file_path="its102/map_one/data/start_end_edgeIDs.json")
     # 初期の車両を生成する
     print(f"shelterIDは: {edgeID_by_shelterID}, それぞれの選択確率は: {tmp_prob_list}")
@@ -516,20 +565,20 @@ if __name__ == "__main__":
         for index in range(TOTAL_VEHNUM):
             end_edgeID:str = utilities.choose_edge_by_probability(edgeID_list=end_edgeIDs,probabilities=tmp_prob_list)
             shelterID_by_end_edgeID:str = utilities.find_shelterID_by_edgeID_by_shelterID(edgeID=end_edgeID, edgeID_by_shelterID=edgeID_by_shelterID)
-            VEHICLE_NUM, ROUTE_NUM, vehID_list_by_shelter, DEPART_TIME = \
+            context.VEHICLE_NUM, context.ROUTE_NUM, vehID_list_by_shelter, context.DEPART_TIME = \
                 utilities.generate_simple_init_vehID(
                                                         from_edgeID=vehicle_start_edgeID, 
                                                         to_edgeID=end_edgeID, 
                                                         shelterID=shelterID_by_end_edgeID, 
                                                         generate_interval=vehicle_interval,
-                                                        generate_route_count=ROUTE_NUM, 
-                                                        generate_veh_count=VEHICLE_NUM, 
-                                                        depart_time=DEPART_TIME
+                                                        generate_route_count=context.ROUTE_NUM, 
+                                                        generate_veh_count=context.VEHICLE_NUM, 
+                                                        depart_time=context.DEPART_TIME
                                                         )
-            vehID_list.extend(vehID_list_by_shelter)
+            context.vehID_list.extend(vehID_list_by_shelter)
 
     # カテゴリのカウント
-    categories = [extract_category(v) for v in vehID_list]
+    categories = [extract_category(v) for v in context.vehID_list]
     counter = Counter(categories)
 
     # 合計と割合を表示
@@ -540,37 +589,63 @@ if __name__ == "__main__":
         count = counter.get(cat, 0)
         print(f"  {cat}: {count} ({count / total:.2%})")
     # 車両情報の初期化
-    vehInfo_list:list = utilities.init_vehicleInfo_list(vehIDs=vehID_list, shelter_list=shelter_list)
+    context.vehInfo_list = utilities.init_vehicleInfo_list(vehIDs=context.vehID_list, shelter_list=context.shelter_list)
     # Agentの初期化
-    agent_list:list = utilities.init_agent_list(
-                                                vehIDs=vehID_list, 
-                                                edgeID_by_shelterID=edgeID_by_shelterID, 
-                                                EARLY_AGENT_THRESHOLD_LIST=EARLY_AGENT_THRESHOLD_LIST, 
-                                                LATE_AGENT_THRESHOLD_LIST=LATE_AGENT_THRESHOLD_LIST, 
-                                                ATTR_RATE=early_rate,
-                                                MOTIVATION_DECREASE_FROM_INACTIVE_NEIGHBORS=MOTIVATION_DECREASE_FROM_INACTIVE_NEIGHBORS,
-                                                MOTIVATION_INCREASE_FOLLOWING_NEIGHBORS=MOTIVATION_INCREASE_FOLLOWING_NEIGHBORS
-                                                )
+    context.agent_list = utilities.init_agent_list(
+                                                    vehIDs=context.vehID_list, 
+                                                    edgeID_by_shelterID=edgeID_by_shelterID, 
+                                                    EARLY_AGENT_THRESHOLD_LIST=EARLY_AGENT_THRESHOLD_LIST, 
+                                                    LATE_AGENT_THRESHOLD_LIST=LATE_AGENT_THRESHOLD_LIST, 
+                                                    ATTR_RATE=early_rate,
+                                                    MOTIVATION_DECREASE_FROM_INACTIVE_NEIGHBORS=MOTIVATION_DECREASE_FROM_INACTIVE_NEIGHBORS,
+                                                    MOTIVATION_INCREASE_FOLLOWING_NEIGHBORS=MOTIVATION_INCREASE_FOLLOWING_NEIGHBORS,
+                                                    agent_population=context.agent_population
+                                                    )
 
     # ドライバーの行動の初期化
-    utilities.init_driver_behavior(vehIDs = vehID_list, lane_change_mode=1)
+    utilities.init_driver_behavior(vehIDs = context.vehID_list, lane_change_mode=1)
     for vehID in traci.vehicle.getIDList():
         traci.vehicle.setMaxSpeed(vehID, 9.0)
-    run(INSIGHT_RANGE=INSIGHT_RANGE)
+    run(context=context)
+    return context.to_result(script_name="its102.map_one.simulation.runner_nosystem", TOTAL_VEHNUM=TOTAL_VEHNUM)
+
+def print_result_summary(result: SimulationResult):
+    counter_by_key = result.counter_by_key
     print("===== Simlation Result Summary =====")
-    print("LANE_CHANGED_VEHICLE_NUM:", LANE_CHANGED_VEHICLE_COUNT)
-    print("OBTAIN_INFO_LANE_CHANGE_COUNT:", OBTAIN_INFO_LANE_CHANGE_COUNT)
-    print("ELAPSED_TIME_LANE_CHANGE_COUNT:", ELAPSED_TIME_LANE_CHANGE_COUNT) 
-    print("NORMALCY_BIAS_COUNT:", NORMALCY_BIAS_COUNT)
-    print("NEGATIVE_MAJORITY_BIAS_COUNT:", NEGATIVE_MAJORITY_BIAS_COUNT)
-    print("POSITIVE_MAJORITY_BIAS_COUNT:", POSITIVE_MAJORITY_BIAS_COUNT)
-    print(f"arrival_time_by_vehID_dict: {arrival_time_by_vehID_dict}")
-    # print(f"elapsed_time_list: {elapsed_time_list}")
-    print(f"mean elapsed_time: {np.mean(elapsed_time_list)}")
-    if len(arrival_time_list) == TOTAL_VEHNUM:
+    print("LANE_CHANGED_VEHICLE_NUM:", counter_by_key["LANE_CHANGED_VEHICLE_NUM"])
+    print("OBTAIN_INFO_LANE_CHANGE_COUNT:", counter_by_key["OBTAIN_INFO_LANE_CHANGE_COUNT"])
+    print("ELAPSED_TIME_LANE_CHANGE_COUNT:", counter_by_key["ELAPSED_TIME_LANE_CHANGE_COUNT"]) 
+    print("NORMALCY_BIAS_COUNT:", counter_by_key["NORMALCY_BIAS_COUNT"])
+    print("NEGATIVE_MAJORITY_BIAS_COUNT:", counter_by_key["NEGATIVE_MAJORITY_BIAS_COUNT"])
+    print("POSITIVE_MAJORITY_BIAS_COUNT:", counter_by_key["POSITIVE_MAJORITY_BIAS_COUNT"])
+    print(f"arrival_time_by_vehID_dict: {result.arrival_time_by_vehID_dict}")
+    # print(f"elapsed_time_list: {result.elapsed_time_list}")
+    print(f"mean elapsed_time: {np.mean(result.elapsed_time_list)}")
+    if result.is_all_vehicles_arrived():
         print("OK all vehs arrived ")
     else:
-        print(f"NG all vehs not arrived {len(arrival_time_list)}")
+        print(f"NG all vehs not arrived {result.arrival_vehicle_num}")
+
+if __name__ == "__main__":
+    options, args = get_options()
+    config = ScenarioConfig(
+                            early_rate=float(args[0]),
+                            vehicle_interval=float(args[1]),
+                            INSIGHT_RANGE=float(args[2]),
+                            nogui=options.nogui,
+                            use_libsumo=options.libsumo,
+                            seed=options.seed,
+                            profile_file_prefix=options.profile_file_prefix,
+                            traci_stats=options.traci_stats,
+                            traci_stats_stream_file=options.traci_stats_stream_file,
+                            use_agent_population=options.agent_population,
+                            speed_command_tolerance=options.speed_command_tolerance
+                            )
+    result = run_scenario(config)
+    print_result_summary(result)
+    # バッチ実行用に結果をファイルへ書き出す
+    if options.result_file is not None:
+        simulation_result.write_result(options.result_file, result.to_record())
     # for agent in agent_list:
     #     if agent.get_vehID() == "init_ShelterA_1_116":
-    #         utilities.plot_dot(agent)
+    #         plotting.plot_dot(agent)
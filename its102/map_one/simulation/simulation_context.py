@@ -0,0 +1,121 @@
+# =========================
+# Standard library
+# =========================
+import random
+
+# =========================
+# Third-party libraries
+# =========================
+import numpy as np
+from numpy import double
+
+# =========================
+# Local / intra-package
+# =========================
+from ...agent_scheduler import AgentScheduler
+from ...agent_state import AgentStateTable
+from ...agents.AgentPopulation import AgentPopulation
+from ...agents.Registry import ShelterRegistry
+from ...simulation_result import SimulationResult
+from ...step_profiler import StepProfiler
+from ...traci_stats import TraciCallCounter
+from ...tsunami_broadcast import TsunamiBroadcast
+
+# シナリオ1回分の実行条件（runner の CLI 引数に対応する）
+# ProcessPoolExecutor のワーカーへ渡せるよう、単純な値のみを持つ
+class ScenarioConfig():
+    def __init__(self, early_rate:float, vehicle_interval:float, INSIGHT_RANGE:float,
+                 nogui:bool=True, use_libsumo:bool=False, seed:int=None,
+                 tripinfo_file:str="tripinfo.xml", trace_file:str="traci_log.txt",
+                 keep_sumo_running:bool=False, profile_file_prefix:str=None,
+                 traci_stats:bool=False, traci_stats_stream_file:str=None,
+                 use_agent_population:bool=False, use_tsunami_broadcast:bool=False,
+                 tsunami_broadcast_max_hops:int=1, speed_command_tolerance:float=None):
+        self.early_rate = early_rate # 早期決断者の割合
+        self.vehicle_interval = vehicle_interval # 車両の生成間隔
+        self.INSIGHT_RANGE = INSIGHT_RANGE # 同調性バイアスで周囲を見渡す範囲
+        self.nogui = nogui
+        self.use_libsumo = use_libsumo
+        self.seed = seed # None の場合は実行ごとにOSの乱数から初期化する
+        self.tripinfo_file = tripinfo_file
+        self.trace_file = trace_file # None の場合は traci のトレースを出力しない
+        self.keep_sumo_running = keep_sumo_running # True の場合は終了後もSUMOを閉じず、次のシナリオを traci.load で読み込む
+        self.profile_file_prefix = profile_file_prefix # 指定した場合はステップごとの処理区分別の計測結果を <prefix>.csv / <prefix>.json に出力する
+        self.traci_stats = traci_stats # True の場合は traci のAPIごとの呼び出し回数・レイテンシを終了時に表示する
+        self.traci_stats_stream_file = traci_stats_stream_file # 指定した場合は traci の呼び出しごとの記録を書き出す
+        self.use_agent_population = use_agent_population # True の場合は Agent の属性を AgentPopulation の配列で保持する
+        self.use_tsunami_broadcast = use_tsunami_broadcast # True の場合は津波前兆情報を TsunamiBroadcast で近傍グラフ全体にまとめて伝播する
+        self.tsunami_broadcast_max_hops = tsunami_broadcast_max_hops # TsunamiBroadcast が1回の通信で広げる段数（None の場合は連結成分全体に広げる）
+        self.speed_command_tolerance = speed_command_tolerance # 指定した場合は速度の指示をステップごとにまとめ、差がこの値以下の指示は出さない（None の場合は直ちに出す）
+
+# シナリオ1回分の状態　runner のモジュール変数だったカウンタ・リストをまとめて保持する
+class SimulationContext():
+    def __init__(self, config:ScenarioConfig):
+        self.config = config
+        self.profiler = StepProfiler(enabled=config.profile_file_prefix is not None)
+        self.traci_call_counter:TraciCallCounter = None
+        # 車両ごとの処理予定　run_scenario で監視する edge とイベントの間隔を指定して作り直す
+        self.agent_scheduler:AgentScheduler = AgentScheduler()
+        # エージェントの行動モデルの状態
+        self.agent_states:AgentStateTable = AgentStateTable()
+        # 車両生成用のカウンタ
+        self.VEHICLE_NUM = 0
+        self.DEPART_TIME:double = 0.0
+        self.ROUTE_NUM = 0
+        self.NEW_VEHICLE_COUNT = 0
+        # 車線変更・バイアスのカウンタ
+        self.LANE_CHANGED_VEHICLE_COUNT = 0
+        self.OBTAIN_INFO_LANE_CHANGE_COUNT = 0
+        self.ELAPSED_TIME_LANE_CHANGE_COUNT = 0
+        self.NORMALCY_BIAS_COUNT = 0
+        self.POSITIVE_MAJORITY_BIAS_COUNT = 0
+        self.NEGATIVE_MAJORITY_BIAS_COUNT = 0
+        # リストの初期化
+        self.custome_edge_list:list = []
+        self.shelter_list = ShelterRegistry()
+        self.vehInfo_list = []
+        self.agent_list = []
+        self.agent_population:AgentPopulation = AgentPopulation() if config.use_agent_population else None
+        self.tsunami_broadcast:TsunamiBroadcast = TsunamiBroadcast(max_hops=config.tsunami_broadcast_max_hops) if config.use_tsunami_broadcast else None
+        self.vehID_list = []
+        self.connected_edges_list = []
+        self.arrival_time_by_vehID_dict = {}
+        self.arrival_time_list = []
+        self.elapsed_time_list = []
+
+    # traci の呼び出し回数の計測が必要か
+    def is_traci_call_counting_enabled(self):
+        return self.profiler.is_enabled() or self.config.traci_stats or self.config.traci_stats_stream_file is not None
+
+    # 結果レコードのキーごとのカウンタ
+    def get_counter_by_key(self):
+        return {
+                "LANE_CHANGED_VEHICLE_NUM": self.LANE_CHANGED_VEHICLE_COUNT,
+                "OBTAIN_INFO_LANE_CHANGE_COUNT": self.OBTAIN_INFO_LANE_CHANGE_COUNT,
+                "ELAPSED_TIME_LANE_CHANGE_COUNT": self.ELAPSED_TIME_LANE_CHANGE_COUNT,
+                "NORMALCY_BIAS_COUNT": self.NORMALCY_BIAS_COUNT,
+                "NEGATIVE_MAJORITY_BIAS_COUNT": self.NEGATIVE_MAJORITY_BIAS_COUNT,
+                "POSITIVE_MAJORITY_BIAS_COUNT": self.POSITIVE_MAJORITY_BIAS_COUNT,
+                }
+
+    def to_result(self, script_name:str, TOTAL_VEHNUM:int):
+        return SimulationResult(
+                                script_name=script_name,
+                                early_rate=self.config.early_rate,
+                                vehicle_interval=self.config.vehicle_interval,
+                                INSIGHT_RANGE=self.config.INSIGHT_RANGE,
+                                counter_by_key=self.get_counter_by_key(),
+                                arrival_time_by_vehID_dict=dict(self.arrival_time_by_vehID_dict),
+                                elapsed_time_list=list(self.elapsed_time_list),
+                                arrival_vehicle_num=len(self.arrival_time_list),
+                                TOTAL_VEHNUM=TOTAL_VEHNUM
+                                )
+
+# 乱数の初期化　同じプロセスで複数のシナリオを続けて実行しても、実行ごとに異なる乱数列になる
+def seed_random_generators(seed:int=None):
+    if seed is None:
+        random.seed()
+        np.random.seed()
+    else:
+        random.seed(seed)
+        np.random.seed(seed)
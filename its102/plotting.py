@@ -0,0 +1,119 @@
+# グラフ描画用の関数
+# matplotlib の読み込みに時間がかかるため、シミュレーション本体（utilities / runner）からは
+# 描画が必要になった時点で import する
+
+# =========================
+# Third-party libraries
+# =========================
+import matplotlib.pyplot as plt
+import numpy as np
+
+# =========================
+# Local / intra-package
+# =========================
+from .agents.Agent import Agent
+
+def plot_cdf(cdf_dict, fulltime_by_ratio:dict):
+    """
+    CDF をプロットする
+    """
+    plt.figure(figsize=(8, 6))
+
+    for ratio, (times, cdf_values) in cdf_dict.items():
+        print(f'rate{str(round(ratio, 1)).replace(".", "")} = {times}')
+        print(f'rate{str(round(ratio, 1)).replace(".", "")}fulltime = {fulltime_by_ratio[ratio]}')
+        plt.plot(times, cdf_values, marker='.', linestyle='-', label=f"Ratio {ratio}")
+        # plt.vlines(fulltime_by_ratio[ratio], 0.0 ,1.0,  linestyles='dotted')
+
+    plt.xlabel("Arrival Time")
+    plt.ylabel("CDF")
+    plt.title("Cumulative Distribution Function (CDF) of Arrival Times")
+    plt.savefig('/Users/kashiisamutakeshi/vehicle-assistant-system/sumo/its102/result_graph.pdf')
+    plt.legend()
+    plt.grid()
+    plt.show()
+
+def plot_cdf_by_key(cdf_result:dict):
+    """
+    utilities.convert_to_cdf の結果 {key: [(time, cdf_value), ...]} をグラフ表示する
+    """
+    for key, time_and_cdf_values in cdf_result.items():
+        sorted_times = [time for time, _ in time_and_cdf_values]
+        cdf = [cdf_value for _, cdf_value in time_and_cdf_values]
+        plt.plot(sorted_times, cdf, label=f"Key = {key}")
+
+    plt.title("CDF for Each Key")
+    plt.xlabel("Time")
+    plt.ylabel("Cumulative Probability")
+    plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    plt.show()
+
+def plot_dot(agent: Agent):
+    """
+    xリストとyリストを渡すと、散布図を描画し、
+    agent.get_lane_change_threshold_list() の値を水平線として描画する。
+
+    Parameters
+    ----------
+    x_list : list or array
+        x軸の値
+    y_list : list or array
+        y軸の値
+    agent : object
+        get_lane_change_threshold_list() メソッドを持つオブジェクト
+    """
+    fig, ax = plt.subplots(figsize=(6, 5))
+    # --- 散布図 ---
+    ax.plot(
+            agent.get_motivation_curve().get_x_values(),
+            agent.get_motivation_curve().get_y_values(),
+            linewidth=2,
+            label="Motivation over time"
+            )  
+    print(f"agent.get_lane_change_time(){agent.get_lane_change_time()}, agent.get_calculated_motivation_value(){agent.get_calculated_motivation_value()}")
+    # ax.scatter(agent.get_lane_change_time(), agent.get_calculated_motivation_value(), color='orange', s=30, label="Data points")
+    y_thr = agent.get_lane_change_decision_threshold()
+    x_reach_min_motivation = agent.get_reach_lane_minimum_motivation_time()
+    ax.axhline(y=y_thr, color="red", linestyle="--", linewidth=1.5, label=f"Threshold = {y_thr:.2f}")
+    ax.axvline(x=x_reach_min_motivation, color="red", linestyle="--", linewidth=1.5, label=f"reach min time = {y_thr:.2f}")
+    try:
+        y_cur = agent.get_calculated_motivation_value()
+        ax.axhline(y=y_cur, color="green", linestyle="--", linewidth=1.5, label=f"Current Value = {y_cur:.2f}")
+    except:
+        pass
+
+    # --- グラフ設定 ---
+    ax.legend(loc="best")
+    ax.set_xlabel("X")
+    ax.set_ylabel("Y")
+    ax.grid(True, linestyle="--", alpha=0.5)
+    plt.tight_layout()
+    plt.show()
+
+def plot_cdfs(cdf_data_with_system: dict, cdf_data_with_nosystem: dict):
+    plt.figure(figsize=(10, 6))
+
+    for early_rate, all_arrival_times in sorted(cdf_data_with_system.items()):
+        if not all_arrival_times:
+            continue
+        sorted_times = sorted(all_arrival_times)
+        cdf = np.arange(1, len(sorted_times)+1) / len(sorted_times)
+        plt.plot(sorted_times, cdf, label=f'early_rate={early_rate}')
+    print(f"cdf_data_with_nosystem: {cdf_data_with_nosystem}")
+    for early_rate, all_arrival_times in sorted(cdf_data_with_nosystem.items()):
+        if not all_arrival_times:
+            continue
+        sorted_times = sorted(all_arrival_times)
+        cdf = np.arange(1, len(sorted_times)+1) / len(sorted_times)
+        print(f"cdf: {cdf}")
+        plt.plot(sorted_times, cdf, label=f'nosystem early_rate={early_rate}')
+    plt.xlabel("Arrival Time")
+    plt.ylabel("CDF")
+    plt.title("CDF of Arrival Times (aggregated over runs)")
+    plt.grid(True)
+    plt.legend()
+    plt.tight_layout()
+    # plt.show()
+    plt.savefig("arrival_time_cdf.pdf", dpi=300)  # PDF出力
@@ -0,0 +1,51 @@
+# =========================
+# Standard library
+# =========================
+import os
+import sys
+
+# =========================
+# SUMO (SUMO_HOME must be on sys.path before importing traci)
+# =========================
+if "SUMO_HOME" in os.environ:
+    sys.path.append(os.path.join(os.environ["SUMO_HOME"], "tools"))
+
+from .sumo_backend import traci  # noqa: E402
+
+class RouteRegistry():
+    '''
+    SUMO上の routeID と経由edgeの対応
+    このコードが追加する route は add() で traci.route.add と同時に登録し、SUMOへ問い合わせ直さない
+    それ以外（.rou.xml の route や SUMO が内部で追加した route）は get_edges() で初めて参照したときに取得する
+    '''
+    def __init__(self):
+        self._edges_by_routeID:dict = {} # key: routeID, value: 経由edgeIDのタプル
+
+    # route の追加（traci.route.add の代わりに呼び出す）
+    def add(self, routeID:str, edges:list):
+        traci.route.add(routeID=routeID, edges=edges)
+        self._edges_by_routeID[routeID] = tuple(edges)
+
+    # 経由edgeの取得　未登録の route のみ SUMO に問い合わせて登録する（route の経由edgeは変更されない）
+    def get_edges(self, routeID:str):
+        edges = self._edges_by_routeID.get(routeID)
+        if edges is None:
+            edges = tuple(traci.route.getEdges(routeID))
+            self._edges_by_routeID[routeID] = edges
+        return edges
+
+    def get_routeIDs(self):
+        return list(self._edges_by_routeID)
+
+    def __contains__(self, routeID:str):
+        return routeID in self._edges_by_routeID
+
+    def __len__(self):
+        return len(self._edges_by_routeID)
+
+    # シミュレーション終了時（次のシナリオの開始前）に登録内容を破棄する
+    def clear(self):
+        self._edges_by_routeID = {}
+
+# シミュレーション全体で共有する route の登録簿
+route_registry = RouteRegistry()
@@ -0,0 +1,222 @@
+# =========================
+# Standard library
+# =========================
+import hashlib
+import heapq
+import os
+import sys
+
+# =========================
+# SUMO (SUMO_HOME must be on sys.path before importing sumolib)
+# =========================
+if "SUMO_HOME" in os.environ:
+    sys.path.append(os.path.join(os.environ["SUMO_HOME"], "tools"))
+
+import sumolib  # noqa: E402
+
+# =========================
+# Third-party libraries
+# =========================
+import numpy as np  # noqa: E402
+
+ROUTE_TABLE_FORMAT_VERSION = 2
+CACHE_DIR_ENV_VAR = "ITS102_ROUTE_CACHE_DIR" # 環境変数でキャッシュの保存先を変更する（既定は .net.xml と同じディレクトリの .route_cache）
+DEFAULT_CACHE_DIR_NAME = ".route_cache"
+DEFAULT_VCLASS = "passenger"
+
+# 同じプロセスで読み込んだ経路表（ワーカーで複数シナリオを実行しても1回だけ読み込む）
+_route_table_by_net_hash:dict = {}
+
+class RouteTable():
+    '''
+    道路網の全edge対の到達可否と最短経路の表
+    traci.simulation.findRoute の代わりに、sumolib で読み込んだ道路網上で edge ごとに Dijkstra 法を1回ずつ実行して作る
+    経路のコストは findRoute の既定と同じ旅行時間（edge長 / 制限速度）
+    保存形式は CSR（始点ごとに到達可能な終点と、最短経路木での直前のedgeを並べる）で、
+    読み込み後は始点ごとの dict（key: 終点index, value: 直前のedgeのindex）で O(1) に参照する
+    edgeの中心（第0車線の始点と次の点の中点）も保持し、edge間の中心距離の行列を edgeのindex で参照する
+    '''
+    def __init__(self, edgeIDs:list, indptr:np.ndarray, targets:np.ndarray, predecessors:np.ndarray, centers:np.ndarray):
+        self._edgeIDs:list = list(edgeIDs)
+        self._index_by_edgeID:dict = {edgeID: index for index, edgeID in enumerate(self._edgeIDs)}
+        self._indptr = indptr
+        self._targets = targets
+        self._predecessors = predecessors
+        self._centers = centers # shape: (edge数, 2)
+        self._distance_matrix = None # 初めて距離を参照したときに作成する
+        self._predecessor_by_target_list:list = [
+                                                    dict(zip(targets[indptr[i]:indptr[i + 1]].tolist(), predecessors[indptr[i]:indptr[i + 1]].tolist()))
+                                                    for i in range(len(self._edgeIDs))
+                                                    ]
+
+    # 道路網ファイルから経路表を作成
+    @classmethod
+    def build_from_net(cls, net_file:str, vClass:str=DEFAULT_VCLASS):
+        net = sumolib.net.readNet(net_file)
+        edges = [edge for edge in net.getEdges() if edge.getFunction() != "internal" and edge.allows(vClass)]
+        edgeIDs = [edge.getID() for edge in edges]
+        centers = [_get_lane_center(edge.getLanes()[0].getShape()) for edge in edges]
+        index_by_edgeID = {edgeID: index for index, edgeID in enumerate(edgeIDs)}
+        # 隣接リスト（key: edgeのindex, value: [(次のedgeのindex, 次のedgeの旅行時間)]）
+        neighbours_by_index = []
+        for edge in edges:
+            neighbours = []
+            for next_edge in edge.getOutgoing():
+                next_index = index_by_edgeID.get(next_edge.getID())
+                if next_index is not None:
+                    neighbours.append((next_index, next_edge.getLength() / next_edge.getSpeed()))
+            neighbours_by_index.append(neighbours)
+
+        indptr = [0]
+        targets = []
+        predecessors = []
+        for source_index in range(len(edges)):
+            predecessor_by_target = _shortest_path_tree(source_index, neighbours_by_index, edgeIDs)
+            for target_index in sorted(predecessor_by_target):
+                targets.append(target_index)
+                predecessors.append(predecessor_by_target[target_index])
+            indptr.append(len(targets))
+        return cls(
+                    edgeIDs=edgeIDs,
+                    indptr=np.asarray(indptr, dtype=np.int32),
+                    targets=np.asarray(targets, dtype=np.int32),
+                    predecessors=np.asarray(predecessors, dtype=np.int32),
+                    centers=np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+                    )
+
+    # 経路表の保存（np.savez_compressed 形式）
+    def save(self, file_path:str):
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        tmp_file_path = file_path + f".{os.getpid()}.tmp"
+        with open(tmp_file_path, "wb") as f:
+            np.savez_compressed(
+                                f,
+                                format_version=np.int32(ROUTE_TABLE_FORMAT_VERSION),
+                                edgeIDs=np.asarray(self._edgeIDs, dtype=str),
+                                indptr=self._indptr,
+                                targets=self._targets,
+                                predecessors=self._predecessors,
+                                centers=self._centers
+                                )
+        # 並列で同じ道路網の表を作っても、書きかけのファイルを読まないよう置き換える
+        os.replace(tmp_file_path, file_path)
+
+    # 経路表の読み込み
+    @classmethod
+    def load(cls, file_path:str):
+        with np.load(file_path, allow_pickle=False) as data:
+            if int(data["format_version"]) != ROUTE_TABLE_FORMAT_VERSION:
+                raise ValueError(f"経路表の形式が異なります: {file_path}")
+            return cls(
+                        edgeIDs=data["edgeIDs"].tolist(),
+                        indptr=data["indptr"],
+                        targets=data["targets"],
+                        predecessors=data["predecessors"],
+                        centers=data["centers"]
+                        )
+
+    # from_edgeID から to_edgeID への経路が存在するか（同一edgeは経路なし）
+    def is_route_exist(self, from_edgeID:str, to_edgeID:str):
+        from_index = self._index_by_edgeID.get(from_edgeID)
+        to_index = self._index_by_edgeID.get(to_edgeID)
+        if from_index is None or to_index is None:
+            return False
+        return to_index in self._predecessor_by_target_list[from_index]
+
+    # from_edgeID から to_edgeID への最短経路（両端を含むedgeIDのリスト）　経路がない場合は空リスト
+    def get_route_edgeIDs(self, from_edgeID:str, to_edgeID:str):
+        if not self.is_route_exist(from_edgeID, to_edgeID):
+            return []
+        from_index = self._index_by_edgeID[from_edgeID]
+        predecessor_by_target = self._predecessor_by_target_list[from_index]
+        route_indexes = [self._index_by_edgeID[to_edgeID]]
+        while route_indexes[-1] != from_index:
+            route_indexes.append(predecessor_by_target[route_indexes[-1]])
+        return [self._edgeIDs[index] for index in reversed(route_indexes)]
+
+    def get_edgeIDs(self):
+        return list(self._edgeIDs)
+
+    # edgeIDに対応するindex　表にないedgeは None
+    def get_edge_index(self, edgeID:str):
+        return self._index_by_edgeID.get(edgeID)
+
+    # edge間の中心距離の行列（行: 始点のindex, 列: 終点のindex）
+    def get_distance_matrix(self):
+        if self._distance_matrix is None:
+            diff_x = self._centers[:, 0][:, np.newaxis] - self._centers[:, 0][np.newaxis, :]
+            diff_y = self._centers[:, 1][:, np.newaxis] - self._centers[:, 1][np.newaxis, :]
+            self._distance_matrix = np.sqrt(diff_x * diff_x + diff_y * diff_y)
+        return self._distance_matrix
+
+    # from_edgeIDs[i] から to_edgeIDs[i] への中心距離の配列　表にないedgeを含む対は default_distance
+    def get_distances(self, from_edgeIDs:list, to_edgeIDs:list, default_distance:float=100000):
+        from_indexes = np.asarray([self._index_by_edgeID.get(edgeID, -1) for edgeID in from_edgeIDs], dtype=np.int64)
+        to_indexes = np.asarray([self._index_by_edgeID.get(edgeID, -1) for edgeID in to_edgeIDs], dtype=np.int64)
+        distances = np.full(len(from_indexes), float(default_distance))
+        known = (from_indexes >= 0) & (to_indexes >= 0)
+        distances[known] = self.get_distance_matrix()[from_indexes[known], to_indexes[known]]
+        return distances
+
+    # from_edgeID から to_edgeID への中心距離
+    def get_distance(self, from_edgeID:str, to_edgeID:str, default_distance:float=100000):
+        from_index = self._index_by_edgeID.get(from_edgeID)
+        to_index = self._index_by_edgeID.get(to_edgeID)
+        if from_index is None or to_index is None:
+            return default_distance
+        return float(self.get_distance_matrix()[from_index, to_index])
+
+    # 経路が存在するedge対の数
+    def get_route_num(self):
+        return len(self._targets)
+
+# 始点からの最短経路木（key: 到達可能なedgeのindex, value: 直前のedgeのindex）　始点自身は含めない
+def _shortest_path_tree(source_index:int, neighbours_by_index:list, edgeIDs:list):
+    cost_by_index = {source_index: 0.0}
+    predecessor_by_target = {}
+    # 同じコストの場合はedgeIDの順に確定させる
+    heap = [(0.0, edgeIDs[source_index], source_index)]
+    while heap:
+        cost, _, index = heapq.heappop(heap)
+        if cost > cost_by_index[index]:
+            continue
+        for next_index, next_cost in neighbours_by_index[index]:
+            new_cost = cost + next_cost
+            if next_index not in cost_by_index or new_cost < cost_by_index[next_index]:
+                cost_by_index[next_index] = new_cost
+                predecessor_by_target[next_index] = index
+                heapq.heappush(heap, (new_cost, edgeIDs[next_index], next_index))
+    predecessor_by_target.pop(source_index, None)
+    return predecessor_by_target
+
+# 車線形状の始点と次の点の中点（utilities.calculate_distance_between_edgeIDs と同じ定義）
+def _get_lane_center(lane_shape:list):
+    return ((lane_shape[0][0] + lane_shape[1][0])/2, (lane_shape[0][1] + lane_shape[1][1])/2)
+
+# 道路網ファイルの内容のハッシュ値（経路表のキャッシュキー）
+def get_net_hash(net_file:str):
+    sha256 = hashlib.sha256()
+    with open(net_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def get_route_table_cache_path(net_file:str, net_hash:str, vClass:str=DEFAULT_VCLASS):
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR) or os.path.join(os.path.dirname(os.path.abspath(net_file)), DEFAULT_CACHE_DIR_NAME)
+    return os.path.join(cache_dir, f"route_table_{vClass}_{net_hash[:16]}.npz")
+
+# 道路網ファイルに対応する経路表の取得
+# 同じ内容の道路網で作成済みの表があれば読み込み、なければ作成して保存する
+def load_route_table(net_file:str, vClass:str=DEFAULT_VCLASS):
+    net_hash = get_net_hash(net_file)
+    route_table = _route_table_by_net_hash.get((net_hash, vClass))
+    if route_table is not None:
+        return route_table
+    cache_path = get_route_table_cache_path(net_file, net_hash, vClass)
+    if os.path.exists(cache_path):
+        route_table = RouteTable.load(cache_path)
+    else:
+        route_table = RouteTable.build_from_net(net_file, vClass=vClass)
+        route_table.save(cache_path)
+    _route_table_by_net_hash[(net_hash, vClass)] = route_table
+    return route_table
@@ -1,15 +1,17 @@
 import subprocess
 import re
-import ast
 import statistics
 from collections import defaultdict
 import sys
 import json
-import matplotlib.pyplot as plt
-import numpy as np
 import datetime
 import re
 from collections import defaultdict
+import os
+
+# python3 its102/run_multiple.py としても its102 パッケージを import できるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from its102 import simulation_result  # noqa: E402
 
 _ID_RE = re.compile(r'^(?:init|newveh)_ShelterA_1_(\d+)(?:_\d+)?$')
 
@@ -32,10 +34,10 @@ NUM_RUNS = 50
 early_rate_list = [0.1, 0.5, 0.9]
 vehicle_interval = 5.0
 
-# 追加集計のキー（stdoutで "KEY: <int>" 形式を想定）
+# 追加集計のキー（runner が --result-file に書き出す結果レコードのキー）
 ADDITIONAL_KEYS = [
     "INSIGHT_RANGE",
-    "OBTAIN_INFO_LANE_CHANFE_COUNT",
+    "OBTAIN_INFO_LANE_CHANGE_COUNT",
     "ELAPSED_TIME_LANE_CHANGE_COUNT",
     "NORMALCY_BIAS_COUNT",
     "NEGATIVE_MAJORITY_BIAS_COUNT",
@@ -54,56 +56,21 @@ def run_simulation_with_system(script_name: str, early_rate: float):
     ]
     print(f"  実行中: {' '.join(command)}")
     try:
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8'
-        )
+        # 結果は runner が --result-file に書き出す JSON Lines から読み込む（stdout は読み捨てる）
+        record = simulation_result.run_simulation_subprocess(command)
     except subprocess.CalledProcessError as e:
         print(f"  [致命的エラー] コマンド実行に失敗しました: {' '.join(command)}", file=sys.stderr)
         print(f"  Return Code: {e.returncode}", file=sys.stderr)
         print(f"  Stderr: {e.stderr}", file=sys.stderr)
         return None
     except Exception as e:
-        print(f"  [致命的エラー] パース中に予期せぬエラーが発生しました: {e}", file=sys.stderr)
+        print(f"  [致命的エラー] 結果の読み込み中に予期せぬエラーが発生しました: {e}", file=sys.stderr)
         print(f"  コマンド: {' '.join(command)}", file=sys.stderr)
         return None
 
-    arrival_time_by_target_vehID_dict = {}
-    changed_vehicle_num = None  # 数値を想定（互換のため辞書表現でも可）
-    extra_metrics = {k: 0 for k in ADDITIONAL_KEYS}
-
-    for raw in result.stdout.splitlines():
-        line = raw.strip()
-        if "LANE_CHANGED_VEHICLE_NUM" in line:
-            try:
-                dict_str = line.split(":", 1)[1].strip()
-                # 数値優先。ダメなら literal_eval
-                try:
-                    changed_vehicle_num = int(dict_str)
-                except ValueError:
-                    changed_vehicle_num = ast.literal_eval(dict_str)
-            except Exception as e:
-                print(f"Error parsing LANE_CHANGED_VEHICLE_NUM: {e}")
-
-        if "arrival_time_by_vehID_dict" in line:
-            try:
-                dict_str = line.split(":", 1)[1].strip()
-                arrival_time_by_target_vehID_dict = ast.literal_eval(dict_str)
-            except Exception as e:
-                print(f"Error parsing vehID dict: {e}")
-
-        # 追加5項目
-        for key in ADDITIONAL_KEYS:
-            if line.startswith(f"{key}:"):
-                try:
-                    val_str = line.split(":", 1)[1].strip()
-                    # 整数想定
-                    extra_metrics[key] = int(val_str)
-                except Exception as e:
-                    print(f"Error parsing {key}: {e}")
+    arrival_time_by_target_vehID_dict = record["arrival_time_by_vehID_dict"]
+    changed_vehicle_num = record["LANE_CHANGED_VEHICLE_NUM"]
+    extra_metrics = {k: record.get(k, 0) for k in ADDITIONAL_KEYS}
 
     # ログ（上書き）
     log_filename = f"log_{early_rate}.txt"
@@ -130,53 +97,21 @@ def run_simulation_with_nosystem(script_name: str, early_rate: float):
     ]
     print(f"  実行中: {' '.join(command)}")
     try:
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8'
-        )
+        # 結果は runner が --result-file に書き出す JSON Lines から読み込む（stdout は読み捨てる）
+        record = simulation_result.run_simulation_subprocess(command)
     except subprocess.CalledProcessError as e:
         print(f"  [致命的エラー] コマンド実行に失敗しました: {' '.join(command)}", file=sys.stderr)
         print(f"  Return Code: {e.returncode}", file=sys.stderr)
         print(f"  Stderr: {e.stderr}", file=sys.stderr)
         return None
     except Exception as e:
-        print(f"  [致命的エラー] パース中に予期せぬエラーが発生しました: {e}", file=sys.stderr)
+        print(f"  [致命的エラー] 結果の読み込み中に予期せぬエラーが発生しました: {e}", file=sys.stderr)
         print(f"  コマンド: {' '.join(command)}", file=sys.stderr)
         return None
 
-    arrival_time_by_target_vehID_dict = {}
-    changed_vehicle_num = None
-    extra_metrics = {k: 0 for k in ADDITIONAL_KEYS}
-
-    for raw in result.stdout.splitlines():
-        line = raw.strip()
-        if "LANE_CHANGED_VEHICLE_NUM" in line:
-            try:
-                dict_str = line.split(":", 1)[1].strip()
-                try:
-                    changed_vehicle_num = int(dict_str)
-                except ValueError:
-                    changed_vehicle_num = ast.literal_eval(dict_str)
-            except Exception as e:
-                print(f"Error parsing LANE_CHANGED_VEHICLE_NUM: {e}")
-
-        if "arrival_time_by_vehID_dict" in line:
-            try:
-                dict_str = line.split(":", 1)[1].strip()
-                arrival_time_by_target_vehID_dict = ast.literal_eval(dict_str)
-            except Exception as e:
-                print(f"Error parsing vehID dict: {e}")
-
-        for key in ADDITIONAL_KEYS:
-            if line.startswith(f"{key}:"):
-                try:
-                    val_str = line.split(":", 1)[1].strip()
-                    extra_metrics[key] = int(val_str)
-                except Exception as e:
-                    print(f"Error parsing {key}: {e}")
+    arrival_time_by_target_vehID_dict = record["arrival_time_by_vehID_dict"]
+    changed_vehicle_num = record["LANE_CHANGED_VEHICLE_NUM"]
+    extra_metrics = {k: record.get(k, 0) for k in ADDITIONAL_KEYS}
 
     log_filename = f"log_{early_rate}_nosystem.txt"
     try:
@@ -210,32 +145,6 @@ def compute_average_arrival_times(runvehID_arrival_time_dict_per_run_lists):
     # IDで昇順ソートして辞書化
     return dict(sorted(avg_by_id.items(), key=lambda kv: kv[0]))
 
-def plot_cdfs(cdf_data_with_system: dict, cdf_data_with_nosystem: dict):
-    plt.figure(figsize=(10, 6))
-
-    for early_rate, all_arrival_times in sorted(cdf_data_with_system.items()):
-        if not all_arrival_times:
-            continue
-        sorted_times = sorted(all_arrival_times)
-        cdf = np.arange(1, len(sorted_times)+1) / len(sorted_times)
-        plt.plot(sorted_times, cdf, label=f'early_rate={early_rate}')
-    print(f"cdf_data_with_nosystem: {cdf_data_with_nosystem}")
-    for early_rate, all_arrival_times in sorted(cdf_data_with_nosystem.items()):
-        if not all_arrival_times:
-            continue
-        sorted_times = sorted(all_arrival_times)
-        cdf = np.arange(1, len(sorted_times)+1) / len(sorted_times)
-        print(f"cdf: {cdf}")
-        plt.plot(sorted_times, cdf, label=f'nosystem early_rate={early_rate}')
-    plt.xlabel("Arrival Time")
-    plt.ylabel("CDF")
-    plt.title("CDF of Arrival Times (aggregated over runs)")
-    plt.grid(True)
-    plt.legend()
-    plt.tight_layout()
-    # plt.show()
-    plt.savefig("arrival_time_cdf.pdf", dpi=300)  # PDF出力
-
 if __name__ == "__main__":
     avg_arrival_by_vehID_with_system = {}      # {early_rate: [avg_times]}
     avg_changed_vehicle_num_with_system = {}   # {early_rate: avg_changed_vehicle_num}
@@ -323,5 +232,6 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Error writing to log file: {e}")
 
-    # CDF描画
-    plot_cdfs(avg_arrival_by_vehID_with_system, avg_arrival_by_vehID_with_nosystem)
+    # CDF描画（matplotlib はここで初めて読み込む）
+    from its102 import plotting  # noqa: E402
+    plotting.plot_cdfs(avg_arrival_by_vehID_with_system, avg_arrival_by_vehID_with_nosystem)
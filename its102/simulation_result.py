@@ -0,0 +1,112 @@
+# =========================
+# Standard library
+# =========================
+import json
+import os
+import subprocess
+import tempfile
+
+# runner の --result-file に書き出す結果レコード（JSON Lines 形式、1実行につき1行）
+# キーは従来 stdout に出力していた名前に合わせる
+RESULT_FORMAT_VERSION = 1
+COUNTER_KEYS = [
+    "LANE_CHANGED_VEHICLE_NUM",
+    "OBTAIN_INFO_LANE_CHANGE_COUNT",
+    "ELAPSED_TIME_LANE_CHANGE_COUNT",
+    "NORMALCY_BIAS_COUNT",
+    "NEGATIVE_MAJORITY_BIAS_COUNT",
+    "POSITIVE_MAJORITY_BIAS_COUNT",
+]
+
+# 結果レコードの作成
+def build_result_record(
+                        script_name:str,
+                        early_rate:float,
+                        vehicle_interval:float,
+                        INSIGHT_RANGE:float,
+                        counter_by_key:dict,
+                        arrival_time_by_vehID_dict:dict,
+                        elapsed_time_list:list,
+                        all_vehicles_arrived:bool
+                        ):
+    record = {
+                "format_version": RESULT_FORMAT_VERSION,
+                "script": script_name,
+                "early_rate": early_rate,
+                "vehicle_interval": vehicle_interval,
+                "INSIGHT_RANGE": INSIGHT_RANGE,
+                }
+    for key in COUNTER_KEYS:
+        record[key] = counter_by_key.get(key, 0)
+    record["arrival_time_by_vehID_dict"] = arrival_time_by_vehID_dict
+    record["mean_elapsed_time"] = sum(elapsed_time_list) / len(elapsed_time_list) if elapsed_time_list else None
+    record["all_vehicles_arrived"] = all_vehicles_arrived
+    return record
+
+# シナリオ1回分の結果（run_scenario の戻り値）
+class SimulationResult():
+    def __init__(self, script_name:str, early_rate:float, vehicle_interval:float, INSIGHT_RANGE:float,
+                 counter_by_key:dict, arrival_time_by_vehID_dict:dict, elapsed_time_list:list,
+                 arrival_vehicle_num:int, TOTAL_VEHNUM:int):
+        self.script_name = script_name
+        self.early_rate = early_rate
+        self.vehicle_interval = vehicle_interval
+        self.INSIGHT_RANGE = INSIGHT_RANGE
+        self.counter_by_key = counter_by_key # key: COUNTER_KEYS, value: 回数
+        self.arrival_time_by_vehID_dict = arrival_time_by_vehID_dict # key: vehID, value: 避難地到着時刻
+        self.elapsed_time_list = elapsed_time_list # 生成から避難地到着までの経過時間
+        self.arrival_vehicle_num = arrival_vehicle_num
+        self.TOTAL_VEHNUM = TOTAL_VEHNUM
+
+    def is_all_vehicles_arrived(self):
+        return self.arrival_vehicle_num == self.TOTAL_VEHNUM
+
+    # --result-file に書き出す結果レコードへの変換
+    def to_record(self):
+        return build_result_record(
+                                    script_name=self.script_name,
+                                    early_rate=self.early_rate,
+                                    vehicle_interval=self.vehicle_interval,
+                                    INSIGHT_RANGE=self.INSIGHT_RANGE,
+                                    counter_by_key=self.counter_by_key,
+                                    arrival_time_by_vehID_dict=self.arrival_time_by_vehID_dict,
+                                    elapsed_time_list=self.elapsed_time_list,
+                                    all_vehicles_arrived=self.is_all_vehicles_arrived()
+                                    )
+
+# 結果レコードを1行追記する（複数実行で同じファイルを共有できる）
+def write_result(result_file:str, record:dict):
+    with open(result_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        f.write("\n")
+
+# ファイル内の全ての結果レコードを読み込む
+def read_results(result_file:str):
+    records = []
+    with open(result_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+# runner をサブプロセスで実行し、結果レコードを返す
+# stdout は読み捨て、失敗時は subprocess.CalledProcessError（stderr 付き）を送出する
+def run_simulation_subprocess(command:list):
+    fd, result_file = tempfile.mkstemp(prefix="its102_result_", suffix=".jsonl")
+    os.close(fd)
+    try:
+        subprocess.run(
+                        command + ["--result-file", result_file],
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.PIPE,
+                        text=True,
+                        check=True,
+                        encoding="utf-8"
+                        )
+        records = read_results(result_file)
+    finally:
+        os.remove(result_file)
+    if not records:
+        raise ValueError(f"結果レコードが出力されていません: {' '.join(command)}")
+    return records[-1]
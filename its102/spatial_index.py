@@ -0,0 +1,95 @@
+# =========================
+# Third-party libraries
+# =========================
+import numpy as np
+
+# 自セル + 右/上方向の隣接セル（各ペアを一度だけ列挙するための半分のステンシル）
+HALF_NEIGHBOUR_CELL_OFFSETS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+class SpatialGrid():
+    '''
+    車両位置の一様グリッド索引
+    セル幅を通信距離以上にすると、距離 radius 未満のペアは必ず自セルか隣接セルに含まれる
+    build() で1ステップ分の位置を登録し、query_pairs() で全ペアをまとめて取得する
+    '''
+    def __init__(self, cell_size:float):
+        self.cell_size = float(cell_size)
+        self.vehIDs:list = []
+        self.positions = np.empty((0, 2), dtype=float)
+
+    # 車両IDと位置（[(x, y), ...]）を登録する
+    def build(self, vehIDs:list, positions:list):
+        self.vehIDs = list(vehIDs)
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+
+    # 距離 radius 未満の車両ペアを (i_index, j_index) の配列で返す（i != j, 各ペア1回のみ）
+    def query_pairs(self, radius:float):
+        vehicle_num = len(self.vehIDs)
+        if vehicle_num < 2:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        if radius > self.cell_size:
+            raise ValueError(f"radius({radius}) はセル幅({self.cell_size})以下である必要があります")
+
+        cells = np.floor(self.positions / self.cell_size).astype(np.int64)
+        cell_x = cells[:, 0] - cells[:, 0].min()
+        cell_y = cells[:, 1] - cells[:, 1].min() + 1 # 下隣のセル(-1)が負にならないようにずらす
+        width = int(cell_y.max()) + 2
+        cell_keys = cell_x * width + cell_y
+        order = np.argsort(cell_keys, kind="stable")
+        sorted_keys = cell_keys[order]
+
+        i_index_list = []
+        j_index_list = []
+        for offset_x, offset_y in HALF_NEIGHBOUR_CELL_OFFSETS:
+            neighbour_keys = (cell_x + offset_x) * width + (cell_y + offset_y)
+            starts = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+            ends = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+            counts = ends - starts
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            i_index = np.repeat(np.arange(vehicle_num), counts)
+            # 各車両について、隣接セル内の何番目の候補かを求める
+            first_positions = np.repeat(np.cumsum(counts) - counts, counts)
+            j_sorted_positions = np.repeat(starts, counts) + (np.arange(total) - first_positions)
+            j_index = order[j_sorted_positions]
+            if offset_x == 0 and offset_y == 0:
+                same_cell_mask = i_index < j_index
+                i_index = i_index[same_cell_mask]
+                j_index = j_index[same_cell_mask]
+            i_index_list.append(i_index)
+            j_index_list.append(j_index)
+
+        if not i_index_list:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        i_index = np.concatenate(i_index_list)
+        j_index = np.concatenate(j_index_list)
+        delta = self.positions[i_index] - self.positions[j_index]
+        distances = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
+        in_range_mask = distances < radius
+        return i_index[in_range_mask], j_index[in_range_mask]
+
+    # 距離 radius 未満の車両IDペアのリストを返す
+    def query_vehID_pairs(self, radius:float):
+        i_index, j_index = self.query_pairs(radius)
+        return [(self.vehIDs[i], self.vehIDs[j]) for i, j in zip(i_index.tolist(), j_index.tolist())]
+
+    # 車両IDごとの通信範囲内の車両IDリストを返す（リスト内は build() に渡した順）
+    def query_neighbour_vehIDs_by_vehID(self, radius:float):
+        i_index, j_index = self.query_pairs(radius)
+        return self.group_neighbour_vehIDs(i_index, j_index)
+
+    # query_pairs() で求めた組から、車両IDごとの通信可能範囲内の車両IDリストを作る
+    def group_neighbour_vehIDs(self, i_index, j_index):
+        neighbour_vehIDs_by_vehID = {vehID: [] for vehID in self.vehIDs}
+        if len(i_index) == 0:
+            return neighbour_vehIDs_by_vehID
+        # 両方向に展開し、(自車, 相手車) の登録順に並べる
+        own_index = np.concatenate([i_index, j_index])
+        other_index = np.concatenate([j_index, i_index])
+        order = np.lexsort((other_index, own_index))
+        for own, other in zip(own_index[order].tolist(), other_index[order].tolist()):
+            neighbour_vehIDs_by_vehID[self.vehIDs[own]].append(self.vehIDs[other])
+        return neighbour_vehIDs_by_vehID
@@ -0,0 +1,97 @@
+# =========================
+# Standard library
+# =========================
+import os
+import sys
+
+# =========================
+# SUMO (SUMO_HOME must be on sys.path before importing traci)
+# =========================
+if "SUMO_HOME" in os.environ:
+    sys.path.append(os.path.join(os.environ["SUMO_HOME"], "tools"))
+
+from .sumo_backend import traci  # noqa: E402
+from .step_snapshot import snapshot  # noqa: E402
+
+class SpeedCommandBuffer():
+    '''
+    1ステップ分の速度の指示（traci.vehicle.slowDown）をまとめて出す
+    configure() で tolerance を指定した場合のみ有効（無効の場合は slow_down() で直ちに slowDown を呼び出す）
+    slow_down() でステップ中の指示を車両ごとに集め（同じ車両は後の指示で上書き）、flush() でまとめて出す
+    前回出した指示との速度の差が tolerance 以下で、前回の指示がまだ効いている場合は出さない
+        - slowDown(speed, duration) は時刻 t に出すと t + duration のステップまで効き、その後は通常の速度に戻る
+          そのため同じ速度でも t + duration を過ぎたら出し直す（duration = 1.0 の場合は2ステップに1回）
+    setSpeed は slowDown の指示を上書きするため、set_speed() で直ちに出し、その車両の指示と記録を破棄する
+    '''
+    def __init__(self):
+        self._tolerance:float = None
+        self._pending_command_by_vehID:dict = {} # key: vehID, value: (速度, 時間)
+        self._issued_command_by_vehID:dict = {} # key: vehID, value: (速度, 時間, 出した時刻)
+        self._dispatched_count = 0
+        self._dropped_count = 0
+
+    # tolerance が None の場合は無効（シナリオの開始時に呼び出す）
+    def configure(self, tolerance:float=None):
+        self.clear()
+        self._tolerance = tolerance
+
+    def is_enabled(self):
+        return self._tolerance is not None
+
+    def slow_down(self, vehID:str, speed:float, duration:float):
+        if self._tolerance is None:
+            traci.vehicle.slowDown(vehID, speed, duration)
+            return
+        self._pending_command_by_vehID[vehID] = (speed, duration)
+
+    def set_speed(self, vehID:str, speed:float):
+        self.forget(vehID)
+        traci.vehicle.setSpeed(vehID, speed)
+
+    # 前回の指示と同じ速度で、前回の指示がまだ効いているか
+    def _is_redundant(self, vehID:str, speed:float, current_time:float):
+        issued_command = self._issued_command_by_vehID.get(vehID)
+        if issued_command is None:
+            return False
+        issued_speed, issued_duration, issued_time = issued_command
+        return abs(speed - issued_speed) <= self._tolerance and current_time - issued_time <= issued_duration
+
+    # このステップの指示をまとめて出す（control_vehicles の後に呼び出す）
+    def flush(self):
+        if not self._pending_command_by_vehID:
+            return
+        current_time = snapshot.get_time()
+        slow_down = traci.vehicle.slowDown
+        for vehID, (speed, duration) in self._pending_command_by_vehID.items():
+            # ステップ途中で削除した車両（snapshot.invalidate 済み）には出さない
+            if not snapshot.has_result(vehID):
+                continue
+            if self._is_redundant(vehID, speed, current_time):
+                self._dropped_count += 1
+                continue
+            slow_down(vehID, speed, duration)
+            self._issued_command_by_vehID[vehID] = (speed, duration, current_time)
+            self._dispatched_count += 1
+        self._pending_command_by_vehID = {}
+
+    # 到着・削除した車両の指示と記録を破棄する
+    def forget(self, vehID:str):
+        self._pending_command_by_vehID.pop(vehID, None)
+        self._issued_command_by_vehID.pop(vehID, None)
+
+    def get_dispatched_count(self):
+        return self._dispatched_count
+
+    def get_dropped_count(self):
+        return self._dropped_count
+
+    # シミュレーション終了時に保持している指示と記録を破棄し、無効にする
+    def clear(self):
+        self._tolerance = None
+        self._pending_command_by_vehID = {}
+        self._issued_command_by_vehID = {}
+        self._dispatched_count = 0
+        self._dropped_count = 0
+
+# runner と utilities が共有する速度の指示のバッファ
+speed_command_buffer = SpeedCommandBuffer()
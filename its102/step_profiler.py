@@ -0,0 +1,175 @@
+# =========================
+# Standard library
+# =========================
+import csv
+import json
+import os
+import time
+
+# =========================
+# Local / intra-package
+# =========================
+from .traci_stats import TraciCallCounter
+
+# control_vehicles の処理区分（CSVの列順）
+PHASE_NAMES = (
+    "simulation_step",
+    "snapshot_update",
+    "agent_schedule",
+    "arrival",
+    "speed_control",
+    "speed_dispatch",
+    "neighbour_search",
+    "v2v_communication",
+    "tsunami_broadcast",
+    "v2s_communication",
+    "bias",
+    "generate_new_veh",
+)
+
+class _NullPhase():
+    '''
+    計測しない場合の区間（何もしない）
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_PHASE = _NullPhase()
+
+class _Phase():
+    '''
+    with 文で囲んだ区間の経過時間と traci の呼び出し回数を StepProfiler に加算する
+    '''
+    def __init__(self, profiler, phase_name:str):
+        self._profiler = profiler
+        self._phase_name = phase_name
+        self._start_time = 0.0
+        self._start_traci_call_count = 0
+
+    def __enter__(self):
+        self._start_traci_call_count = self._profiler._get_traci_call_count()
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed_time = time.perf_counter() - self._start_time
+        traci_call_count = self._profiler._get_traci_call_count() - self._start_traci_call_count
+        self._profiler._add(self._phase_name, elapsed_time, traci_call_count)
+        return False
+
+class StepProfiler():
+    '''
+    シミュレーション1ステップごとの処理区分別の計測
+    区分ごとの経過時間（秒）・実行回数・traci の呼び出し回数と、ステップ全体の経過時間・traci の呼び出し回数を記録する
+    enabled=False の場合は phase() が何もしない区間を返すため、計測のオーバーヘッドはほぼない
+    '''
+    def __init__(self, enabled:bool=False):
+        self._enabled = enabled
+        self._call_counter = None
+        self._step_records:list = [] # ステップごとの計測結果
+        self._current_step_record:dict = None
+        self._step_start_time = 0.0
+        self._step_start_traci_call_count = 0
+
+    def is_enabled(self):
+        return self._enabled
+
+    # 計測の開始　traci の呼び出し回数は call_counter（traci.enable_call_counting の戻り値）から求める
+    def start(self, call_counter:TraciCallCounter=None):
+        if self._enabled:
+            self._call_counter = call_counter
+
+    # 計測の終了
+    def stop(self):
+        self._call_counter = None
+
+    def _get_traci_call_count(self):
+        if self._call_counter is None:
+            return 0
+        return self._call_counter.get_call_count()
+
+    def begin_step(self):
+        if not self._enabled:
+            return
+        self._current_step_record = {
+                                        "step": len(self._step_records),
+                                        "time": None,
+                                        "step_seconds": 0.0,
+                                        "step_traci_calls": 0,
+                                        }
+        for phase_name in PHASE_NAMES:
+            self._current_step_record[f"{phase_name}_seconds"] = 0.0
+            self._current_step_record[f"{phase_name}_calls"] = 0
+            self._current_step_record[f"{phase_name}_traci_calls"] = 0
+        self._step_start_traci_call_count = self._get_traci_call_count()
+        self._step_start_time = time.perf_counter()
+
+    def end_step(self, simulation_time:float):
+        if not self._enabled or self._current_step_record is None:
+            return
+        self._current_step_record["time"] = simulation_time
+        self._current_step_record["step_seconds"] = time.perf_counter() - self._step_start_time
+        self._current_step_record["step_traci_calls"] = self._get_traci_call_count() - self._step_start_traci_call_count
+        self._step_records.append(self._current_step_record)
+        self._current_step_record = None
+
+    # with profiler.phase("bias"): の形で区間を計測する
+    def phase(self, phase_name:str):
+        if not self._enabled:
+            return _NULL_PHASE
+        return _Phase(self, phase_name)
+
+    def _add(self, phase_name:str, elapsed_time:float, traci_call_count:int):
+        if self._current_step_record is None:
+            return
+        self._current_step_record[f"{phase_name}_seconds"] += elapsed_time
+        self._current_step_record[f"{phase_name}_calls"] += 1
+        self._current_step_record[f"{phase_name}_traci_calls"] += traci_call_count
+
+    def get_step_records(self):
+        return self._step_records
+
+    # 全ステップの合計
+    def get_summary(self):
+        summary = {
+                    "step_num": len(self._step_records),
+                    "step_seconds": sum(record["step_seconds"] for record in self._step_records),
+                    "step_traci_calls": sum(record["step_traci_calls"] for record in self._step_records),
+                    "phases": {},
+                    }
+        for phase_name in PHASE_NAMES:
+            summary["phases"][phase_name] = {
+                                                "seconds": sum(record[f"{phase_name}_seconds"] for record in self._step_records),
+                                                "calls": sum(record[f"{phase_name}_calls"] for record in self._step_records),
+                                                "traci_calls": sum(record[f"{phase_name}_traci_calls"] for record in self._step_records),
+                                                }
+        return summary
+
+    # ステップごとの計測結果をCSVで出力
+    def dump_csv(self, file_path:str):
+        fieldnames = ["step", "time", "step_seconds", "step_traci_calls"]
+        for phase_name in PHASE_NAMES:
+            fieldnames += [f"{phase_name}_seconds", f"{phase_name}_calls", f"{phase_name}_traci_calls"]
+        _makedirs_for(file_path)
+        with open(file_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(self._step_records)
+
+    # 合計とステップごとの計測結果をJSONで出力
+    def dump_json(self, file_path:str):
+        _makedirs_for(file_path)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.get_summary(), "steps": self._step_records}, f, ensure_ascii=False)
+
+    # file_prefix.csv と file_prefix.json に出力
+    def dump(self, file_prefix:str):
+        self.dump_csv(file_prefix + ".csv")
+        self.dump_json(file_prefix + ".json")
+
+def _makedirs_for(file_path:str):
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok=True)
@@ -0,0 +1,197 @@
+# =========================
+# Standard library
+# =========================
+import os
+import sys
+from bisect import bisect_left, insort
+
+# =========================
+# SUMO (SUMO_HOME must be on sys.path before importing sumolib/traci)
+# =========================
+if "SUMO_HOME" in os.environ:
+    sys.path.append(os.path.join(os.environ["SUMO_HOME"], "tools"))
+
+from traci import constants as tc  # noqa: E402
+
+from .sumo_backend import traci  # noqa: E402
+
+# 車両ごとにsubscribeする変数（control_vehicles と utilities が参照するもの）
+VEHICLE_SUBSCRIPTION_VARIABLES = (
+    tc.VAR_ROAD_ID,
+    tc.VAR_LANE_ID,
+    tc.VAR_LANEPOSITION,
+    tc.VAR_POSITION,
+    tc.VAR_SPEED,
+    tc.VAR_STOPSTATE,
+    tc.VAR_ROUTE_ID,
+    tc.VAR_EDGES,
+    tc.VAR_LEADER,
+)
+# シミュレーション全体でsubscribeする変数
+SIMULATION_SUBSCRIPTION_VARIABLES = (
+    tc.VAR_TIME,
+    tc.VAR_DEPARTED_VEHICLES_IDS,
+    tc.VAR_ARRIVED_VEHICLES_IDS,
+)
+LEADER_LOOKAHEAD_DISTANCE = 100.0 # traci.vehicle.getLeader の既定値に合わせる
+STOP_STATE_PARKING = 2 # traci.vehicle.isStoppedParking と同じ判定ビット
+
+class StepSnapshot():
+    '''
+    1ステップ分の車両状態を保持するビュー
+    simulationStep の直後に update() を呼ぶと、subscription の結果をまとめて取得する
+    車両IDリストは出発・到着した車両IDの subscription と invalidate() から更新し、毎ステップ traci.vehicle.getIDList を呼ばない
+    subscribe されていない車両・update() 前の呼び出しは traci へ直接問い合わせる
+    '''
+    def __init__(self):
+        self._results_by_vehID:dict = {} # key: vehID, value: {変数ID: 値}
+        self._subscribed_vehIDs:set = set()
+        self._active_vehIDs:set = set()
+        self._sorted_vehIDs:list = [] # traci.vehicle.getIDList と同じく車両ID順
+        self._simulation_results:dict = {}
+        self._vehIDs:tuple = ()
+        self._simulation_subscribed_flag = False
+        self._updated_flag = False
+
+    # simulationStep 後に呼び出し、このステップの状態を取得する
+    def update(self):
+        if not self._simulation_subscribed_flag:
+            traci.simulation.subscribe(SIMULATION_SUBSCRIPTION_VARIABLES)
+            self._simulation_subscribed_flag = True
+            # 最初の update 前から存在する車両を登録する（以後は出発・到着した車両の差分だけ反映する）
+            for vehID in traci.vehicle.getIDList():
+                self._add_vehID(vehID)
+        self._simulation_results = traci.simulation.getSubscriptionResults()
+        # 新たに出発した車両をsubscribeする
+        for vehID in self._simulation_results.get(tc.VAR_DEPARTED_VEHICLES_IDS, ()):
+            self._add_vehID(vehID)
+        # 到着した車両の subscribe は SUMO が解除する
+        for vehID in self._simulation_results.get(tc.VAR_ARRIVED_VEHICLES_IDS, ()):
+            self._remove_vehID(vehID)
+            self._subscribed_vehIDs.discard(vehID)
+        self._results_by_vehID = traci.vehicle.getAllSubscriptionResults()
+        # テレポート中の車両（road ID が空）は traci.vehicle.getIDList と同じく除く
+        self._vehIDs = tuple(vehID for vehID in self._sorted_vehIDs if self._get(vehID, tc.VAR_ROAD_ID) != "")
+        self._updated_flag = True
+
+    def subscribe_vehicle(self, vehID:str):
+        traci.vehicle.subscribe(
+                                vehID,
+                                VEHICLE_SUBSCRIPTION_VARIABLES,
+                                parameters={tc.VAR_LEADER: LEADER_LOOKAHEAD_DISTANCE}
+                                )
+        self._subscribed_vehIDs.add(vehID)
+
+    def _add_vehID(self, vehID:str):
+        if vehID in self._active_vehIDs:
+            return
+        self._active_vehIDs.add(vehID)
+        insort(self._sorted_vehIDs, vehID)
+        if vehID not in self._subscribed_vehIDs:
+            self.subscribe_vehicle(vehID)
+
+    def _remove_vehID(self, vehID:str):
+        if vehID not in self._active_vehIDs:
+            return
+        self._active_vehIDs.discard(vehID)
+        del self._sorted_vehIDs[bisect_left(self._sorted_vehIDs, vehID)]
+
+    # ステップ途中で削除する車両は traci.vehicle.remove の前に呼び出す
+    # subscribe を解除し（libsumo は解除しないと次の simulationStep で失敗する）、以後 traci へ直接問い合わせる
+    # 削除した車両は到着した車両IDに含まれないため、ここで車両IDリストから除く（このステップの get_vehIDs() には残る）
+    def invalidate(self, vehID:str):
+        self._results_by_vehID.pop(vehID, None)
+        self._remove_vehID(vehID)
+        if vehID in self._subscribed_vehIDs:
+            traci.vehicle.unsubscribe(vehID)
+            self._subscribed_vehIDs.discard(vehID)
+
+    # シミュレーション終了時（traci.close後）に保持している状態を破棄する
+    def clear(self):
+        self._results_by_vehID = {}
+        self._subscribed_vehIDs = set()
+        self._active_vehIDs = set()
+        self._sorted_vehIDs = []
+        self._simulation_results = {}
+        self._vehIDs = ()
+        self._simulation_subscribed_flag = False
+        self._updated_flag = False
+
+    # このステップの subscription の結果を持つ車両か（ステップ途中で削除した車両は False）
+    def has_result(self, vehID:str):
+        return vehID in self._results_by_vehID
+
+    def _get(self, vehID:str, variableID:int):
+        result = self._results_by_vehID.get(vehID)
+        if result is None:
+            return None
+        return result.get(variableID)
+
+    # 現在時刻の取得
+    def get_time(self):
+        if not self._updated_flag:
+            return traci.simulation.getTime()
+        return self._simulation_results[tc.VAR_TIME]
+
+    # 車両IDリストの取得
+    def get_vehIDs(self):
+        if not self._updated_flag:
+            return traci.vehicle.getIDList()
+        return self._vehIDs
+
+    # このステップで出発・到着した車両IDの取得
+    def get_departed_vehIDs(self):
+        if not self._updated_flag:
+            return traci.simulation.getDepartedIDList()
+        return self._simulation_results[tc.VAR_DEPARTED_VEHICLES_IDS]
+    def get_arrived_vehIDs(self):
+        if not self._updated_flag:
+            return traci.simulation.getArrivedIDList()
+        return self._simulation_results[tc.VAR_ARRIVED_VEHICLES_IDS]
+
+    def get_road_ID(self, vehID:str):
+        value = self._get(vehID, tc.VAR_ROAD_ID)
+        return traci.vehicle.getRoadID(vehID) if value is None else value
+
+    def get_lane_ID(self, vehID:str):
+        value = self._get(vehID, tc.VAR_LANE_ID)
+        return traci.vehicle.getLaneID(vehID) if value is None else value
+
+    def get_lane_position(self, vehID:str):
+        value = self._get(vehID, tc.VAR_LANEPOSITION)
+        return traci.vehicle.getLanePosition(vehID) if value is None else value
+
+    def get_position(self, vehID:str):
+        value = self._get(vehID, tc.VAR_POSITION)
+        return traci.vehicle.getPosition(vehID) if value is None else value
+
+    def get_speed(self, vehID:str):
+        value = self._get(vehID, tc.VAR_SPEED)
+        return traci.vehicle.getSpeed(vehID) if value is None else value
+
+    def is_stopped_parking(self, vehID:str):
+        value = self._get(vehID, tc.VAR_STOPSTATE)
+        if value is None:
+            return traci.vehicle.isStoppedParking(vehID)
+        return (value & STOP_STATE_PARKING) == STOP_STATE_PARKING
+
+    def get_route_ID(self, vehID:str):
+        value = self._get(vehID, tc.VAR_ROUTE_ID)
+        return traci.vehicle.getRouteID(vehID) if value is None else value
+
+    def get_route(self, vehID:str):
+        value = self._get(vehID, tc.VAR_EDGES)
+        return traci.vehicle.getRoute(vehID) if value is None else value
+
+    # 先行車両の取得　先行車両がいない場合は traci.vehicle.getLeader と同じく None
+    def get_leader(self, vehID:str):
+        result = self._results_by_vehID.get(vehID)
+        if result is None or tc.VAR_LEADER not in result:
+            return traci.vehicle.getLeader(vehID)
+        leader = result[tc.VAR_LEADER]
+        if leader is None or leader[0] == "":
+            return None
+        return leader
+
+# runner と utilities が共有するステップごとのビュー
+snapshot = StepSnapshot()
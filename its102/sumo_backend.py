@@ -0,0 +1,142 @@
+# =========================
+# Standard library
+# =========================
+import importlib
+import os
+import sys
+import time
+
+# =========================
+# SUMO (SUMO_HOME must be on sys.path before importing traci/libsumo)
+# =========================
+if "SUMO_HOME" in os.environ:
+    sys.path.append(os.path.join(os.environ["SUMO_HOME"], "tools"))
+
+from .traci_stats import TraciCallCounter  # noqa: E402
+
+BACKEND_ENV_VAR = "ITS102_SUMO_BACKEND" # 環境変数で traci / libsumo を選択する
+DEFAULT_BACKEND = "traci"
+SUPPORTED_BACKENDS = ("traci", "libsumo")
+# 呼び出し回数を数える対象（traci.vehicle.getSpeed などのドメインと、モジュール直下の関数）
+COUNTED_DOMAIN_NAMES = (
+    "busstop", "calibrator", "chargingstation", "edge", "gui", "inductionloop", "junction", "lane", "lanearea",
+    "meandata", "multientryexit", "overheadwire", "parkingarea", "person", "poi", "polygon", "rerouter", "route",
+    "routeprobe", "simulation", "trafficlight", "variablespeedsign", "vehicle", "vehicletype",
+)
+COUNTED_FUNCTION_NAMES = ("simulationStep", "start", "load", "close")
+
+# traci のドメイン（traci.vehicle など）を包み、メソッドごとに呼び出し回数とレイテンシを記録する
+class CountingDomain():
+    def __init__(self, domain, domain_name:str, call_counter:TraciCallCounter):
+        self._domain = domain
+        self._domain_name = domain_name
+        self._call_counter = call_counter
+
+    def __getattr__(self, attribute_name:str):
+        value = getattr(self._domain, attribute_name)
+        if attribute_name.startswith("_") or not callable(value):
+            return value
+        counted_function = _count_calls(value, f"{self._domain_name}.{attribute_name}", self._call_counter)
+        self.__dict__[attribute_name] = counted_function
+        return counted_function
+
+def _count_calls(function, method_name:str, call_counter:TraciCallCounter):
+    def counted_function(*args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            call_counter.record(method_name, time.perf_counter() - start_time)
+    return counted_function
+
+class SumoBackend():
+    '''
+    traci と libsumo を切り替えるためのモジュールプロキシ
+    traci.vehicle.getSpeed(...) のように traci モジュールと同じ書き方で呼び出せる
+    最初に属性へアクセスした時点で未選択なら、環境変数 ITS102_SUMO_BACKEND（既定は traci）を使う
+    '''
+    def __init__(self):
+        self._backend_name = None
+        self._backend_module = None
+        self._cached_attribute_names:list = []
+        self._call_counter:TraciCallCounter = None
+
+    # バックエンドの選択（traci.start より前に呼び出す）
+    def select(self, backend_name:str):
+        if backend_name not in SUPPORTED_BACKENDS:
+            raise ValueError(f"未対応のSUMOバックエンドです: {backend_name} (対応: {SUPPORTED_BACKENDS})")
+        if backend_name == self._backend_name:
+            return self._backend_module
+        backend_module = importlib.import_module(backend_name)
+        # 以前のバックエンドでキャッシュした属性を破棄する
+        self._clear_cached_attributes()
+        self._backend_name = backend_name
+        self._backend_module = backend_module
+        return backend_module
+
+    def _clear_cached_attributes(self):
+        for attribute_name in self._cached_attribute_names:
+            self.__dict__.pop(attribute_name, None)
+        self._cached_attribute_names = []
+
+    # 呼び出し回数・レイテンシの計測を開始し、カウンタを返す（計測しない場合は呼び出し時のオーバーヘッドはない）
+    # stream_file を指定すると呼び出しごとの記録をファイルへ書き出す
+    def enable_call_counting(self, stream_file:str=None):
+        self._call_counter = TraciCallCounter(stream_file=stream_file)
+        self._clear_cached_attributes()
+        return self._call_counter
+
+    def disable_call_counting(self):
+        if self._call_counter is not None:
+            self._call_counter.close()
+        self._call_counter = None
+        self._clear_cached_attributes()
+
+    def get_call_counter(self):
+        return self._call_counter
+
+    def get_backend_name(self):
+        if self._backend_module is None:
+            self.select(os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND))
+        return self._backend_name
+
+    def is_libsumo(self):
+        return self.get_backend_name() == "libsumo"
+
+    # traci / libsumo の属性を取得し、以後は通常の属性として参照できるようにキャッシュする
+    def __getattr__(self, attribute_name:str):
+        if attribute_name.startswith("_"):
+            raise AttributeError(attribute_name)
+        if self._backend_module is None:
+            self.select(os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND))
+        value = getattr(self._backend_module, attribute_name)
+        if self._call_counter is not None:
+            if attribute_name in COUNTED_DOMAIN_NAMES:
+                value = CountingDomain(value, attribute_name, self._call_counter)
+            elif attribute_name in COUNTED_FUNCTION_NAMES:
+                value = _count_calls(value, attribute_name, self._call_counter)
+        self.__dict__[attribute_name] = value
+        self._cached_attribute_names.append(attribute_name)
+        return value
+
+# import traci の代わりに from .sumo_backend import traci として使う
+traci = SumoBackend()
+
+# CLIオプション --libsumo / 環境変数からバックエンドを選択する
+def select_backend(use_libsumo:bool=False):
+    if use_libsumo:
+        return traci.select("libsumo")
+    return traci.select(os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND))
+
+# SUMOの起動　既に接続済みの場合は traci.load で同じSUMOにシナリオを読み込み直す（ワーカーでの再利用向け）
+# traci.load では実行ファイルとトレースファイルは変更できない
+def start_or_load(sumo_command:list, traceFile:str=None, traceGetters:bool=False):
+    if traci.isLoaded():
+        traci.load(sumo_command[1:])
+    else:
+        traci.start(sumo_command, traceFile=traceFile, traceGetters=traceGetters)
+
+# 接続中のSUMOを終了する（未接続なら何もしない）
+def close_if_loaded():
+    if traci.isLoaded():
+        traci.close()
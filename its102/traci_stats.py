@@ -0,0 +1,142 @@
+# =========================
+# Standard library
+# =========================
+import bisect
+import json
+import os
+
+# レイテンシのヒストグラムの区切り（秒）　最後のバケットはそれ以上
+LATENCY_BUCKET_UPPER_BOUNDS = (
+    1e-6, 2e-6, 5e-6,
+    1e-5, 2e-5, 5e-5,
+    1e-4, 2e-4, 5e-4,
+    1e-3, 2e-3, 5e-3,
+    1e-2, 2e-2, 5e-2,
+    1e-1,
+)
+DEFAULT_REPORT_METHOD_NUM = 30
+
+class TraciCallCounter():
+    '''
+    traci の呼び出し回数とレイテンシの集計
+    API（"vehicle.getPosition" など）ごとに呼び出し回数・合計時間・レイテンシのヒストグラムを持つ
+    stream_file を指定すると、呼び出しごとに "API名,レイテンシ（秒）" を1行ずつ書き出す
+    '''
+    def __init__(self, stream_file:str=None):
+        self.call_count = 0
+        self._call_count_by_method:dict = {} # key: API名, value: 呼び出し回数
+        self._total_seconds_by_method:dict = {} # key: API名, value: 合計時間（秒）
+        self._histogram_by_method:dict = {} # key: API名, value: バケットごとの呼び出し回数
+        self._stream = None
+        if stream_file is not None:
+            directory = os.path.dirname(os.path.abspath(stream_file))
+            os.makedirs(directory, exist_ok=True)
+            self._stream = open(stream_file, "w", encoding="utf-8")
+            self._stream.write("method,latency_seconds\n")
+
+    def record(self, method_name:str, latency:float):
+        self.call_count += 1
+        histogram = self._histogram_by_method.get(method_name)
+        if histogram is None:
+            histogram = [0] * (len(LATENCY_BUCKET_UPPER_BOUNDS) + 1)
+            self._histogram_by_method[method_name] = histogram
+            self._call_count_by_method[method_name] = 0
+            self._total_seconds_by_method[method_name] = 0.0
+        histogram[bisect.bisect_left(LATENCY_BUCKET_UPPER_BOUNDS, latency)] += 1
+        self._call_count_by_method[method_name] += 1
+        self._total_seconds_by_method[method_name] += latency
+        if self._stream is not None:
+            self._stream.write(f"{method_name},{latency:.9f}\n")
+
+    # ストリーム出力の終了
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def get_call_count(self):
+        return self.call_count
+
+    def get_call_count_by_method(self):
+        return dict(self._call_count_by_method)
+
+    def get_total_seconds_by_method(self):
+        return dict(self._total_seconds_by_method)
+
+    def get_histogram(self, method_name:str):
+        return list(self._histogram_by_method.get(method_name, []))
+
+    # ヒストグラムから分位点（バケットの上限値）を求める
+    def get_latency_quantile(self, method_name:str, quantile:float):
+        histogram = self._histogram_by_method.get(method_name)
+        if not histogram:
+            return None
+        threshold = quantile * sum(histogram)
+        cumulative_count = 0
+        for bucket_index, count in enumerate(histogram):
+            cumulative_count += count
+            if cumulative_count >= threshold:
+                if bucket_index < len(LATENCY_BUCKET_UPPER_BOUNDS):
+                    return LATENCY_BUCKET_UPPER_BOUNDS[bucket_index]
+                return float("inf")
+        return float("inf")
+
+    # 合計時間の長い順に並べた集計結果
+    def get_report_rows(self):
+        rows = []
+        for method_name, call_count in self._call_count_by_method.items():
+            total_seconds = self._total_seconds_by_method[method_name]
+            rows.append({
+                            "method": method_name,
+                            "calls": call_count,
+                            "total_seconds": total_seconds,
+                            "mean_seconds": total_seconds / call_count,
+                            "p50_seconds": self.get_latency_quantile(method_name, 0.5),
+                            "p99_seconds": self.get_latency_quantile(method_name, 0.99),
+                            "histogram": list(self._histogram_by_method[method_name]),
+                            })
+        rows.sort(key=lambda row: row["total_seconds"], reverse=True)
+        return rows
+
+    # シミュレーション終了時に表示する集計結果
+    def format_report(self, method_num:int=DEFAULT_REPORT_METHOD_NUM):
+        rows = self.get_report_rows()
+        total_seconds = sum(row["total_seconds"] for row in rows)
+        lines = [
+                    "===== TraCI Call Summary =====",
+                    f"total calls: {self.call_count}, total time: {total_seconds:.3f} s, methods: {len(rows)}",
+                    f"{'method':40s} {'calls':>10s} {'total[s]':>10s} {'mean[us]':>10s} {'p50[us]':>10s} {'p99[us]':>10s}",
+                    ]
+        for row in rows[:method_num]:
+            lines.append(
+                            f"{row['method']:40s} {row['calls']:10d} {row['total_seconds']:10.3f} "
+                            f"{row['mean_seconds'] * 1e6:10.1f} {_format_us(row['p50_seconds'])} {_format_us(row['p99_seconds'])}"
+                            )
+        if len(rows) > method_num:
+            lines.append(f"... 他 {len(rows) - method_num} 件")
+        return "\n".join(lines)
+
+    # 集計結果をJSONで出力
+    def dump_json(self, file_path:str):
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(
+                        {
+                            "latency_bucket_upper_bounds": list(LATENCY_BUCKET_UPPER_BOUNDS),
+                            "total_calls": self.call_count,
+                            "methods": [
+                                        {key: (None if value == float("inf") else value) for key, value in row.items()}
+                                        for row in self.get_report_rows()
+                                        ],
+                            },
+                        f,
+                        ensure_ascii=False
+                        )
+
+def _format_us(seconds:float):
+    if seconds is None:
+        return f"{'-':>10s}"
+    if seconds == float("inf"):
+        return f"{'>' + str(int(LATENCY_BUCKET_UPPER_BOUNDS[-1] * 1e6)):>10s}"
+    return f"{seconds * 1e6:10.1f}"
@@ -0,0 +1,79 @@
+# =========================
+# Third-party libraries
+# =========================
+import numpy as np
+
+# =========================
+# Local / intra-package
+# =========================
+from .agents.VehicleInfo import VehicleInfo
+
+# 未取得の車両の取得時刻
+UNINFORMED_TIME = np.inf
+
+# 近傍グラフ上で、取得時刻の早い情報を隣接する車両へ広げる（一番古い情報を優先する）
+# informed_times: 車両ごとの取得時刻（未取得は UNINFORMED_TIME）　i_index, j_index: 通信できる車両の組（向きなし）
+# max_hops: 1回の呼び出しで広げる段数（None の場合は広がらなくなるまで＝連結成分ごとに最も早い情報に揃える）
+# 返り値: (新しい取得時刻の配列, 情報の出どころの車両の添字の配列)　取得時刻が同じ場合は添字の小さい車両の情報を採る
+def expand_earliest_times(informed_times, i_index, j_index, max_hops:int=None):
+    informed_times = np.asarray(informed_times, dtype=float)
+    i_index = np.asarray(i_index, dtype=np.int64)
+    j_index = np.asarray(j_index, dtype=np.int64)
+    vehicle_num = len(informed_times)
+    # (取得時刻, 添字) の順位で比較し、出どころも一緒に求める
+    order = np.lexsort((np.arange(vehicle_num), informed_times))
+    ranks = np.empty(vehicle_num, dtype=np.int64)
+    ranks[order] = np.arange(vehicle_num)
+    uninformed_rank = vehicle_num
+    ranks[np.isinf(informed_times)] = uninformed_rank
+
+    # 向きありの辺に展開し、情報を持つ車両から出る辺だけを前線として扱う
+    from_index = np.concatenate([i_index, j_index])
+    to_index = np.concatenate([j_index, i_index])
+    frontier_mask = ranks < uninformed_rank
+    hop = 0
+    while frontier_mask.any() and (max_hops is None or hop < max_hops):
+        edge_mask = frontier_mask[from_index]
+        if not edge_mask.any():
+            break
+        edge_from = from_index[edge_mask]
+        edge_to = to_index[edge_mask]
+        previous_ranks = ranks.copy()
+        np.minimum.at(ranks, edge_to, previous_ranks[edge_from])
+        frontier_mask = ranks < previous_ranks
+        hop += 1
+
+    source_index = np.where(ranks < uninformed_rank, order[np.minimum(ranks, vehicle_num - 1)], np.arange(vehicle_num))
+    new_informed_times = np.where(ranks < uninformed_rank, informed_times[source_index], UNINFORMED_TIME)
+    return new_informed_times, source_index
+
+class TsunamiBroadcast():
+    '''
+    津波前兆情報の V2V による伝播
+    通信する車両の組（近傍グラフ）と車両ごとの取得時刻の配列から、expand_earliest_times でまとめて伝播先を求める
+    伝播した車両には出どころの車両の KnowledgeRecord をそのまま渡す（v2v_communication_about_tsunami_info と同じ規則）
+        - 片方だけが情報を持つ場合は、持たない側へ渡す
+        - 両方が持つ場合は、取得時刻の早い方に揃える
+    1回の通信で広げるのは既定で隣接する車両まで（max_hops=1）　None の場合は連結成分全体に一度に広げる
+    '''
+    def __init__(self, max_hops:int=1):
+        self._max_hops = max_hops
+
+    # vehInfos: 近傍グラフの添字順の VehicleInfo　情報が更新された車両の VehicleInfo のリストを返す
+    def propagate(self, vehInfos:list, i_index, j_index):
+        if len(vehInfos) == 0 or len(i_index) == 0:
+            return []
+        informed_times = np.array([_get_informed_time(vehInfo) for vehInfo in vehInfos], dtype=float)
+        new_informed_times, source_index = expand_earliest_times(informed_times, i_index, j_index, max_hops=self._max_hops)
+        updated_vehInfos = []
+        for index in np.flatnonzero(new_informed_times != informed_times).tolist():
+            vehInfo:VehicleInfo = vehInfos[index]
+            vehInfo.set_tsunami_precursor_record(vehInfos[int(source_index[index])].get_tsunami_precursor_record())
+            updated_vehInfos.append(vehInfo)
+        return updated_vehInfos
+
+# 先頭の津波前兆情報の取得時刻（v2v_communication_about_tsunami_info と同じく先頭の値で判定する）
+def _get_informed_time(vehInfo:VehicleInfo):
+    for tsunami_precursor_flag, time_stamp in vehInfo.get_tsunami_precursor_info().values():
+        return time_stamp if tsunami_precursor_flag else UNINFORMED_TIME
+    return UNINFORMED_TIME
@@ -1,7 +1,6 @@
 # =========================
 # Standard library
 # =========================
-import copy
 import json
 import math
 import os
@@ -19,12 +18,11 @@ if "SUMO_HOME" in os.environ:
     sys.path.append(os.path.join(os.environ["SUMO_HOME"], "tools"))
 
 from sumolib import checkBinary  # noqa: E402
-import traci  # noqa: E402
+from .sumo_backend import traci  # noqa: E402
 
 # =========================
 # Third-party libraries
 # =========================
-import matplotlib.pyplot as plt
 import numpy as np
 from numpy import double
 
@@ -32,9 +30,19 @@ from numpy import double
 # Local / intra-package
 # =========================
 from .agents.Agent import Agent
+from .agents.AgentPopulation import AgentPopulation
 from .agents.CustomeEdge import CustomeEdge, ConnectedEdges
+from .agents.MotivationCurve import MotivationCurve
+from .agents.Registry import Registry, AgentRegistry, VehicleInfoRegistry, EdgeRegistry, ShelterRegistry
 from .agents.Shelter import Shelter
 from .agents.VehicleInfo import VehicleInfo
+from .density_field import density_field
+from .route_registry import route_registry
+from .route_table import RouteTable
+from .spatial_index import SpatialGrid
+from .speed_command_buffer import speed_command_buffer
+from .step_snapshot import snapshot
+from .tsunami_broadcast import TsunamiBroadcast
 
 # =========================
 # Runtime config
@@ -47,6 +55,8 @@ VEHICLE_SHELTER_DURATION_TIME = 10000
 
 # CustomEdgeリストから特定のedgeIDを持つCustomEdgeを取得
 def get_custom_edge_by_edgeID(edgeID:str, custome_edge_list:list):
+    if isinstance(custome_edge_list, Registry):
+        return custome_edge_list.find(edgeID)
     for custom_edge in custome_edge_list:
         if custom_edge.get_current_edgeID() == edgeID:
             return custom_edge
@@ -66,7 +76,7 @@ def get_edgeIDs_without_junction(customeEdge:CustomeEdge):
 # 車両IDを元に、周辺edgeIDを取得
 def get_around_edgeIDs(target_vehID:str, custome_edge_list:list):
     # 車両がいるedgeIDを取得
-    current_edgeID = traci.vehicle.getRoadID(target_vehID)
+    current_edgeID = snapshot.get_road_ID(target_vehID)
     # 車両がいるedgeIDをもとに、周辺のedgeIDを取得する
     current_edge:CustomeEdge = get_custom_edge_by_edgeID(current_edgeID, custome_edge_list)
     around_edgeIDs_with_junction = remove_junction_from_edgeID(current_edge.around_edgeIDs())
@@ -82,6 +92,69 @@ def get_around_vehIDs(target_vehID:str, custome_edge_list:list):
         around_vehIDs.extend(tmp_vehIDs)
     return around_vehIDs
 
+# グリッド索引で求めた通信可能範囲内の組を、get_around_vehIDs と同じ候補（周辺edge上の車両）に絞る
+# 周辺edge上の車両は edge ごとに1回だけ traci.edge.getLastStepVehicleIDs で取得する（駐車中の車両は含まれない）
+# 車両IDごとのリストは get_around_vehIDs と同じく周辺edgeの順に並べる（交換の結果は順序に依存する）
+def group_neighbour_vehIDs_on_around_edges(vehIDs:list, i_index, j_index, custome_edge_list:list):
+    in_range_vehIDs_by_vehID = {vehID: set() for vehID in vehIDs}
+    for i, j in zip(i_index.tolist(), j_index.tolist()):
+        in_range_vehIDs_by_vehID[vehIDs[i]].add(vehIDs[j])
+        in_range_vehIDs_by_vehID[vehIDs[j]].add(vehIDs[i])
+    around_edgeIDs_by_edgeID:dict = {}
+    vehIDs_by_edgeID:dict = {}
+    neighbour_vehIDs_by_vehID:dict = {}
+    for vehID in vehIDs:
+        in_range_vehIDs = in_range_vehIDs_by_vehID[vehID]
+        if not in_range_vehIDs:
+            neighbour_vehIDs_by_vehID[vehID] = []
+            continue
+        current_edgeID = snapshot.get_road_ID(vehID)
+        around_edgeIDs = around_edgeIDs_by_edgeID.get(current_edgeID)
+        if around_edgeIDs is None:
+            around_edgeIDs = get_around_edgeIDs(vehID, custome_edge_list)
+            around_edgeIDs_by_edgeID[current_edgeID] = around_edgeIDs
+        neighbour_vehIDs = []
+        for around_edgeID in around_edgeIDs:
+            around_vehIDs = vehIDs_by_edgeID.get(around_edgeID)
+            if around_vehIDs is None:
+                around_vehIDs = traci.edge.getLastStepVehicleIDs(around_edgeID)
+                vehIDs_by_edgeID[around_edgeID] = around_vehIDs
+            neighbour_vehIDs.extend(around_vehID for around_vehID in around_vehIDs if around_vehID in in_range_vehIDs)
+        neighbour_vehIDs_by_vehID[vehID] = neighbour_vehIDs
+    return neighbour_vehIDs_by_vehID
+
+# 車両位置のグリッド索引から、通信可能範囲内の車両IDリストを車両IDごとに取得
+# v2v_communication / v2v_communication_about_tsunami_info の around_vehIDs に渡す
+def get_neighbour_vehIDs_by_vehID(vehIDs:list, COMMUNICATION_RANGE:float, custome_edge_list:list):
+    spatial_grid = SpatialGrid(cell_size=COMMUNICATION_RANGE)
+    spatial_grid.build(vehIDs, [snapshot.get_position(vehID) for vehID in vehIDs])
+    i_index, j_index = spatial_grid.query_pairs(radius=COMMUNICATION_RANGE)
+    return group_neighbour_vehIDs_on_around_edges(vehIDs, i_index, j_index, custome_edge_list)
+
+# get_neighbour_vehIDs_by_vehID と同じ結果に加えて、通信する車両の組（vehIDs の添字の配列）も返す
+# 組はどちらか一方の車両の around_vehIDs に相手が含まれるもののみ
+def get_neighbour_pairs(vehIDs:list, COMMUNICATION_RANGE:float, custome_edge_list:list):
+    spatial_grid = SpatialGrid(cell_size=COMMUNICATION_RANGE)
+    spatial_grid.build(vehIDs, [snapshot.get_position(vehID) for vehID in vehIDs])
+    i_index, j_index = spatial_grid.query_pairs(radius=COMMUNICATION_RANGE)
+    neighbour_vehIDs_by_vehID = group_neighbour_vehIDs_on_around_edges(vehIDs, i_index, j_index, custome_edge_list)
+    neighbour_sets_by_vehID = {vehID: set(neighbour_vehIDs) for vehID, neighbour_vehIDs in neighbour_vehIDs_by_vehID.items()}
+    pair_mask = np.fromiter(
+                            (vehIDs[j] in neighbour_sets_by_vehID[vehIDs[i]] or vehIDs[i] in neighbour_sets_by_vehID[vehIDs[j]]
+                             for i, j in zip(i_index.tolist(), j_index.tolist())),
+                            dtype=bool, count=len(i_index)
+                            )
+    return i_index[pair_mask], j_index[pair_mask], neighbour_vehIDs_by_vehID
+
+# 津波前兆情報を近傍グラフ上でまとめて伝播する（v2v_communication_about_tsunami_info を全車両について行う代わり）
+# excluded_vehIDs 同士の組（到着済みの車両どうし）は通信しない　更新された車両IDのリストを返す
+def broadcast_tsunami_precursor_info(tsunami_broadcast:TsunamiBroadcast, vehIDs:list, i_index, j_index, vehInfo_list:list, excluded_vehIDs:set):
+    excluded_mask = np.fromiter((vehID in excluded_vehIDs for vehID in vehIDs), dtype=bool, count=len(vehIDs))
+    active_pair_mask = ~(excluded_mask[i_index] & excluded_mask[j_index])
+    vehInfos = [find_vehInfo_by_vehID(vehID, vehInfo_list) for vehID in vehIDs]
+    updated_vehInfos = tsunami_broadcast.propagate(vehInfos, i_index[active_pair_mask], j_index[active_pair_mask])
+    return [vehInfo.get_vehID() for vehInfo in updated_vehInfos]
+
 def get_vehicle_start_edges(custome_edge_list: list[CustomeEdge]) -> list[CustomeEdge]:
     """開始エッジ(CustomEdge)だけを抽出して返す"""
     vehicle_start_edges: list[CustomeEdge] = []
@@ -109,10 +182,15 @@ def get_vehicle_end_list_by_start_edge_dict(vehicle_start_edges: list[CustomeEdg
         vehicle_end_list_by_start_edge_dict[start_edge.get_current_edgeID()] = tmp_list
     return vehicle_end_list_by_start_edge_dict
 
-def get_nearest_end_edgeID_by_start_edgeID(vehicle_end_list_by_start_edge_dict:dict):
+# route_table を渡した場合は、距離を traci.lane.getShape ではなく経路表の距離行列から取得する
+def get_nearest_end_edgeID_by_start_edgeID(vehicle_end_list_by_start_edge_dict:dict, route_table:RouteTable=None):
     print(f'vehicle_end_list_by_start_edge_dict: {vehicle_end_list_by_start_edge_dict}')
     nearest_end_edgeID_by_start_edgeID_dict:dict = {}
     for vehicle_start_edgeID, vehicle_end_edgeID_list in vehicle_end_list_by_start_edge_dict.items():
+        if route_table is not None:
+            distances = route_table.get_distances([vehicle_start_edgeID] * len(vehicle_end_edgeID_list), vehicle_end_edgeID_list)
+            nearest_end_edgeID_by_start_edgeID_dict[vehicle_start_edgeID] = [vehicle_end_edgeID_list[index] for index in np.argsort(distances, kind="stable")]
+            continue
             start_edge_shape = traci.lane.getShape("{}_0".format(vehicle_start_edgeID))
             start_edge_center = ((start_edge_shape[0][0] + start_edge_shape[1][0])/2, (start_edge_shape[0][1] + start_edge_shape[1][1])/2)
             disatnce_by_start_edge_ID:dict = {}
@@ -167,12 +245,12 @@ def get_prev_edge(edgeIDs: tuple, current_edgeID: str):
 
 def generate_new_veh_based_on_route_time(target_vehID:str, NEW_VEHICLE_COUNT:int, agent_list:list, vehInfo_list:list, \
                     vehInfo_by_target_vehID:VehicleInfo, agent_by_target_vehID:Agent, 
-                    from_edgeID:str, new_shelterID:str, to_edgeID:str):
+                    from_edgeID:str, new_shelterID:str, to_edgeID:str, agent_population:AgentPopulation=None):
     if from_edgeID == "" and new_shelterID == "" and to_edgeID == "":
         # print(f"避難経路が存在しません")
         return NEW_VEHICLE_COUNT
     # 現在のエッジIDを取得
-    current_edgeID = traci.vehicle.getRoadID(target_vehID)
+    current_edgeID = snapshot.get_road_ID(target_vehID)
     opposite_edgeID = get_opposie_edgeID_by_edgeID(current_edgeID)
     if current_edgeID == opposite_edgeID:
         return NEW_VEHICLE_COUNT
@@ -192,7 +270,7 @@ def generate_new_veh_based_on_route_time(target_vehID:str, NEW_VEHICLE_COUNT:int
     vehID_num = target_vehID.split("_")[3]
     # 新しい車両IDを生成と出発時間を設定
     new_veh_ID:str = "{}_{}_{}_{}".format("newveh", new_shelterID, vehID_num, NEW_VEHICLE_COUNT)
-    deparet_time:double = traci.simulation.getTime()
+    deparet_time:double = snapshot.get_time()
     # 現在のagentを無効にする
     agent_by_target_vehID.set_shelter_changed_flg(True)
     # 候補地を更新
@@ -200,12 +278,16 @@ def generate_new_veh_based_on_route_time(target_vehID:str, NEW_VEHICLE_COUNT:int
     updated_candidate_shelter = agent_by_target_vehID.get_candidate_shelter()
     # 元のvehIDを削除 新しい車両IDを追加
     # Agentを新規に作成する
-    agent:Agent = Agent(vehID=new_veh_ID, 
+    agent_kwargs:dict = dict(vehID=new_veh_ID, 
                         target_shelter=new_shelterID, 
-                        tunning_threshold=copy.deepcopy(agent_by_target_vehID.get_tunning_threshold()), 
-                        route_change_threshold=copy.deepcopy(agent_by_target_vehID.get_route_change_threshold())
+                        tunning_threshold=agent_by_target_vehID.get_tunning_threshold(), 
+                        route_change_threshold=agent_by_target_vehID.get_route_change_threshold()
                         )
-    agent.set_near_edgeID_by_target_shelter(copy.deepcopy(agent_by_target_vehID.get_near_edgeID_by_target_shelter()))
+    if agent_population is None:
+        agent:Agent = Agent(**agent_kwargs)
+    else:
+        agent:Agent = agent_population.create_agent(**agent_kwargs)
+    agent.set_near_edgeID_by_target_shelter(agent_by_target_vehID.get_near_edgeID_by_target_shelter())
     agent.set_candidate_edge_by_shelterID(updated_candidate_shelter)
     agent.init_set_candidate_near_shelter(shelter_edge_by_IDs=updated_candidate_shelter)
     
@@ -216,22 +298,24 @@ def generate_new_veh_based_on_route_time(target_vehID:str, NEW_VEHICLE_COUNT:int
                                                       target_shelter=new_shelterID, 
                                                       edgeID_connect_target_shelter=to_edgeID, 
                                                       create_time=deparet_time)
-    new_vehInfo_by_target_vehID.set_shelter_congestion_info(copy.deepcopy(vehInfo_by_target_vehID.get_shelter_congestion_info()))
-    new_vehInfo_by_target_vehID.set_avg_evac_time_by_route_by_recive_time(copy.deepcopy(vehInfo_by_target_vehID.get_avg_evac_time_by_route_by_recive_time()))
+    # 知識は不変な版（KnowledgeRecord）をそのまま引き継ぐ
+    new_vehInfo_by_target_vehID.inherit_knowledge(vehInfo_by_target_vehID, tsunami_precursor=False)
     vehInfo_list.append(new_vehInfo_by_target_vehID)
     # !# agentが変更したので、フラグを立てる
     vehInfo_by_target_vehID.set_agent_changed_flag(True)
 
     # edge上の始点からどこにいるのかを取得する
-    edge_position = traci.vehicle.getLanePosition(target_vehID)
-    current_laneID = traci.vehicle.getLaneID(target_vehID)
+    edge_position = snapshot.get_lane_position(target_vehID)
+    current_laneID = snapshot.get_lane_ID(target_vehID)
     if traci.lane.getLength(current_laneID) > 100:
         depart_position = 200 - edge_position
     if traci.lane.getLength(current_laneID) <= 100:
         depart_position = 100 - edge_position
+    snapshot.invalidate(target_vehID)
+    forget_speed_command(target_vehID)
     traci.vehicle.remove(target_vehID)
     new_route_ID:str = "{}_{}_{}".format("newroute", new_shelterID, NEW_VEHICLE_COUNT)
-    traci.route.add(routeID=new_route_ID, edges=via_edgeIDs_with_intial_end_edge)
+    route_registry.add(routeID=new_route_ID, edges=via_edgeIDs_with_intial_end_edge)
     traci.vehicle.add(vehID=new_veh_ID, routeID=new_route_ID, depart=deparet_time, departPos=depart_position)
     traci.vehicle.setParkingAreaStop(vehID=new_veh_ID, stopID=new_shelterID, duration=100000)
     # traci.vehicle.setColor(new_veh_ID, (128, 249, 255, 255))
@@ -249,17 +333,19 @@ def generate_new_veh(
     shelter_list: list,
     connected_edges_list: list,
     LATE_AGENT_THRESHOLD_LIST: list,
-    lane_change_mode: int
+    lane_change_mode: int,
+    agent_population: AgentPopulation = None
     ):
     """
     既存車両 target_vehID を基点に、候補避難地のうち新たな避難地へ向かう
     新規車両を生成して置き換える。
+    agent_population を渡した場合は、新しい Agent を AgentPopulation の AgentView として作成する。
 
     返り値:
         NEW_VEHICLE_COUNT (int): インクリメント後の生成カウンタ
     """
     # === 現在位置と対向情報の取得 ===
-    current_edgeID = traci.vehicle.getRoadID(target_vehID)
+    current_edgeID = snapshot.get_road_ID(target_vehID)
     opposite_edgeID = get_opposie_edgeID_by_edgeID(current_edgeID)  # 既存関数そのまま
 
     # 同一路線判定（対向が同じなら生成不要）
@@ -292,7 +378,7 @@ def generate_new_veh(
     # === 新車両ID・時刻などの準備 ===
     vehID_num = target_vehID.split("_")[3]  # 既存仕様：ID末尾のナンバを継承
     new_veh_ID: str = "{}_{}_{}_{}".format("newveh", new_shelterID, vehID_num, NEW_VEHICLE_COUNT)
-    deparet_time: double = traci.simulation.getTime()  # 既存の変数名を維持（typo含む）
+    deparet_time: double = snapshot.get_time()  # 既存の変数名を維持（typo含む）
 
     # === 既存Agentの状態更新 & 新Agent生成 ===
     agent_by_target_vehID.set_shelter_changed_flg(True)  # 現在のagentを無効化
@@ -300,28 +386,30 @@ def generate_new_veh(
     # TODO: 満杯情報を受け取った後は、当該避難地を候補から削除するロジックを入れる
     updated_candidate_shelter = agent_by_target_vehID.get_candidate_shelter()
 
-    agent: Agent = Agent(
+    agent_kwargs: dict = dict(
                             vehID=new_veh_ID,
                             target_shelter=new_shelterID,
-                            tunning_threshold=copy.deepcopy(agent_by_target_vehID.get_tunning_threshold()),
-                            route_change_threshold=copy.deepcopy(agent_by_target_vehID.get_route_change_threshold()),
-                            lane_change_init_threshold=copy.deepcopy(agent_by_target_vehID.get_lane_change_decision_threshold()),
-                            normalcy_motivation_increase=copy.deepcopy(agent_by_target_vehID.get_motivation_increase_from_info_receive()),
-                            motivation_decrease_due_to_inactive_neighbors=copy.deepcopy(agent_by_target_vehID.get_motivation_decrease_due_to_inactive_neighbors()),
-                            motivation_increase_due_to_following_neighbors=copy.deepcopy(agent_by_target_vehID.get_motivation_increase_due_to_following_neighbors()),
-                            lane_minimum_motivation_value=copy.deepcopy(agent_by_target_vehID.get_minimum_motivation_value())
+                            tunning_threshold=agent_by_target_vehID.get_tunning_threshold(),
+                            route_change_threshold=agent_by_target_vehID.get_route_change_threshold(),
+                            lane_change_init_threshold=agent_by_target_vehID.get_lane_change_decision_threshold(),
+                            normalcy_motivation_increase=agent_by_target_vehID.get_motivation_increase_from_info_receive(),
+                            motivation_decrease_due_to_inactive_neighbors=agent_by_target_vehID.get_motivation_decrease_due_to_inactive_neighbors(),
+                            motivation_increase_due_to_following_neighbors=agent_by_target_vehID.get_motivation_increase_due_to_following_neighbors(),
+                            lane_minimum_motivation_value=agent_by_target_vehID.get_minimum_motivation_value()
                             )
-    agent.set_near_edgeID_by_target_shelter(copy.deepcopy(agent_by_target_vehID.get_near_edgeID_by_target_shelter()))
+    if agent_population is None:
+        agent: Agent = Agent(**agent_kwargs)
+    else:
+        agent: Agent = agent_population.create_agent(**agent_kwargs)
+    agent.set_near_edgeID_by_target_shelter(agent_by_target_vehID.get_near_edgeID_by_target_shelter())
     agent.set_candidate_edge_by_shelterID(updated_candidate_shelter)
     agent.init_set_candidate_near_shelter(shelter_edge_by_IDs=updated_candidate_shelter)
 
-    agent.set_x_elapsed_time_for_lane_change_list(copy.deepcopy(agent_by_target_vehID.get_x_elapsed_time_for_lane_change_list()))
-    agent.set_y_motivation_value_for_lane_change_list(copy.deepcopy(agent_by_target_vehID.get_y_motivation_value_for_lane_change_list()))
-    agent.set_lane_change_xy_dict(copy.deepcopy(agent_by_target_vehID.get_lane_change_xy_dict()))
+    agent.set_motivation_curve(agent_by_target_vehID.get_motivation_curve().copy())
 
-    agent.set_motivation_decrease_due_to_inactive_neighbors(copy.deepcopy(agent_by_target_vehID.get_motivation_decrease_due_to_inactive_neighbors()))
-    agent.set_motivation_increase_due_to_following_neighbors(copy.deepcopy(agent_by_target_vehID.get_motivation_increase_due_to_following_neighbors()))
-    agent.set_calculated_motivation_value(copy.deepcopy(agent_by_target_vehID.get_calculated_motivation_value()))
+    agent.set_motivation_decrease_due_to_inactive_neighbors(agent_by_target_vehID.get_motivation_decrease_due_to_inactive_neighbors())
+    agent.set_motivation_increase_due_to_following_neighbors(agent_by_target_vehID.get_motivation_increase_due_to_following_neighbors())
+    agent.set_calculated_motivation_value(agent_by_target_vehID.get_calculated_motivation_value())
     agent_list.append(agent)
 
     # === VehicleInfo を継承して新規作成 ===
@@ -331,21 +419,14 @@ def generate_new_veh(
         edgeID_connect_target_shelter=to_edgeID,
         create_time=deparet_time
     )
-    new_vehInfo_by_target_vehID.set_shelter_congestion_info(
-        copy.deepcopy(vehInfo_by_target_vehID.get_shelter_congestion_info())
-    )
-    new_vehInfo_by_target_vehID.set_avg_evac_time_by_route_by_recive_time(
-        copy.deepcopy(vehInfo_by_target_vehID.get_avg_evac_time_by_route_by_recive_time())
-    )
-    new_vehInfo_by_target_vehID.set_tsunami_precursor_info(
-        copy.deepcopy(vehInfo_by_target_vehID.get_tsunami_precursor_info())
-    )
+    # 知識は不変な版（KnowledgeRecord）をそのまま引き継ぐ
+    new_vehInfo_by_target_vehID.inherit_knowledge(vehInfo_by_target_vehID)
 
     vehInfo_list.append(new_vehInfo_by_target_vehID)
 
     # === 置換のための出発位置計算 ===
-    edge_position = traci.vehicle.getLanePosition(target_vehID)
-    current_laneID = traci.vehicle.getLaneID(target_vehID)
+    edge_position = snapshot.get_lane_position(target_vehID)
+    current_laneID = snapshot.get_lane_ID(target_vehID)
     current_lane_len = traci.lane.getLength(current_laneID)
 
     if current_lane_len > 100:
@@ -354,10 +435,13 @@ def generate_new_veh(
         depart_position = 100 - edge_position
 
     # === 旧車両を削除し、新車両を追加 ===
+    snapshot.invalidate(target_vehID)
+    forget_speed_command(target_vehID)
     traci.vehicle.remove(target_vehID)
+    retire_vehID(target_vehID, agent_list=agent_list, vehInfo_list=vehInfo_list)
 
     new_route_ID: str = "{}_{}_{}".format("newroute", new_shelterID, NEW_VEHICLE_COUNT)
-    traci.route.add(routeID=new_route_ID, edges=via_edgeIDs_with_intial_end_edge)
+    route_registry.add(routeID=new_route_ID, edges=via_edgeIDs_with_intial_end_edge)
     traci.vehicle.add(
         vehID=new_veh_ID,
         routeID=new_route_ID,
@@ -385,13 +469,13 @@ def get_new_shelterID_and_near_edgeID_by_vehID(current_edgeID, opposite_edgeID,
     # 現在地から避難地までの距離・時間計算
     remaining_distance = distance_each_vehIDs(
                                                 one_veh_pos=shelter_for_vehInfo.get_position(),
-                                                other_veh_pos=traci.vehicle.getPosition(agent_by_target_vehID.get_vehID())
+                                                other_veh_pos=snapshot.get_position(agent_by_target_vehID.get_vehID())
                                                 )
 
-    veh_speed = traci.vehicle.getSpeed(agent_by_target_vehID.get_vehID()) or 1  # 0除算防止
+    veh_speed = snapshot.get_speed(agent_by_target_vehID.get_vehID()) or 1  # 0除算防止
     remaining_time = remaining_distance / veh_speed
     route_info_with_receive_time = vehInfo_by_target_vehID.get_avg_evac_time_by_route_by_recive_time()
-    current_route_edgeIDs = tuple(traci.vehicle.getRoute(agent_by_target_vehID.get_vehID()))
+    current_route_edgeIDs = tuple(snapshot.get_route(agent_by_target_vehID.get_vehID()))
     routes_dict = list(route_info_with_receive_time.values())[0]
     # 現在ルート以外で最も avg_time が短いルートを探す
     min_avg_time = float('inf')
@@ -413,7 +497,7 @@ def get_new_shelterID_and_near_edgeID_by_vehID(current_edgeID, opposite_edgeID,
 
     # current_avg_time = routes_dict[current_route_edgeIDs]['avg_time']
     reverse_route_time =  \
-        distance_each_vehIDs(one_veh_pos=traci.vehicle.getPosition(agent_by_target_vehID.get_vehID()), 
+        distance_each_vehIDs(one_veh_pos=snapshot.get_position(agent_by_target_vehID.get_vehID()), 
                             other_veh_pos=(100.0, 0.0)) / 8.0  # 交差点1まで戻る時間
     if remaining_time + agent_by_target_vehID.get_route_change_threshold() >  min_avg_time + reverse_route_time :
         from_edgeID = opposite_edgeID
@@ -429,6 +513,9 @@ def get_new_shelterID_and_near_edgeID_by_vehID_based_on_distance(current_edgeID,
     new_shelterID = ""; new_edgeID_near_shelter = ""; from_edgeID = ""
     min_distance = 10000000
 
+    # 候補（出発edgeID, 避難所ID, 避難所に接続するedgeID）を探索順に集め、距離が最小の候補を選ぶ（同じ距離の場合は先の候補）
+    candidate_from_edgeIDs = []; candidate_shelterIDs = []; candidate_near_edgeIDs = []
+
     # 2つの候補edgeから探す（現在地と逆方向）
     for edgeID in [current_edgeID, opposite_edgeID]:
         for shelterID, near_edgeID in agent_by_target_vehID.get_candidate_shelter().items():
@@ -436,12 +523,7 @@ def get_new_shelterID_and_near_edgeID_by_vehID_based_on_distance(current_edgeID,
             if shelterID != agent_by_target_vehID.get_target_shelter() and is_near_shelterID_on_opposite_edges(edgeID, near_edgeID):
                 try:
                     if is_route_exist(edgeID, near_edgeID, connected_edges_list):
-                        distance = calculate_distance_between_edgeIDs(edgeID, near_edgeID)
-                        if distance < min_distance:
-                            min_distance = distance
-                            new_shelterID = shelterID
-                            new_edgeID_near_shelter = near_edgeID
-                            from_edgeID = edgeID
+                        candidate_from_edgeIDs.append(edgeID); candidate_shelterIDs.append(shelterID); candidate_near_edgeIDs.append(near_edgeID)
                 except Exception as e:
                     print(f"[経路探索エラー] {edgeID} → {near_edgeID}, 理由: {e}")
             
@@ -459,16 +541,26 @@ def get_new_shelterID_and_near_edgeID_by_vehID_based_on_distance(current_edgeID,
                     if shelterID != agent_by_target_vehID.get_target_shelter() and not is_near_shelterID_on_opposite_edges(next_edgeID, near_edgeID):
                         try:
                             if is_route_exist(next_edgeID, near_edgeID, connected_edges_list):
-                                distance = calculate_distance_between_edgeIDs(next_edgeID, near_edgeID)
-
-                                if distance < min_distance:
-                                    min_distance = distance
-                                    new_shelterID = shelterID
-                                    new_edgeID_near_shelter = near_edgeID
-                                    from_edgeID = next_edgeID
+                                candidate_from_edgeIDs.append(next_edgeID); candidate_shelterIDs.append(shelterID); candidate_near_edgeIDs.append(near_edgeID)
                         except Exception as e:
                             print(f"[Junction経由の経路探索エラー] {next_edgeID} → {near_edgeID}, 理由: {e}")
 
+    if not candidate_from_edgeIDs:
+        return from_edgeID, new_shelterID, new_edgeID_near_shelter
+    # 経路表がある場合は距離行列から一括で取得する
+    if isinstance(connected_edges_list, RouteTable):
+        distances = connected_edges_list.get_distances(candidate_from_edgeIDs, candidate_near_edgeIDs)
+    else:
+        distances = np.asarray([
+                                calculate_distance_between_edgeIDs(candidate_from_edgeID, candidate_near_edgeID)
+                                for candidate_from_edgeID, candidate_near_edgeID in zip(candidate_from_edgeIDs, candidate_near_edgeIDs)
+                                ])
+    nearest_index = int(np.argmin(distances))
+    if distances[nearest_index] < min_distance:
+        from_edgeID = candidate_from_edgeIDs[nearest_index]
+        new_shelterID = candidate_shelterIDs[nearest_index]
+        new_edgeID_near_shelter = candidate_near_edgeIDs[nearest_index]
+
     return from_edgeID, new_shelterID, new_edgeID_near_shelter
 
 def generate_initial_vehIDs_for_row_xml(start_edge:str, end_edge:str, via_edges:str, \
@@ -503,7 +595,7 @@ def generate_init_vehID(from_edgeID:str, to_edgeID:str, shelterID:str, VEHICLE_F
         via_edgeIDs_with_intial_end_edge:list = list(traci.simulation.findRoute(from_edgeID, to_edgeID).edges)
         # ルートを設定する
         new_route_ID:str = "{}_{}_{}".format("initroute", shelterID, generate_route_count)
-        traci.route.add(routeID=new_route_ID, edges=via_edgeIDs_with_intial_end_edge)
+        route_registry.add(routeID=new_route_ID, edges=via_edgeIDs_with_intial_end_edge)
         #　新しい車両を生成
         traci.vehicle.add(vehID=new_veh_ID, routeID=new_route_ID, depart=deparet_time)
         # 新規の避難地を設定
@@ -531,7 +623,7 @@ def generate_simple_init_vehID(from_edgeID:str, to_edgeID:str, shelterID:str, \
     via_edgeIDs_with_intial_end_edge:list = list(traci.simulation.findRoute(from_edgeID, to_edgeID).edges)
     # ルートを設定する
     new_route_ID:str = "{}_{}_{}".format("initroute", shelterID, generate_route_count)
-    traci.route.add(routeID=new_route_ID, edges=via_edgeIDs_with_intial_end_edge)
+    route_registry.add(routeID=new_route_ID, edges=via_edgeIDs_with_intial_end_edge)
     #　新しい車両を生成
     traci.vehicle.add(vehID=new_veh_ID, routeID=new_route_ID, depart=depart_time)
     depart_time = depart_time + generate_interval
@@ -578,17 +670,29 @@ def clean_vehIDs_for_row_xml(file_path:str, START_WRITTEN_LINE:int, END_WRITTEN_
     with open(file_path, 'w') as file:
         file.writelines(lines_to_keep)
 
-def init_custom_edge() -> List["CustomeEdge"]:
-    custome_edge_list: List[CustomeEdge] = []
+def init_custom_edge() -> EdgeRegistry:
+    custome_edge_list: EdgeRegistry = EdgeRegistry()
     # 全てのedgeIDを取得する
     edgeIDs: list[str] = traci.edge.getIDList()
+    edgeID_set: set = set(edgeIDs)
+    # 交差点ごとの接続edgeは交差点ごとに1回だけ取得する
+    outgoing_edgeIDs_by_junction: dict = {}
+    incoming_edgeIDs_by_junction: dict = {}
+    for junctionID in traci.junction.getIDList():
+        outgoing_edgeIDs_by_junction[junctionID] = tuple(traci.junction.getOutgoingEdges(junctionID))
+        incoming_edgeIDs_by_junction[junctionID] = tuple(traci.junction.getIncomingEdges(junctionID))
     # edgeIDをもとにCustomEdgeを生成
     for edgeID in edgeIDs:
-        current_edgeIDs = [custom_edge.get_current_edgeID() for custom_edge in custome_edge_list]
-        if edgeID not in current_edgeIDs:
+        if custome_edge_list.find(edgeID) is None:
             custom_edge: CustomeEdge = CustomeEdge(edgeID)
-            custom_edge.setting_init_opposite_edgeID(edgeIDs=edgeIDs)
+            custom_edge.setting_init_opposite_edgeID(edgeIDs=edgeID_set)
             custom_edge.setting_init_start_end_junctions()
+            custom_edge.setting_init_neighbour_edgeIDs(
+                                                        outgoing_edgeIDs_by_junction=outgoing_edgeIDs_by_junction,
+                                                        incoming_edgeIDs_by_junction=incoming_edgeIDs_by_junction
+                                                        )
+            laneID = "{}_0".format(edgeID)
+            custom_edge.setting_init_lane_geometry(lane_shape=traci.lane.getShape(laneID), lane_length=traci.lane.getLength(laneID))
             custome_edge_list.append(custom_edge)
     return custome_edge_list
 
@@ -598,30 +702,37 @@ def init_shelter(shelterID:str, shelter_capacity_by_ID:dict, near_edgeID:str, sh
     return shelter_list
 
 def init_vehicleInfo_list(vehIDs: list, shelter_list: list):
-    vehInfo_list = []
+    vehInfo_list = VehicleInfoRegistry()
+    shelter_registry = shelter_list if isinstance(shelter_list, ShelterRegistry) else ShelterRegistry(shelter_list)
+    # 混雑情報の初期値の版は、このリストの車両の間でのみ共有する
+    shared_records:dict = {}
     for vehID in vehIDs:
         part_vehID = vehID.split("_")[1] + "_" + vehID.split("_")[2]
-        target_shelter = next((shelter for shelter in shelter_list if shelter.get_shelterID() == part_vehID), None)
+        target_shelter = shelter_registry.find(part_vehID)
         if target_shelter is None:
             continue  # 対応する避難所がない場合はスキップ
         vehicleInfo = VehicleInfo(
                             vehID=vehID,
                             target_shelter=target_shelter.get_shelterID(),
                             edgeID_connect_target_shelter=target_shelter.get_near_edgeID(),
-                            create_time=traci.simulation.getTime()
+                            create_time=snapshot.get_time()
                             )
-        [vehicleInfo.init_set_congestion_level_by_shelter(shelter.get_shelterID(), 0, traci.simulation.getTime()) for shelter in shelter_list]
+        [vehicleInfo.init_set_congestion_level_by_shelter(shelter.get_shelterID(), 0, snapshot.get_time(), shared_records=shared_records) for shelter in shelter_list]
         [vehicleInfo.init_set_avg_evac_time_by_route_by_recive_time()]
         [vehicleInfo.init_set_tsunami_precursor_info()]
         vehInfo_list.append(vehicleInfo)
     return vehInfo_list
 
-def init_agent_list(vehIDs:list, edgeID_by_shelterID:dict, EARLY_AGENT_THRESHOLD_LIST:list, LATE_AGENT_THRESHOLD_LIST:list, ATTR_RATE:double, MOTIVATION_DECREASE_FROM_INACTIVE_NEIGHBORS:float, MOTIVATION_INCREASE_FOLLOWING_NEIGHBORS:float):
-    agent_list = []
+# agent_population を渡した場合は、Agent の代わりに AgentPopulation の配列で属性を保持する AgentView を作成する
+def init_agent_list(vehIDs:list, edgeID_by_shelterID:dict, EARLY_AGENT_THRESHOLD_LIST:list, LATE_AGENT_THRESHOLD_LIST:list, ATTR_RATE:double, MOTIVATION_DECREASE_FROM_INACTIVE_NEIGHBORS:float, MOTIVATION_INCREASE_FOLLOWING_NEIGHBORS:float, agent_population:AgentPopulation=None):
+    agent_list = AgentRegistry()
+    if agent_population is not None:
+        # 初期の台数分の配列を先に確保する（再生成した車両の分は必要になったときに拡張する）
+        agent_population.reserve(len(agent_population) + len(vehIDs))
     for vehID in vehIDs:
         # せっかちな人はこっち
         if random_true(ATTR_RATE):
-            agent:Agent = Agent(
+            agent_kwargs:dict = dict(
                             vehID=vehID, 
                             target_shelter=vehID.split("_")[1] + "_" + vehID.split("_")[2], 
                             tunning_threshold=random.randint(EARLY_AGENT_THRESHOLD_LIST[0], EARLY_AGENT_THRESHOLD_LIST[1]), 
@@ -633,7 +744,7 @@ def init_agent_list(vehIDs:list, edgeID_by_shelterID:dict, EARLY_AGENT_THRESHOLD
                             lane_minimum_motivation_value=random.uniform(500, 700)
                             )
         else:
-            agent:Agent = Agent(
+            agent_kwargs:dict = dict(
                             vehID=vehID, 
                             target_shelter=vehID.split("_")[1] + "_" + vehID.split("_")[2], 
                             tunning_threshold=random.randint(LATE_AGENT_THRESHOLD_LIST[0], LATE_AGENT_THRESHOLD_LIST[1]), 
@@ -644,18 +755,16 @@ def init_agent_list(vehIDs:list, edgeID_by_shelterID:dict, EARLY_AGENT_THRESHOLD
                             motivation_increase_due_to_following_neighbors=MOTIVATION_INCREASE_FOLLOWING_NEIGHBORS,
                             lane_minimum_motivation_value=random.uniform(500, 700)
                             )
+        if agent_population is None:
+            agent:Agent = Agent(**agent_kwargs)
+        else:
+            agent:Agent = agent_population.create_agent(**agent_kwargs)
 
         agent.set_near_edgeID_by_target_shelter(edgeID_by_shelterID[vehID.split("_")[1] + "_" + vehID.split("_")[2]])
         agent.init_set_candidate_near_shelter(shelter_edge_by_IDs=edgeID_by_shelterID)
         agent.set_candidate_edge_by_shelterID(edgeID_by_shelterID)
-        # ここは必須
-        x_values = np.arange(0, 450, 1)
-        y_values = [float(two_stage_sigmoid(x)) for x in x_values]
-        agent.set_x_elapsed_time_for_lane_change_list(x_values.tolist())
-        agent.set_y_motivation_value_for_lane_change_list(y_values)
-        # ここまで必須
-        lane_change_xy_dict = dict(zip(x_values.tolist(), y_values))
-        agent.set_lane_change_xy_dict(lane_change_xy_dict)
+        # ここは必須　基底カーブは全エージェントで共有する
+        agent.set_motivation_curve(MotivationCurve(*get_motivation_base_curve()))
         agent_list.append(agent)
     return agent_list
 
@@ -663,29 +772,43 @@ def init_driver_behavior(vehIDs:list, lane_change_mode:int):
     for vehID in vehIDs:
         traci.vehicle.setLaneChangeMode(vehID, lane_change_mode)
 
-def init_connected_edges_list(custome_edge_list:list):
+# 経路は traci.simulation.findRoute を総当たりで呼び出さず、経路表（route_table.load_route_table）から取得する
+def init_connected_edges_list(custome_edge_list:list, route_table:RouteTable):
     connected_edges_list = []
     edgeIDs = [custome_edge.get_current_edgeID() for custome_edge in custome_edge_list]
     for one_edge in edgeIDs:
         for other_edge in edgeIDs:
             # 同一edgeはスキップ
             if not one_edge == other_edge and is_near_shelterID_on_opposite_edges(one_edge, other_edge) and not one_edge.startswith(":J") and not other_edge.startswith(":J"):
-                via_edges = list(traci.simulation.findRoute(one_edge, other_edge).edges)
+                via_edges = route_table.get_route_edgeIDs(one_edge, other_edge)
                 if(len(via_edges) > 0):
                     connected_edges_list.append((one_edge, other_edge, via_edges))
     return connected_edges_list  
 
 def find_agent_by_vehID(vehID:str, agent_list:list):
+    if isinstance(agent_list, Registry):
+        return agent_list.find(vehID)
     for agent in agent_list:
         if agent.get_vehID() == vehID:
             return agent
 
+# シミュレーションから消えた車両をレジストリの走行中索引から外す
+def retire_vehID(vehID:str, agent_list:list, vehInfo_list:list):
+    if isinstance(agent_list, Registry):
+        agent_list.retire(vehID)
+    if isinstance(vehInfo_list, Registry):
+        vehInfo_list.retire(vehID)
+
 def find_customedge_by_edgeID(edgeID:str, custome_edge_list: List[CustomeEdge]):
+    if isinstance(custome_edge_list, Registry):
+        return custome_edge_list.find(edgeID)
     for custome_edge in custome_edge_list:
         if custome_edge.get_current_edgeID() == edgeID:
             return custome_edge
 
 def find_shelter_by_edgeID_connect_target_shelter(edgeID:str, shelter_list:list):
+    if isinstance(shelter_list, ShelterRegistry):
+        return shelter_list.find_by_near_edgeID(edgeID)
     for shelter in shelter_list:
         if shelter.get_near_edgeID() == edgeID:
             return shelter
@@ -718,6 +841,8 @@ def find_shelterID_by_edgeID_by_shelterID(edgeID:str, edgeID_by_shelterID:dict):
     return None
 
 def find_vehInfo_by_vehID(vehID:str, vehInfo_list:list):
+    if isinstance(vehInfo_list, Registry):
+        return vehInfo_list.find(vehID)
     for vehInfo in vehInfo_list:
         if vehInfo.get_vehID() == vehID:
             return vehInfo
@@ -731,17 +856,17 @@ def find_alternative_route_better(current_edgeID: str, vehInfo:VehicleInfo, agen
                                                         )
 
     route_info_with_receive_time = vehInfo.get_avg_evac_time_by_route_by_recive_time()
-    current_route_edgeIDs = tuple(traci.vehicle.getRoute(agent.get_vehID()))
+    current_route_edgeIDs = tuple(snapshot.get_route(agent.get_vehID()))
     routes_dict = list(route_info_with_receive_time.values())[0]
 
     # 現在地から避難地までの距離・時間計算
     remaining_distance = distance_each_vehIDs(
                                                 one_veh_pos=shelter_for_vehInfo.get_position(),
-                                                other_veh_pos=traci.vehicle.getPosition(agent.get_vehID())
+                                                other_veh_pos=snapshot.get_position(agent.get_vehID())
                                                 )
     if remaining_distance < 50:
         return from_edgeID, to_edgeID, shelterID
-    veh_speed = traci.vehicle.getSpeed(agent.get_vehID()) or 1  # 0除算防止
+    veh_speed = snapshot.get_speed(agent.get_vehID()) or 1  # 0除算防止
     remaining_time: float = remaining_distance / veh_speed
 
     # 現在ルート以外で最も avg_time が短いルートを探す
@@ -783,7 +908,7 @@ def find_alternative_route_better(current_edgeID: str, vehInfo:VehicleInfo, agen
             if nearest_junctionID != "":
                 return from_edgeID, to_edgeID, shelterID
         nearest_junctionID_positon = traci.junction.getPosition(nearest_junctionID)
-        current_positon = traci.vehicle.getPosition(agent.get_vehID())
+        current_positon = snapshot.get_position(agent.get_vehID())
         distance_from_current_positon_to_nearest_junc = distance_each_vehIDs(one_veh_pos=current_positon, other_veh_pos=nearest_junctionID_positon)
         time_to_nearest_junc = distance_from_current_positon_to_nearest_junc / 8.0
 
@@ -802,7 +927,7 @@ def find_alternative_route_better(current_edgeID: str, vehInfo:VehicleInfo, agen
         # 候補となる経路に中間経路がない場合
         reverse_route_time =  \
             distance_each_vehIDs(
-                                    one_veh_pos=traci.vehicle.getPosition(agent.get_vehID()), 
+                                    one_veh_pos=snapshot.get_position(agent.get_vehID()), 
                                     other_veh_pos=(100.0, 0.0)
                                     ) / 8.0  # 交差点1まで戻る時間
         candidate_route_time: float = min_avg_time + reverse_route_time
@@ -844,6 +969,10 @@ def is_pre_edgeID_near_shelter(current_edgeID:str, edgeID_near_shelter:str, cust
             return True
         
 def is_route_exist(current_edgeID: str, near_edgeID: str, connected_edges_list: list):
+    if isinstance(connected_edges_list, RouteTable):
+        # all_edgeIDs.json（init_connected_edges_list）と同じく、反対方向のedge対のみを経路ありとする
+        return is_near_shelterID_on_opposite_edges(current_edgeID, near_edgeID) \
+            and connected_edges_list.is_route_exist(current_edgeID, near_edgeID)
     for connected_edges in connected_edges_list:
         if connected_edges.get_start_edgeID() == current_edgeID and connected_edges.get_end_edgeID() == near_edgeID:
             return True
@@ -874,7 +1003,7 @@ def is_vehIDs_changed_evaciation(target_vehID:str, vehInfo_list:list):
     if target_vehInfo.get_agent_changed_flag():
         return False
     try:
-        current_edge_ID = traci.vehicle.getRoadID(target_vehID)
+        current_edge_ID = snapshot.get_road_ID(target_vehID)
     except traci.TraCIException:
         print(f'Error in run: {e}')
         return False
@@ -894,7 +1023,7 @@ def is_vehIDs_changed_evaciation(target_vehID:str, vehInfo_list:list):
             if len(opposite_vehIDs) > 0:
                 for opposite_vehID in opposite_vehIDs:
                     if opposite_vehID != target_vehID:
-                        if distance_each_vehIDs(traci.vehicle.getPosition(target_vehID), traci.vehicle.getPosition(opposite_vehID)) < 10:
+                        if distance_each_vehIDs(snapshot.get_position(target_vehID), snapshot.get_position(opposite_vehID)) < 10:
                             return True
             return False
     except Exception as e:
@@ -906,7 +1035,7 @@ def is_vehIDs_another_lane(target_vehID:str, vehInfo_list:list, INSIGHT_RANGE:in
     if target_vehInfo.get_agent_changed_flag():
         return False
     try:
-        current_lane_ID = traci.vehicle.getLaneID(target_vehID)
+        current_lane_ID = snapshot.get_lane_ID(target_vehID)
     except traci.TraCIException:
         print(f'Error in run: {e}')
         return False
@@ -922,7 +1051,7 @@ def is_vehIDs_another_lane(target_vehID:str, vehInfo_list:list, INSIGHT_RANGE:in
 
             for another_lane_vehIDs in another_lane_vehIDs:
                 if another_lane_vehIDs != target_vehID:
-                    if distance_each_vehIDs(traci.vehicle.getPosition(target_vehID), traci.vehicle.getPosition(another_lane_vehIDs)) < float(INSIGHT_RANGE):
+                    if distance_each_vehIDs(snapshot.get_position(target_vehID), snapshot.get_position(another_lane_vehIDs)) < float(INSIGHT_RANGE):
                         return True
 
             return False
@@ -932,7 +1061,7 @@ def is_vehIDs_another_lane(target_vehID:str, vehInfo_list:list, INSIGHT_RANGE:in
 def is_vehIDs_changed_evaciation_with_random_true(target_vehID:str):
     # 反対車線にいる車両のうち、避難地を変更した車両がいるかを判定
     try:
-        current_edge_ID = traci.vehicle.getRoadID(target_vehID)
+        current_edge_ID = snapshot.get_road_ID(target_vehID)
     except traci.TraCIException:
         return False
     try:
@@ -945,7 +1074,7 @@ def is_vehIDs_changed_evaciation_with_random_true(target_vehID:str):
             opposite_vehIDs = traci.edge.getLastStepVehicleIDs(opposite_edgeID)
             if opposite_edgeID is not None and len(opposite_vehIDs) > 0:
                 for opposite_vehID in opposite_vehIDs:
-                    if distance_each_vehIDs(traci.vehicle.getPosition(target_vehID), traci.vehicle.getPosition(opposite_vehID)) < 5:
+                    if distance_each_vehIDs(snapshot.get_position(target_vehID), snapshot.get_position(opposite_vehID)) < 5:
                         # print(f'避難地を変更した車両がいる: {target_vehID} {opposite_vehID}')
                         if random_true(0.1):
                             return True
@@ -1094,32 +1223,14 @@ def choose_edge_by_probability(edgeID_list:list, probabilities:list) -> str:
 def get_local_density(vehID: str, radius: float = 100.0) -> float:
     """
     指定車両の周囲 radius[m] 内にいる車両数を数え、最大10台で正規化（10台で密度1.0）
+    現在の edge と、ルート上の前後の edge の車両を density_field から数える
     """
-    ego_pos = traci.vehicle.getPosition(vehID)
-    cur_edge = traci.vehicle.getRoadID(vehID)
-
-    nearby_vehIDs = list(traci.edge.getLastStepVehicleIDs(cur_edge))
-    prev_edge = get_prev_edge(edgeIDs=nearby_vehIDs, current_edgeID=cur_edge)
-    next_edge = get_next_edge(edgeIDs=nearby_vehIDs, current_edgeID=cur_edge)
-
-    if prev_edge is not None:
-        nearby_vehIDs += traci.edge.getLastStepVehicleIDs(prev_edge)
-    if next_edge is not None:
-        nearby_vehIDs += traci.edge.getLastStepVehicleIDs(next_edge)
-
-    nearby_vehIDs = list(set(nearby_vehIDs))
-    count = 0
-
-    for other_vehID in nearby_vehIDs:
-        if other_vehID == vehID:
-            continue
-        other_pos = traci.vehicle.getPosition(other_vehID)
-        dx = ego_pos[0] - other_pos[0]
-        dy = ego_pos[1] - other_pos[1]
-        distance = (dx * dx + dy * dy) ** 0.5
-        if distance <= radius:
-            count += 1
+    cur_edge = snapshot.get_road_ID(vehID)
+    route = snapshot.get_route(vehID)
+    prev_edge = get_prev_edge(edgeIDs=route, current_edgeID=cur_edge)
+    next_edge = get_next_edge(edgeIDs=route, current_edgeID=cur_edge)
 
+    count = density_field.count_neighbours(vehID, radius, prev_edgeID=prev_edge, next_edgeID=next_edge)
     return min(count / 10.0, 1.0)
 
 
@@ -1162,24 +1273,36 @@ def smooth_speed_command(vehID: str, v_des: float, alpha: float = 0.5) -> float:
     _prev_speed_cmd[vehID] = v_cmd
     return v_cmd
 
+# 前回速度の破棄　同じプロセスで次のシナリオを実行する前に呼び出す（車両IDが再利用されるため）
+def clear_speed_commands():
+    _prev_speed_cmd.clear()
+
+# 到着・削除した車両の前回速度と速度の指示の破棄
+def forget_speed_command(vehID: str):
+    _prev_speed_cmd.pop(vehID, None)
+    speed_command_buffer.forget(vehID)
+
 
 # --- メイン：ギャップ×密度の合成速度を適用 ---
 def apply_gap_density_speed_control(
         vehID: str,
-        local_density: float,
         v_free: float,
         v_min: float,
         gap_min: float,
         tau: float,
         alpha: float,
-        slow_time: float
+        slow_time: float,
+        local_density: float = None,
+        density_radius: float = 50.0
     ):
     """
     1. 前方車までのギャップから目標速度 v_gap を算出
-    2. 局所密度から係数を掛けて最終速度 v_des を決定
-    3. 平滑化して jerk を抑え、slowDown で適用
+    2. 局所密度から係数を掛けて最終速度 v_des を決定（local_density を省略した場合は density_radius[m] 内の密度を density_field から求める）
+    3. 平滑化して jerk を抑え、slowDown で適用（speed_command_buffer が有効な場合はステップの最後にまとめて適用）
     """
-    lead_info = traci.vehicle.getLeader(vehID)
+    if local_density is None:
+        local_density = get_local_density(vehID, radius=density_radius)
+    lead_info = snapshot.get_leader(vehID)
     gap = lead_info[1] if lead_info is not None else None
 
     v_gap = speed_from_gap(gap, v_free=v_free, v_min=v_min, gap_min=gap_min, tau=tau)
@@ -1187,19 +1310,19 @@ def apply_gap_density_speed_control(
     v_des = v_gap * coeff
     v_cmd = smooth_speed_command(vehID, v_des, alpha=alpha)
 
-    traci.vehicle.slowDown(vehID, v_cmd, max(0.1, slow_time))
+    speed_command_buffer.slow_down(vehID, v_cmd, max(0.1, slow_time))
 
 # レーン変更の意思決定箇所
 def lane_change_by_vehID(vehID: str, agent: Agent, vehInfo: VehicleInfo):
-    leader_info = traci.vehicle.getLeader(vehID)
-    speed = traci.vehicle.getSpeed(vehID)
+    leader_info = snapshot.get_leader(vehID)
+    speed = snapshot.get_speed(vehID)
 
     # 条件：
     # 前方に車両が存在し（leader_infoがNoneでない）
     # 距離が近い（例: 20m未満）
     # 自車速度が遅い（例: 5.0 m/s 未満）
     if (leader_info is not None and leader_info[1] < 20.0) and (speed < 7.0):
-        # print(f"vehID:{vehID}, spped:{traci.vehicle.getSpeed(vehID)}, leader_info:{leader_info}")
+        # print(f"vehID:{vehID}, spped:{snapshot.get_speed(vehID)}, leader_info:{leader_info}")
         try:
             # レーン変更（右 or 左 laneIndex は環境に合わせて調整）
             traci.vehicle.changeLane(vehID=vehID, laneIndex=1, duration=1000)
@@ -1210,12 +1333,12 @@ def lane_change_by_vehID(vehID: str, agent: Agent, vehInfo: VehicleInfo):
         # レーン変更後の設定
         init_driver_behavior(vehIDs=[vehID], lane_change_mode=512)
         traci.vehicle.setParkingAreaStop(vehID=vehID, stopID="ShelterA_2", duration=100000)
-        traci.vehicle.setSpeed(vehID, 9.0)
+        speed_command_buffer.set_speed(vehID, 9.0)
         vehInfo.set_target_shelter("ShelterA_2")
 
         # フラグと記録更新
         agent.set_evacuation_route_changed_flg(True)
-        elapsed = traci.simulation.getTime() - agent.get_created_time()
+        elapsed = snapshot.get_time() - agent.get_created_time()
         agent.set_lane_change_time(elapsed)
 
         # print(f"[LaneChange] vehID={vehID} | 距離={leader_info[1]:.1f}m | 速度={speed:.1f}m/s | 時刻={elapsed:.1f}s")
@@ -1263,26 +1386,6 @@ def distance_each_vehIDs(one_veh_pos: double, other_veh_pos: double) -> double:
 def random_true(probablity: double) -> bool:
     return random.random() < probablity
 
-def plot_cdf(cdf_dict, fulltime_by_ratio:dict):
-    """
-    CDF をプロットする
-    """
-    plt.figure(figsize=(8, 6))
-
-    for ratio, (times, cdf_values) in cdf_dict.items():
-        print(f'rate{str(round(ratio, 1)).replace(".", "")} = {times}')
-        print(f'rate{str(round(ratio, 1)).replace(".", "")}fulltime = {fulltime_by_ratio[ratio]}')
-        plt.plot(times, cdf_values, marker='.', linestyle='-', label=f"Ratio {ratio}")
-        # plt.vlines(fulltime_by_ratio[ratio], 0.0 ,1.0,  linestyles='dotted')
-
-    plt.xlabel("Arrival Time")
-    plt.ylabel("CDF")
-    plt.title("Cumulative Distribution Function (CDF) of Arrival Times")
-    plt.savefig('/Users/kashiisamutakeshi/vehicle-assistant-system/sumo/its102/result_graph.pdf')
-    plt.legend()
-    plt.grid()
-    plt.show()
-
 def merge_arrival_vehs_of_shelter(shelter_list: List[Shelter]):
     """
     shelterIDの先頭タイプ（例: "A_1" → "A"）が一致する避難所の
@@ -1302,8 +1405,8 @@ def merge_arrival_vehs_of_shelter(shelter_list: List[Shelter]):
 
 def is_vehID_in_congested_edge(vehID:str, THRESHOLD_SPEED):
     # 車両が通過するエッジが混雑しているか判定
-    current_edgeID = traci.vehicle.getRoadID(vehID)
-    edgeIDs_of_target_vehID = traci.route.getEdges(traci.vehicle.getRouteID(vehID))
+    current_edgeID = snapshot.get_road_ID(vehID)
+    edgeIDs_of_target_vehID = route_registry.get_edges(snapshot.get_route_ID(vehID))
     next_edge_of_current_edgeID = get_next_edge(edgeIDs=edgeIDs_of_target_vehID, current_edgeID=current_edgeID)
     prev_edge_of_current_edgeID = get_prev_edge(edgeIDs=edgeIDs_of_target_vehID, current_edgeID=current_edgeID)
     if next_edge_of_current_edgeID is None :
@@ -1320,7 +1423,7 @@ def is_vehID_in_congested_edge(vehID:str, THRESHOLD_SPEED):
     try:
         # 平均車速だとあかんな平均車両数で判定する 車線上の平均速度を取得
         # average_speed = traci.edge.getLastStepMeanSpeed(current_edgeID)
-        my_speed = traci.vehicle.getSpeed(vehID)
+        my_speed = snapshot.get_speed(vehID)
         # 渋滞判定
         if my_speed < THRESHOLD_SPEED:
             if current_edgeID_vehs_flag :
@@ -1340,8 +1443,8 @@ def v2shelter_communication(target_vehID:str, shelterID:str, vehInfo_list:list,
                                                         shelter_list
                                                         )
 
-    if distance_each_vehIDs(traci.vehicle.getPosition(target_vehID), shelter_for_target_vehID.get_position()) < COMMUNICATION_RANGE:
-        current_time = traci.simulation.getTime()
+    if distance_each_vehIDs(snapshot.get_position(target_vehID), shelter_for_target_vehID.get_position()) < COMMUNICATION_RANGE:
+        current_time = snapshot.get_time()
         # 避難地の混雑度を更新する
         current_congestion_rate_by_shelterID = shelter_for_target_vehID.get_congestion_rate()
         target_vehInfo.update_shelter_congestion_info(
@@ -1356,36 +1459,43 @@ def v2shelter_communication(target_vehID:str, shelterID:str, vehInfo_list:list,
         target_vehInfo.v2shelter_update_avg_evac_time_by_route(avg_evac_time_by_route)
         target_vehInfo.v2v_avg_evac_time_by_route_by_recive_time(current_time=current_time)
 
-def v2v_communication(target_vehID:str, target_vehInfo:VehicleInfo, around_vehIDs:list, agent_list:list, vehInfo_list:list, COMMUNICATION_RANGE:double):
+# around_vehIDs は get_neighbour_vehIDs_by_vehID で取得した通信可能範囲内の車両IDリスト
+def v2v_communication(target_vehID:str, target_vehInfo:VehicleInfo, around_vehIDs:list, agent_list:list, vehInfo_list:list):
     target_agent:Agent = find_agent_by_vehID(target_vehID, agent_list)
     for around_vehID in around_vehIDs:
-        # 通信可能範囲内にある車両との距離を計算
-        if distance_each_vehIDs(traci.vehicle.getPosition(target_vehID), traci.vehicle.getPosition(around_vehID)) < COMMUNICATION_RANGE:
+        if target_vehID != around_vehID:
             around_vehInfo:VehicleInfo = find_vehInfo_by_vehID(around_vehID, vehInfo_list)
             # 候補となるshelterを全て交換する
-            # 混雑情報の交換
-            for candidate_shelter, near_edgeID in target_agent.get_candidate_edge_by_shelterID().items():
-                # お互いが持つ最新の混雑情報を交換する
-                target_of_congestion_info_time = target_vehInfo.get_latest_time_stamp_of_shelter(candidate_shelter)
-                around_of_congestion_info_time = around_vehInfo.get_latest_time_stamp_of_shelter(candidate_shelter)
-                # 時間が異なる場合、最新の情報を更新
-                if target_of_congestion_info_time !=  around_of_congestion_info_time:
-                    info_source = target_vehInfo if target_of_congestion_info_time > around_of_congestion_info_time else around_vehInfo
-                    info_target = around_vehInfo if target_of_congestion_info_time > around_of_congestion_info_time else target_vehInfo
-                    info_target.set_shelter_congestion_info(info_source.get_shelter_congestion_info())
-            # 避難経路の情報交換
+            # 混雑情報の交換　同じ版を持つ場合は交換しない
+            if target_vehInfo.get_shelter_congestion_record() is not around_vehInfo.get_shelter_congestion_record():
+                for candidate_shelter, near_edgeID in target_agent.get_candidate_edge_by_shelterID().items():
+                    # お互いが持つ最新の混雑情報を交換する
+                    target_of_congestion_info_time = target_vehInfo.get_latest_time_stamp_of_shelter(candidate_shelter)
+                    around_of_congestion_info_time = around_vehInfo.get_latest_time_stamp_of_shelter(candidate_shelter)
+                    # 時間が異なる場合、新しい方の版に置き換える（以降の避難地は同じ版の比較になるため終了）
+                    if target_of_congestion_info_time !=  around_of_congestion_info_time:
+                        info_source = target_vehInfo if target_of_congestion_info_time > around_of_congestion_info_time else around_vehInfo
+                        info_target = around_vehInfo if target_of_congestion_info_time > around_of_congestion_info_time else target_vehInfo
+                        info_target.set_shelter_congestion_record(info_source.get_shelter_congestion_record())
+                        break
+            # 避難経路の情報交換　同じ版を持つ場合は交換しない
+            if target_vehInfo.get_avg_evac_time_by_route_record() is around_vehInfo.get_avg_evac_time_by_route_record():
+                continue
             target_of_route_info_tuple, = target_vehInfo.get_avg_evac_time_by_route_by_recive_time().items(); target_of_route_info_time = target_of_route_info_tuple[0]
             around_of_route_info_tuple, = around_vehInfo.get_avg_evac_time_by_route_by_recive_time().items(); around_of_route_info_time = around_of_route_info_tuple[0]
             if (target_of_route_info_tuple[1] or around_of_route_info_tuple[1] ) and target_of_route_info_time != around_of_route_info_time:
                 info_source = target_vehInfo if target_of_route_info_time > around_of_route_info_time else around_vehInfo
                 info_target = around_vehInfo if target_of_route_info_time > around_of_route_info_time else target_vehInfo
-                info_target.set_avg_evac_time_by_route_by_recive_time(info_source.get_avg_evac_time_by_route_by_recive_time())
+                info_target.set_avg_evac_time_by_route_record(info_source.get_avg_evac_time_by_route_record())
 
-def v2v_communication_about_tsunami_info(target_vehID:str, target_vehInfo:VehicleInfo, around_vehIDs:list, vehInfo_list:list, COMMUNICATION_RANGE:float):
+# around_vehIDs は get_neighbour_vehIDs_by_vehID で取得した通信可能範囲内の車両IDリスト
+def v2v_communication_about_tsunami_info(target_vehID:str, target_vehInfo:VehicleInfo, around_vehIDs:list, vehInfo_list:list):
     for around_vehID in around_vehIDs:
-        # 通信可能範囲内にある車両との距離を計算
-        if distance_each_vehIDs(traci.vehicle.getPosition(target_vehID), traci.vehicle.getPosition(around_vehID)) < COMMUNICATION_RANGE and target_vehID != around_vehID:
+        if target_vehID != around_vehID:
             around_vehInfo:VehicleInfo = find_vehInfo_by_vehID(around_vehID, vehInfo_list)
+            # 同じ版を持つ場合は交換しない
+            if target_vehInfo.get_tsunami_precursor_record() is around_vehInfo.get_tsunami_precursor_record():
+                continue
 
             target_of_tsunami_info_tuple = target_vehInfo.get_tsunami_precursor_info()
             target_of_tsunami_info_time_with_flag = list(target_of_tsunami_info_tuple.values())[0]
@@ -1396,9 +1506,9 @@ def v2v_communication_about_tsunami_info(target_vehID:str, target_vehInfo:Vehicl
 
             # 片方の車両だけが有効な情報を持つ場合（情報の同期）
             if target_flag and not around_flag:
-                around_vehInfo.set_tsunami_precursor_info(target_vehInfo.get_tsunami_precursor_info())
+                around_vehInfo.set_tsunami_precursor_record(target_vehInfo.get_tsunami_precursor_record())
             elif not target_flag and around_flag:
-                target_vehInfo.set_tsunami_precursor_info(around_vehInfo.get_tsunami_precursor_info())
+                target_vehInfo.set_tsunami_precursor_record(around_vehInfo.get_tsunami_precursor_record())
 
             # 両方の車両が有効な情報を持つ場合（一番古い情報に統一）
             elif target_flag and around_flag:
@@ -1408,12 +1518,12 @@ def v2v_communication_about_tsunami_info(target_vehID:str, target_vehInfo:Vehicl
                 # target の持つ情報の方が古い場合
                 if target_time < around_time:
                     # target の情報を around にコピーして、古い情報に統一する
-                    around_vehInfo.set_tsunami_precursor_info(target_vehInfo.get_tsunami_precursor_info())
+                    around_vehInfo.set_tsunami_precursor_record(target_vehInfo.get_tsunami_precursor_record())
                 
                 # around の持つ情報の方が古い場合
                 elif around_time < target_time:
                     # around の情報を target にコピーして、古い情報に統一する
-                    target_vehInfo.set_tsunami_precursor_info(around_vehInfo.get_tsunami_precursor_info())
+                    target_vehInfo.set_tsunami_precursor_record(around_vehInfo.get_tsunami_precursor_record())
 
 def convert_to_cdf(data:dict, plot=True):
     """
@@ -1434,80 +1544,45 @@ def convert_to_cdf(data:dict, plot=True):
         cdf = [i / n for i in range(1, n + 1)]
         cdf_result[key] = list(zip(sorted_times, cdf))
 
-        if plot:
-            plt.plot(sorted_times, cdf, label=f"Key = {key}")
-
     if plot:
-        plt.title("CDF for Each Key")
-        plt.xlabel("Time")
-        plt.ylabel("Cumulative Probability")
-        plt.legend()
-        plt.grid(True)
-        plt.tight_layout()
-        plt.show()
+        # matplotlib はグラフ表示時のみ読み込む
+        from . import plotting
+        plotting.plot_cdf_by_key(cdf_result)
 
     return cdf_result
 
-def plot_dot(agent: Agent):
-    """
-    xリストとyリストを渡すと、散布図を描画し、
-    agent.get_lane_change_threshold_list() の値を水平線として描画する。
-
-    Parameters
-    ----------
-    x_list : list or array
-        x軸の値
-    y_list : list or array
-        y軸の値
-    agent : object
-        get_lane_change_threshold_list() メソッドを持つオブジェクト
-    """
-    fig, ax = plt.subplots(figsize=(6, 5))
-    # --- 散布図 ---
-    ax.plot(
-            agent.get_x_elapsed_time_for_lane_change_list(),
-            agent.get_y_motivation_value_for_lane_change_list(),
-            linewidth=2,
-            label="Motivation over time"
-            )  
-    print(f"agent.get_lane_change_time(){agent.get_lane_change_time()}, agent.get_calculated_motivation_value(){agent.get_calculated_motivation_value()}")
-    # ax.scatter(agent.get_lane_change_time(), agent.get_calculated_motivation_value(), color='orange', s=30, label="Data points")
-    y_thr = agent.get_lane_change_decision_threshold()
-    x_reach_min_motivation = agent.get_reach_lane_minimum_motivation_time()
-    ax.axhline(y=y_thr, color="red", linestyle="--", linewidth=1.5, label=f"Threshold = {y_thr:.2f}")
-    ax.axvline(x=x_reach_min_motivation, color="red", linestyle="--", linewidth=1.5, label=f"reach min time = {y_thr:.2f}")
-    try:
-        y_cur = agent.get_calculated_motivation_value()
-        ax.axhline(y=y_cur, color="green", linestyle="--", linewidth=1.5, label=f"Current Value = {y_cur:.2f}")
-    except:
-        pass
-
-    # --- グラフ設定 ---
-    ax.legend(loc="best")
-    ax.set_xlabel("X")
-    ax.set_ylabel("Y")
-    ax.grid(True, linestyle="--", alpha=0.5)
-    plt.tight_layout()
-    plt.show()
-
 #TODO 消去かしょ
 def update_agent_lane_change_motivation(agent:Agent):
     if len(agent.get_x_lane_change()) == 0:
-        created_time = traci.simulation.getTime()
+        created_time = snapshot.get_time()
         agent.set_created_time(created_time)
-    current_simulation_elapsed_time = traci.simulation.getTime() - agent.get_created_time()
+    current_simulation_elapsed_time = snapshot.get_time() - agent.get_created_time()
     next_lane_change_motivation = two_stage_sigmoid(value=current_simulation_elapsed_time)
     agent.append_x_lane_change(current_simulation_elapsed_time)
     agent.append_y_lane_change(next_lane_change_motivation)
 
-def two_stage_sigmoid(value: float):
+# 全エージェントで共有する車線変更動機付けの基底カーブ（経過時間 0〜449 秒）
+MOTIVATION_CURVE_LENGTH = 450
+_motivation_base_curve:tuple = None
+
+# 基底カーブ (x, y) の取得　初回のみ計算し、書き込み不可の配列として共有する
+def get_motivation_base_curve():
+    global _motivation_base_curve
+    if _motivation_base_curve is None:
+        base_x = np.arange(0, MOTIVATION_CURVE_LENGTH, 1, dtype=float)
+        base_y = two_stage_sigmoid(base_x)
+        base_x.setflags(write=False)
+        base_y.setflags(write=False)
+        _motivation_base_curve = (base_x, base_y)
+    return _motivation_base_curve
+
+def two_stage_sigmoid(value):
     """
     二段階上昇型シグモイド（ストレス上昇モデル向け）
     - 第1段階: x=150 を中心にゆるやかに上昇（予兆・軽い緊張）
     - 第2段階: x=350 を中心に急激に上昇（危険察知による急上昇）
+    value にはスカラーと NumPy 配列のどちらも渡せる（配列の場合は要素ごとの値を配列で返す）
     """
-    import numpy as np
-
     k1 = 0.015   # 緩やかな傾き
     x01 = 200    # 軽い上昇の中心
     
@@ -1,19 +1,23 @@
 # 追加: 先頭付近のimport群に
 import os
 from concurrent.futures import ProcessPoolExecutor, as_completed
-import subprocess
 import re
-import ast
 import statistics
 from collections import defaultdict
 import sys
 import json
-import matplotlib.pyplot as plt
 import numpy as np
 import datetime
 import re
 from collections import defaultdict
 
+import contextlib
+import importlib
+import multiprocessing.util
+
+from its102.sumo_backend import select_backend, close_if_loaded
+from its102.map_one.simulation.simulation_context import ScenarioConfig
+
 _ID_RE = re.compile(r'^(?:init|newveh)_ShelterA_1_(\d+)(?:_\d+)?$')
 
 # --- ユーザー設定 ---
@@ -35,7 +39,21 @@ NUM_RUNS = 2
 early_rate_list = [0.1, 0.5, 0.9]
 vehicle_interval = 5.0
 
-# 追加集計のキー（stdoutで "KEY: <int>" 形式を想定）
+# ワーカーの設定（環境変数で調整）
+# USE_LIBSUMO=1 で libsumo（プロセス内実行）を使う
+USE_LIBSUMO = os.environ.get("USE_LIBSUMO", "0") == "1"
+# BASE_SEED を指定するとジョブごとのシードを (mode, early_rate, run_index) から決定的に作る（未指定なら毎回OSの乱数）
+BASE_SEED = os.environ.get("BASE_SEED")
+# USE_AGENT_POPULATION=1 で Agent の属性を AgentPopulation（NumPy 配列）で保持する
+USE_AGENT_POPULATION = os.environ.get("USE_AGENT_POPULATION", "0") == "1"
+# USE_TSUNAMI_BROADCAST=1 で津波前兆情報を近傍グラフ全体にまとめて伝播する（V2V通信を行う runner のみ）
+USE_TSUNAMI_BROADCAST = os.environ.get("USE_TSUNAMI_BROADCAST", "0") == "1"
+# TSUNAMI_BROADCAST_MAX_HOPS で1回の通信で広げる段数を指定する（既定は1、0 の場合は連結成分全体に広げる）
+TSUNAMI_BROADCAST_MAX_HOPS = int(os.environ.get("TSUNAMI_BROADCAST_MAX_HOPS", "1")) or None
+# SPEED_COMMAND_TOLERANCE を指定すると速度の指示をステップごとにまとめ、差がこの値（m/s）以下の指示は出さない
+SPEED_COMMAND_TOLERANCE = float(os.environ["SPEED_COMMAND_TOLERANCE"]) if "SPEED_COMMAND_TOLERANCE" in os.environ else None
+
+# 追加集計のキー（runner が --result-file に書き出す結果レコードのキー）
 ADDITIONAL_KEYS = [
     "OBTAIN_INFO_LANE_CHANGE_COUNT",
     "ELAPSED_TIME_LANE_CHANGE_COUNT",
@@ -45,67 +63,61 @@ ADDITIONAL_KEYS = [
 ]
 
 # 関数シグネチャを変更（サフィックスを付けられるように）
-def run_simulation_with_system(script_name: str, early_rate: float, log_suffix: str = ""):
-    command = [
-        "python3",
-        "-m",
-        script_name,
-        STATIC_ARGS[0],
-        str(early_rate),
-        STATIC_ARGS[1],
-        STATIC_ARGS[2]
-    ]
-    print(f"  実行中: {' '.join(command)}")
-    try:
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8'
-        )
-    except subprocess.CalledProcessError as e:
-        print(f"  [致命的エラー] コマンド実行に失敗しました: {' '.join(command)}", file=sys.stderr)
-        print(f"  Return Code: {e.returncode}", file=sys.stderr)
-        print(f"  Stderr: {e.stderr}", file=sys.stderr)
+# ワーカープロセスの初期化　import とSUMOの接続はワーカーが終了するまで使い回す
+def _init_worker(use_libsumo: bool):
+    select_backend(use_libsumo=use_libsumo)
+    # ワーカー終了時に起動したままのSUMOを閉じる
+    multiprocessing.util.Finalize(None, close_if_loaded, exitpriority=10)
+
+# ジョブごとのシード
+def _job_seed(mode: str, early_rate: float, run_index: int):
+    if BASE_SEED is None:
         return None
+    entropy = [int(BASE_SEED), 0 if mode == "system" else 1, int(round(early_rate * 1000)), run_index]
+    return int(np.random.SeedSequence(entropy).generate_state(1)[0])
+
+# ワーカー内でシナリオを1回実行し、結果レコードを返す（失敗時は None）
+def _run_scenario_in_worker(script_name: str, early_rate: float, seed):
+    config = ScenarioConfig(
+                            early_rate=early_rate,
+                            vehicle_interval=float(STATIC_ARGS[1]),
+                            INSIGHT_RANGE=float(STATIC_ARGS[2]),
+                            nogui=True,
+                            use_libsumo=USE_LIBSUMO,
+                            seed=seed,
+                            tripinfo_file=os.devnull,
+                            trace_file=None,
+                            keep_sumo_running=True,
+                            use_agent_population=USE_AGENT_POPULATION,
+                            use_tsunami_broadcast=USE_TSUNAMI_BROADCAST,
+                            tsunami_broadcast_max_hops=TSUNAMI_BROADCAST_MAX_HOPS,
+                            speed_command_tolerance=SPEED_COMMAND_TOLERANCE
+                            )
+    print(f"  実行中: {script_name} early_rate={early_rate} seed={seed} (pid={os.getpid()})")
+    try:
+        runner = importlib.import_module(script_name)
+        # runner の途中経過の出力は読み捨てる
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = runner.run_scenario(config)
     except Exception as e:
-        print(f"  [致命的エラー] パース中に予期せぬエラーが発生しました: {e}", file=sys.stderr)
-        print(f"  コマンド: {' '.join(command)}", file=sys.stderr)
+        print(f"  [致命的エラー] シミュレーション中に予期せぬエラーが発生しました: {e}", file=sys.stderr)
+        print(f"  スクリプト: {script_name}, early_rate: {early_rate}", file=sys.stderr)
+        # 途中で失敗したSUMOは再利用せず、次のジョブで起動し直す
+        try:
+            close_if_loaded()
+        except Exception:
+            pass
         return None
+    return result.to_record()
 
-    arrival_time_by_target_vehID_dict = {}
-    changed_vehicle_num = None  # 数値を想定（互換のため辞書表現でも可）
-    extra_metrics = {k: 0 for k in ADDITIONAL_KEYS}
-
-    for raw in result.stdout.splitlines():
-        line = raw.strip()
-        if "LANE_CHANGED_VEHICLE_NUM" in line:
-            try:
-                dict_str = line.split(":", 1)[1].strip()
-                try:
-                    changed_vehicle_num = int(dict_str)
-                except ValueError:
-                    changed_vehicle_num = ast.literal_eval(dict_str)
-            except Exception as e:
-                print(f"Error parsing LANE_CHANGED_VEHICLE_NUM: {e}")
-
-        if "arrival_time_by_vehID_dict" in line:
-            try:
-                dict_str = line.split(":", 1)[1].strip()
-                arrival_time_by_target_vehID_dict = ast.literal_eval(dict_str)
-            except Exception as e:
-                print(f"Error parsing vehID dict: {e}")
+def run_simulation_with_system(script_name: str, early_rate: float, log_suffix: str = "", seed=None):
+    record = _run_scenario_in_worker(script_name, early_rate, seed)
+    if record is None:
+        return None
 
-        for key in ADDITIONAL_KEYS:
-            if key == "OBTAIN_INFO_LANE_CHANGE_COUNT":
-                print(line)
-            if line.startswith(f"{key}:"):
-                try:
-                    val_str = line.split(":", 1)[1].strip()
-                    extra_metrics[key] = int(val_str)
-                except Exception as e:
-                    print(f"Error parsing {key}: {e}")
+    arrival_time_by_target_vehID_dict = record["arrival_time_by_vehID_dict"]
+    changed_vehicle_num = record["LANE_CHANGED_VEHICLE_NUM"]
+    extra_metrics = {k: record.get(k, 0) for k in ADDITIONAL_KEYS}
 
     # ← 並列で競合しないようにサフィックスを付ける
     log_filename = f"log_{early_rate}{log_suffix}.txt"
@@ -120,65 +132,14 @@ def run_simulation_with_system(script_name: str, early_rate: float, log_suffix:
     return arrival_time_by_target_vehID_dict, changed_vehicle_num, extra_metrics
 
 # 同様に nosystem 側にもサフィックス引数を追加
-def run_simulation_with_nosystem(script_name: str, early_rate: float, log_suffix: str = ""):
-    command = [
-        "python3",
-        "-m",
-        script_name,
-        STATIC_ARGS[0],
-        str(early_rate),
-        STATIC_ARGS[1],
-        STATIC_ARGS[2]
-    ]
-    print(f"  実行中: {' '.join(command)}")
-    try:
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8'
-        )
-    except subprocess.CalledProcessError as e:
-        print(f"  [致命的エラー] コマンド実行に失敗しました: {' '.join(command)}", file=sys.stderr)
-        print(f"  Return Code: {e.returncode}", file=sys.stderr)
-        print(f"  Stderr: {e.stderr}", file=sys.stderr)
-        return None
-    except Exception as e:
-        print(f"  [致命的エラー] パース中に予期せぬエラーが発生しました: {e}", file=sys.stderr)
-        print(f"  コマンド: {' '.join(command)}", file=sys.stderr)
+def run_simulation_with_nosystem(script_name: str, early_rate: float, log_suffix: str = "", seed=None):
+    record = _run_scenario_in_worker(script_name, early_rate, seed)
+    if record is None:
         return None
 
-    arrival_time_by_target_vehID_dict = {}
-    changed_vehicle_num = None
-    extra_metrics = {k: 0 for k in ADDITIONAL_KEYS}
-
-    for raw in result.stdout.splitlines():
-        line = raw.strip()
-        if "LANE_CHANGED_VEHICLE_NUM" in line:
-            try:
-                dict_str = line.split(":", 1)[1].strip()
-                try:
-                    changed_vehicle_num = int(dict_str)
-                except ValueError:
-                    changed_vehicle_num = ast.literal_eval(dict_str)
-            except Exception as e:
-                print(f"Error parsing LANE_CHANGED_VEHICLE_NUM: {e}")
-
-        if "arrival_time_by_vehID_dict" in line:
-            try:
-                dict_str = line.split(":", 1)[1].strip()
-                arrival_time_by_target_vehID_dict = ast.literal_eval(dict_str)
-            except Exception as e:
-                print(f"Error parsing vehID dict: {e}")
-
-        for key in ADDITIONAL_KEYS:
-            if line.startswith(f"{key}:"):
-                try:
-                    val_str = line.split(":", 1)[1].strip()
-                    extra_metrics[key] =  _parse_num(val_str)
-                except Exception as e:
-                    print(f"Error parsing {key}: {e}")
+    arrival_time_by_target_vehID_dict = record["arrival_time_by_vehID_dict"]
+    changed_vehicle_num = record["LANE_CHANGED_VEHICLE_NUM"]
+    extra_metrics = {k: record.get(k, 0) for k in ADDITIONAL_KEYS}
 
     log_filename = f"log_{early_rate}_nosystem{log_suffix}.txt"
     try:
@@ -190,18 +151,13 @@ def run_simulation_with_nosystem(script_name: str, early_rate: float, log_suffix
         print(f"Error writing to log file: {e}")
     return arrival_time_by_target_vehID_dict, changed_vehicle_num, extra_metrics
 
-def _parse_num(s: str):
-    try:
-        return int(s)
-    except ValueError:
-        return float(s)
-    
 # 並列実行のユーティリティ
 def _run_once(mode: str, early_rate: float, run_index: int):
+    seed = _job_seed(mode, early_rate, run_index)
     if mode == "system":
-        ret = run_simulation_with_system(script_name_with_system, early_rate, log_suffix=f"_{run_index}")
+        ret = run_simulation_with_system(script_name_with_system, early_rate, log_suffix=f"_{run_index}", seed=seed)
     else:
-        ret = run_simulation_with_nosystem(script_name_with_nosystem, early_rate, log_suffix=f"_{run_index}")
+        ret = run_simulation_with_nosystem(script_name_with_nosystem, early_rate, log_suffix=f"_{run_index}", seed=seed)
     return (mode, early_rate, run_index, ret)
 
 def compute_average_arrival_times(runvehID_arrival_time_dict_per_run_lists):
@@ -236,25 +192,27 @@ if __name__ == "__main__":
     # 事前にコンテナ用ワーカー数を決める（必要に応じて環境変数で調整）
     MAX_WORKERS = int(os.environ.get("MAX_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
 
+    # ワーカーは system / nosystem の全ジョブで使い回す（import とSUMOの起動はワーカーごとに1回）
+    ex = ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=_init_worker, initargs=(USE_LIBSUMO,))
+
     # --- system を並列実行 ---
     print(f"=== system 全ジョブを並列実行（workers={MAX_WORKERS}） ===")
     # 結果を格納するバッファ
     system_runs = {er: {"veh": [], "chg": [], "ext": []} for er in early_rate_list}
 
-    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as ex:
-        futures = []
-        for er in early_rate_list:
-            for i in range(NUM_RUNS):
-                futures.append(ex.submit(_run_once, "system", er, i))
-
-        for fut in as_completed(futures):
-            mode, er, i, ret = fut.result()
-            if ret is None:
-                continue
-            vehID_data_dict, changed_veh_num, extra_metrics = ret
-            system_runs[er]["veh"].append(vehID_data_dict)
-            system_runs[er]["chg"].append(changed_veh_num)
-            system_runs[er]["ext"].append(extra_metrics)
+    futures = []
+    for er in early_rate_list:
+        for i in range(NUM_RUNS):
+            futures.append(ex.submit(_run_once, "system", er, i))
+
+    for fut in as_completed(futures):
+        mode, er, i, ret = fut.result()
+        if ret is None:
+            continue
+        vehID_data_dict, changed_veh_num, extra_metrics = ret
+        system_runs[er]["veh"].append(vehID_data_dict)
+        system_runs[er]["chg"].append(changed_veh_num)
+        system_runs[er]["ext"].append(extra_metrics)
 
     # 集計
     for er in early_rate_list:
@@ -282,16 +240,17 @@ if __name__ == "__main__":
     print(f"=== nosystem early_rate={er} を並列実行（workers={MAX_WORKERS}） ===")
     nosys_runs = {"veh": [], "chg": [], "ext": []}
 
-    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as ex:
-        futures = [ex.submit(_run_once, "nosystem", er, i) for i in range(NUM_RUNS)]
-        for fut in as_completed(futures):
-            mode, er_ret, i, ret = fut.result()
-            if ret is None:
-                continue
-            vehID_data_dict, changed_veh_num, extra_metrics = ret
-            nosys_runs["veh"].append(vehID_data_dict)
-            nosys_runs["chg"].append(changed_veh_num)
-            nosys_runs["ext"].append(extra_metrics)
+    futures = [ex.submit(_run_once, "nosystem", er, i) for i in range(NUM_RUNS)]
+    for fut in as_completed(futures):
+        mode, er_ret, i, ret = fut.result()
+        if ret is None:
+            continue
+        vehID_data_dict, changed_veh_num, extra_metrics = ret
+        nosys_runs["veh"].append(vehID_data_dict)
+        nosys_runs["chg"].append(changed_veh_num)
+        nosys_runs["ext"].append(extra_metrics)
+
+    ex.shutdown()
 
     avg_result = compute_average_arrival_times(nosys_runs["veh"])
     avg_arrival_by_vehID_with_nosystem[er] = list(avg_result.values())